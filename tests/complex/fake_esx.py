@@ -55,6 +55,14 @@ class EsxHandler(FakeHandler):
                 self.write_file('esx', 'esx_logoutresponse.xml')
             elif 'CreateFilter' in root.tag:
                 self.write_file('esx', 'esx_createfilterresponse.xml')
+            elif 'CreateContainerView' in root.tag:
+                self.write_file('esx', 'esx_createcontainerviewresponse.xml')
+            elif 'DestroyView' in root.tag:
+                self.write_file('esx', 'esx_destroyviewresponse.xml')
+            elif 'ContinueRetrievePropertiesEx' in root.tag:
+                self.write_file('esx', 'esx_continueretrievepropertiesexresponse.xml')
+            elif 'RetrievePropertiesEx' in root.tag:
+                self.write_file('esx', 'esx_retrievepropertiesexresponse.xml')
             elif 'WaitForUpdatesEx' in root.tag:
                 time.sleep(1)
                 version = self.server._data_version.value
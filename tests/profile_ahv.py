@@ -0,0 +1,80 @@
+"""
+Profiler of building AHV host to VM mapping.
+
+Times AhvInterface2.build_host_to_uvm_map and AhvInterface3.build_host_to_uvm_map
+followed by looking up cluster names of the hosts, using synthetic
+responses of the AHV REST API.
+
+Run as `python -m tests.profile_ahv` from the top directory of the repository.
+"""
+
+import logging
+import sys
+
+from tests.suds.profiling import ProfilerBase
+from virtwho.virt.ahv.ahv_interface import AhvInterface2, AhvInterface3
+
+
+def v2_payload(clusters, hosts, vms):
+    host_list = [
+        {'uuid': 'host-%d' % i, 'cluster_uuid': 'cluster-%d' % (i % clusters)}
+        for i in range(hosts)
+    ]
+    vm_entities = [
+        {'uuid': 'vm-%d' % i, 'host_uuid': 'host-%d' % (i % hosts), 'power_state': 'on'}
+        for i in range(vms)
+    ]
+    return host_list, vm_entities
+
+
+def v3_payload(clusters, hosts, vms):
+    host_list = [
+        {
+            'metadata': {'uuid': 'host-%d' % i},
+            'status': {'cluster_reference': {'uuid': 'cluster-%d' % (i % clusters)}},
+        }
+        for i in range(hosts)
+    ]
+    vm_entities = [
+        {
+            'metadata': {'uuid': 'vm-%d' % i},
+            'status': {'resources': {
+                'host_reference': {'uuid': 'host-%d' % (i % hosts)},
+                'power_state': 'ON',
+            }},
+        }
+        for i in range(vms)
+    ]
+    return host_list, vm_entities
+
+
+class Profiler(ProfilerBase):
+
+    def __init__(self, interface_class, payload, clusters, hosts, vms,
+                 show_each_timing=False, show_minimum=True):
+        super(Profiler, self).__init__(show_each_timing, show_minimum)
+        logger = logging.getLogger('profile_ahv')
+        logger.disabled = True
+        self.interface = interface_class(logger, 'https://localhost:9440', 'username', 'password', 9440)
+        self.host_list, self.vm_entities = payload(clusters, hosts, vms)
+        self.interface.get_host_list = self.get_host_list
+        self.interface.get_vm_entities = lambda: self.vm_entities
+        self.clusters = [('cluster-%d' % i, 'cluster %d' % i) for i in range(clusters)]
+        print("%s: clusters=%d; hosts=%d; vms=%d" % (interface_class.VERSION, clusters, hosts, vms))
+
+    def get_host_list(self):
+        # Hosts are modified by building the map, return fresh copies
+        return [dict(host) for host in self.host_list]
+
+    def build(self):
+        host_uvm_map = self.interface.build_host_to_uvm_map()
+        cluster_names = self.interface.get_cluster_names(self.clusters)
+        for host in host_uvm_map.values():
+            self.interface.get_host_cluster_name(host, cluster_names)
+
+
+if __name__ == '__main__':
+    print("Python %s" % (sys.version,))
+    for clusters, hosts, vms in ((1, 16, 500), (10, 200, 10000), (50, 1000, 50000)):
+        for interface_class, payload in ((AhvInterface2, v2_payload), (AhvInterface3, v3_payload)):
+            Profiler(interface_class, payload, clusters, hosts, vms).timeit('build', 10)
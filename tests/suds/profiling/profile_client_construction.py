@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the (LGPL) GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Library Lesser General Public License
+# for more details at ( http://www.gnu.org/licenses/lgpl.html ).
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Suds client construction profiler.
+
+Compares startup time and peak memory of constructing a client for a large
+generated schema, resembling the vSphere vim25 one, with eagerly and lazily
+dereferenced schema types.
+
+"""
+
+import virtwho.virt.esx.suds
+import virtwho.virt.esx.suds.client
+import virtwho.virt.esx.suds.store
+import tests.suds.profiling
+
+import sys
+import tracemalloc
+
+
+class Profiler(tests.suds.profiling.ProfilerBase):
+
+    def __init__(self, type_count, lazy, show_each_timing=False,
+            show_minimum=True):
+        super(Profiler, self).__init__(show_each_timing, show_minimum)
+        self.lazy = lazy
+        self.store = virtwho.virt.esx.suds.store.DocumentStore(
+            wsdl=self.__construct_wsdl(type_count))
+        print("type_count=%d; lazy=%s" % (type_count, lazy))
+
+    def construct(self):
+        virtwho.virt.esx.suds.client.Client("suds://wsdl", cache=None,
+            documentStore=self.store, lazyschema=self.lazy)
+
+    def peak_memory(self):
+        tracemalloc.start()
+        try:
+            self.construct()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    @staticmethod
+    def __construct_wsdl(type_count):
+        """Construct a WSDL with a chain of extended types and one operation."""
+        types = ["""\
+      <xsd:complexType name="Type0">
+        <xsd:sequence>
+          <xsd:element name="key" type="xsd:string"/>
+        </xsd:sequence>
+      </xsd:complexType>"""]
+        for i in range(1, type_count):
+            types.append("""\
+      <xsd:complexType name="Type%d">
+        <xsd:complexContent>
+          <xsd:extension base="tns:Type%d">
+            <xsd:sequence>
+              <xsd:element name="field%d" type="xsd:string" minOccurs="0"/>
+              <xsd:element name="ref%d" type="tns:Type0" minOccurs="0"/>
+            </xsd:sequence>
+          </xsd:extension>
+        </xsd:complexContent>
+      </xsd:complexType>""" % (i, (i - 1) // 10, i, i))
+        return virtwho.virt.esx.suds.byte_str("""\
+<?xml version='1.0' encoding='UTF-8'?>
+<wsdl:definitions targetNamespace="urn:profile"
+    xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:tns="urn:profile">
+  <wsdl:types>
+    <xsd:schema targetNamespace="urn:profile" elementFormDefault="qualified">
+%s
+      <xsd:element name="f">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="item" type="tns:Type1"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+    </xsd:schema>
+  </wsdl:types>
+  <wsdl:message name="fRequest">
+    <wsdl:part name="parameters" element="tns:f"/>
+  </wsdl:message>
+  <wsdl:portType name="ProfilePortType">
+    <wsdl:operation name="f">
+      <wsdl:input message="tns:fRequest"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="ProfileBinding" type="tns:ProfilePortType">
+    <soap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="f">
+      <soap:operation soapAction="f"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="ProfileService">
+    <wsdl:port name="ProfilePort" binding="tns:ProfileBinding">
+      <soap:address location="https://localhost/sdk"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>""" % ("\n".join(types),))
+
+
+if __name__ == "__main__":
+    print("Python %s" % (sys.version,))
+    for type_count in (500, 5000):
+        for lazy in (False, True):
+            print("")
+            p = Profiler(type_count=type_count, lazy=lazy)
+            p.timeit("construct", 1, repeat=3)
+            print("peak memory: %d kB" % (p.peak_memory() // 1024,))
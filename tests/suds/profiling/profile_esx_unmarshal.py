@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the (LGPL) GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Library Lesser General Public License
+# for more details at ( http://www.gnu.org/licenses/lgpl.html ).
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Suds ESX reply parsing and unmarshalling profiler.
+
+Times SAX parsing and complete reply processing of the recorded vSphere
+replies used by the virt-who ESX tests, using the minimal vim25 WSDL, and
+the peak memory used by their parsed documents.
+
+"""
+
+import virtwho.virt.esx.suds.bindings.binding
+import virtwho.virt.esx.suds.client
+import virtwho.virt.esx.suds.sax.parser
+import tests.suds.profiling
+
+import glob
+import os.path
+import sys
+import tracemalloc
+
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..", "..")
+WSDL = os.path.join(ROOT, "virtwho", "virt", "esx", "vimServiceMinimal.wsdl")
+REPLIES = os.path.join(ROOT, "tests", "complex", "data", "esx")
+
+
+class Profiler(tests.suds.profiling.ProfilerBase):
+
+    def __init__(self, compact=False, show_each_timing=False,
+            show_minimum=True):
+        super(Profiler, self).__init__(show_each_timing, show_minimum)
+        self.client = virtwho.virt.esx.suds.client.Client(
+            "file://%s" % (os.path.abspath(WSDL),),
+            location="https://localhost/sdk", cache=None, nosend=True,
+            compactobjects=compact)
+        parser = virtwho.virt.esx.suds.sax.parser.Parser()
+        self.replies = []
+        for path in sorted(glob.glob(os.path.join(REPLIES, "esx_*.xml"))):
+            with open(path, "rb") as f:
+                reply = f.read()
+            # Skip replies without a properly declared SOAP envelope
+            body = parser.parse(string=reply).getChild("Envelope",
+                virtwho.virt.esx.suds.bindings.binding.envns)
+            body = body and body.getChild("Body")
+            if body is None:
+                continue
+            method = body.children[0].name[:-len("Response")]
+            self.replies.append((method, reply))
+        print("replies=%d; bytes=%d; compact=%s" % (len(self.replies),
+            sum(len(reply) for method, reply in self.replies), compact))
+
+    def parse(self):
+        parser = virtwho.virt.esx.suds.sax.parser.Parser()
+        for method, reply in self.replies:
+            parser.parse(string=reply)
+
+    def peak_memory(self):
+        tracemalloc.start()
+        try:
+            parser = virtwho.virt.esx.suds.sax.parser.Parser()
+            documents = [parser.parse(string=reply)
+                for method, reply in self.replies]
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def unmarshalled_memory(self):
+        service = self.client.service
+        requests = [(getattr(service, method)(), reply)
+            for method, reply in self.replies]
+        # Build the per type classes first
+        for request, reply in requests:
+            request.process_reply(reply)
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            results = [request.process_reply(reply)
+                for request, reply in requests]
+            return tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+
+    def unmarshal(self):
+        service = self.client.service
+        for method, reply in self.replies:
+            getattr(service, method)().process_reply(reply)
+
+
+if __name__ == "__main__":
+    print("Python %s" % (sys.version,))
+    p = Profiler()
+    p.timeit("parse", 100)
+    print("parsed documents peak memory: %d kB" % (p.peak_memory() // 1024,))
+    for compact in (False, True):
+        print("")
+        p = Profiler(compact=compact)
+        p.timeit("unmarshal", 100)
+        print("unmarshalled objects memory: %d kB" % (
+            p.unmarshalled_memory() // 1024,))
@@ -34,6 +34,7 @@ import virtwho.virt.esx.suds.transport.https
 
 import pytest
 import http.client
+import io
 
 
 class MyException(Exception):
@@ -670,6 +671,25 @@ class TestTransportUsage:
         assert test_input_data in request_message
         assert reply == test_output_data
 
+    def test_operation_streamed_reply(self):
+        wsdl = testutils.wsdl('<xsd:element name="Data" type="xsd:string"/>',
+            operation_name="pi", output="Data")
+        reply = io.BytesIO(b"""\
+<?xml version="1.0"?>
+<env:Envelope xmlns:env="http://schemas.xmlsoap.org/soap/envelope/">
+  <env:Body>
+    <Data xmlns="my-namespace">La-di-da-da-da</Data>
+  </env:Body>
+</env:Envelope>""")
+        class StreamingTransport(MockTransport):
+            def send(self, request):
+                return virtwho.virt.esx.suds.transport.Reply(200, {}, reply)
+        store = MockDocumentStore(wsdl=wsdl)
+        client = virtwho.virt.esx.suds.client.Client("suds://wsdl", documentStore=store,
+            cache=None, transport=StreamingTransport())
+        assert client.service.pi() == "La-di-da-da-da"
+        assert reply.closed
+
     @pytest.mark.parametrize("transport", (object(), virtwho.virt.esx.suds.cache.NoCache()))
     def test_reject_invalid_transport_class(self, transport, monkeypatch):
         monkeypatch.delitem(locals(), "e", False)
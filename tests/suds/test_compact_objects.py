@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the (LGPL) GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Library Lesser General Public License
+# for more details at ( http://www.gnu.org/licenses/lgpl.html ).
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Compact suds object unit tests.
+
+Implemented using the 'pytest' testing framework.
+
+"""
+
+import testutils
+if __name__ == "__main__":
+    testutils.run_using_pytest(globals())
+
+import virtwho.virt.esx.suds
+from virtwho.virt.esx.suds.sudsobject import asdict, Compact, Factory
+
+import pickle
+
+import pytest
+
+
+_schema = """\
+      <xsd:complexType name="Base">
+        <xsd:sequence>
+          <xsd:element name="key" type="xsd:string"/>
+        </xsd:sequence>
+        <xsd:attribute name="type" type="xsd:string"/>
+      </xsd:complexType>
+      <xsd:complexType name="Derived">
+        <xsd:complexContent>
+          <xsd:extension base="my_xsd:Base">
+            <xsd:sequence>
+              <xsd:element name="value" type="xsd:int" maxOccurs="unbounded"/>
+            </xsd:sequence>
+          </xsd:extension>
+        </xsd:complexContent>
+      </xsd:complexType>
+      <xsd:element name="Wrapper">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="item" type="my_xsd:Base" maxOccurs="unbounded"/>
+            <xsd:element name="count" type="xsd:int"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>"""
+
+_reply = virtwho.virt.esx.suds.byte_str("""\
+<?xml version="1.0"?>
+<Envelope xmlns="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xmlns:my="my-xsd-namespace">
+  <Body>
+    <Wrapper xmlns="my-xsd-namespace">
+      <item type="base"><key>a</key></item>
+      <item xsi:type="my:Derived"><key>b</key><value>1</value></item>
+      <item xsi:type="my:Derived"><key>c</key><value>2</value><value>3</value></item>
+      <count>3</count>
+    </Wrapper>
+  </Body>
+</Envelope>""")
+
+
+def _reply_object(compact):
+    client = testutils.client_from_wsdl(testutils.wsdl(_schema,
+        output="Wrapper"), compactobjects=compact)
+    return client, client.service.f(__inject=dict(reply=_reply))
+
+
+def test_same_as_default_objects():
+    client, compact = _reply_object(compact=True)
+    client, default = _reply_object(compact=False)
+    assert str(compact) == str(default)
+    assert isinstance(compact.item[0], Compact)
+    assert not isinstance(default.item[0], Compact)
+
+
+def test_class_per_schema_type():
+    client, reply = _reply_object(compact=True)
+    base, derived, other = reply.item
+    assert base.__class__.__name__ == "Base"
+    assert derived.__class__.__name__ == "Derived"
+    assert derived.__class__ is other.__class__
+    assert derived.__class__.__slots__ == ("_type", "key", "value")
+    assert derived.__metadata__ is other.__metadata__
+    assert derived.__metadata__.sxtype.name == "Derived"
+
+    # Classes are shared by later replies
+    again = client.service.f(__inject=dict(reply=_reply))
+    assert again.item[1].__class__ is derived.__class__
+
+
+def test_schema_pickled_without_classes():
+    client, reply = _reply_object(compact=True)
+    schema = pickle.loads(pickle.dumps(client.wsdl.schema))
+    assert "compact_classes" not in schema.__dict__
+    assert client.wsdl.schema.compact_classes
+
+
+def test_reply_content():
+    client, reply = _reply_object(compact=True)
+    base, derived, other = reply.item
+    assert base._type == "base"
+    assert base.key == "a"
+    assert not hasattr(base, "value")
+    assert derived.value == [1]
+    assert other.value == [2, 3]
+    assert reply.count == 3
+    assert asdict(other) == {"key": "c", "value": [2, 3]}
+
+
+def test_object_protocol():
+    cls = Factory.compact("Thing", ["b", "a", "not-an-identifier"])
+    thing = cls()
+    assert len(thing) == 0
+    thing.a = 1
+    thing.b = None
+    thing["not-an-identifier"] = 2
+    thing.extra = 3
+    assert thing.__keylist__ == ["b", "a", "not-an-identifier", "extra"]
+    assert list(thing) == [("b", None), ("a", 1), ("not-an-identifier", 2),
+        ("extra", 3)]
+    assert thing[1] == 1
+    assert "a" in thing
+    assert "extra" in thing
+    assert "__metadata__" not in thing
+
+    del thing.b
+    del thing.extra
+    assert thing.__keylist__ == ["a", "not-an-identifier"]
+    assert "b" not in thing
+    pytest.raises(AttributeError, getattr, thing, "b")
+    pytest.raises(AttributeError, delattr, thing, "b")
+    assert str(thing) == """\
+(Thing){
+   a = 1
+   not-an-identifier = 2
+ }"""
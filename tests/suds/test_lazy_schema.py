@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the (LGPL) GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Library Lesser General Public License
+# for more details at ( http://www.gnu.org/licenses/lgpl.html ).
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Lazy XSD schema loading unit tests.
+
+Implemented using the 'pytest' testing framework.
+
+"""
+
+import testutils
+if __name__ == "__main__":
+    testutils.run_using_pytest(globals())
+
+from testutils import _assert_request_content
+
+import pytest
+
+
+_schema = """\
+      <xsd:complexType name="Base">
+        <xsd:sequence>
+          <xsd:element name="key" type="xsd:string"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Derived">
+        <xsd:complexContent>
+          <xsd:extension base="my_xsd:Base">
+            <xsd:sequence>
+              <xsd:element name="value" type="xsd:int"/>
+            </xsd:sequence>
+          </xsd:extension>
+        </xsd:complexContent>
+      </xsd:complexType>
+      <xsd:complexType name="Unused">
+        <xsd:complexContent>
+          <xsd:extension base="my_xsd:Base">
+            <xsd:sequence>
+              <xsd:element name="other" type="xsd:string"/>
+            </xsd:sequence>
+          </xsd:extension>
+        </xsd:complexContent>
+      </xsd:complexType>
+      <xsd:element name="Wrapper">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="item" type="my_xsd:Derived"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>"""
+
+
+def _client(lazy):
+    wsdl = testutils.wsdl(_schema, input="Wrapper", operation_name="f")
+    return testutils.client_from_wsdl(wsdl, nosend=True, prettyxml=True,
+        lazyschema=lazy)
+
+
+def _type(client, name):
+    return client.wsdl.schema.types[name, "my-xsd-namespace"]
+
+
+def test_types_dereferenced_on_first_use():
+    client = _client(lazy=True)
+    # Operation parameter types are used when the client is constructed
+    assert _type(client, "Derived").dereferenced
+    assert _type(client, "Base").dereferenced
+    assert not _type(client, "Unused").dereferenced
+
+    unused = client.factory.create("my_xsd:Unused")
+
+    assert unused.key is None
+    assert unused.other is None
+    assert _type(client, "Unused").dereferenced
+
+
+def test_types_not_marked_in_eager_schema():
+    client = _client(lazy=False)
+    client.factory.create("my_xsd:Derived")
+    assert not _type(client, "Derived").dereferenced
+
+
+@pytest.mark.parametrize("lazy", (False, True))
+def test_request_construction(lazy):
+    client = _client(lazy)
+    item = client.factory.create("my_xsd:Derived")
+    item.key = "k"
+    item.value = 42
+    _assert_request_content(client.service.f(item=item), """\
+<?xml version="1.0" encoding="UTF-8"?>
+<Envelope xmlns="http://schemas.xmlsoap.org/soap/envelope/">
+  <Header/>
+  <Body>
+    <Wrapper xmlns="my-xsd-namespace">
+      <item>
+        <key>k</key>
+        <value>42</value>
+      </item>
+    </Wrapper>
+  </Body>
+</Envelope>""")
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the (LGPL) GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Library Lesser General Public License
+# for more details at ( http://www.gnu.org/licenses/lgpl.html ).
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Prepared web service method unit tests.
+
+Implemented using the 'pytest' testing framework.
+
+"""
+
+import testutils
+if __name__ == "__main__":
+    testutils.run_using_pytest(globals())
+
+import virtwho.virt.esx.suds.bindings.binding
+from virtwho.virt.esx.suds.plugin import MessagePlugin
+
+import pytest
+
+
+_schema = """\
+      <xsd:element name="Wrapper">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="this" type="xsd:string"/>
+            <xsd:element name="version" type="xsd:string" minOccurs="0"/>
+            <xsd:element name="wait" type="xsd:boolean" minOccurs="0"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>"""
+
+
+class CountingPlugin(MessagePlugin):
+
+    def __init__(self):
+        self.marshalled_count = 0
+        self.sending_count = 0
+
+    def marshalled(self, context):
+        self.marshalled_count += 1
+
+    def sending(self, context):
+        self.sending_count += 1
+
+
+def _client(**kwargs):
+    wsdl = testutils.wsdl(_schema, input="Wrapper", operation_name="f")
+    return testutils.client_from_wsdl(wsdl, nosend=True, **kwargs)
+
+
+@pytest.mark.parametrize("prettyxml", (False, True))
+@pytest.mark.parametrize("version, wait", (
+    ("", False),
+    ("42", True),
+    ("<&'\">", False)))
+def test_same_envelope_as_regular_call(prettyxml, version, wait):
+    client = _client(prettyxml=prettyxml)
+    prepared = client.service.f.prepare(["version", "wait"], this="me")
+    request = prepared(version=version, wait=wait)
+    expected = client.service.f(this="me", version=version, wait=wait)
+    assert request.envelope == expected.envelope
+
+
+def test_envelope_marshalled_once(monkeypatch):
+    plugin = CountingPlugin()
+    client = _client(plugins=[plugin])
+    binding = virtwho.virt.esx.suds.bindings.binding.Binding
+    get_message = binding.get_message
+    calls = []
+
+    def counting_get_message(self, *args, **kwargs):
+        calls.append(args)
+        return get_message(self, *args, **kwargs)
+    monkeypatch.setattr(binding, "get_message", counting_get_message)
+
+    prepared = client.service.f.prepare(["version"], this="me")
+    for version in ("1", "2", "3"):
+        request = prepared(version=version)
+        assert (":version>%s</" % (version,)).encode() in request.envelope
+    assert len(calls) == 1
+    assert plugin.marshalled_count == 1
+    assert plugin.sending_count == 3
+
+
+def test_unknown_variable():
+    client = _client()
+    e = pytest.raises(TypeError, client.service.f.prepare, ["other"],
+        this="me").value
+    try:
+        assert str(e) == "f() got an unexpected keyword argument 'other'"
+    finally:
+        del e  # explicitly break circular reference chain in Python 3
+
+
+def test_reply_processed():
+    client = _client()
+    prepared = client.service.f.prepare([], this="me")
+    request = prepared()
+    assert request.process_reply(b"""\
+<?xml version="1.0"?>
+<env:Envelope xmlns:env="http://schemas.xmlsoap.org/soap/envelope/">
+  <env:Body/>
+</env:Envelope>""") is None
@@ -481,6 +481,49 @@ def test_wrapped_sequence_output():
     assert response.result3.__class__ is virtwho.virt.esx.suds.sax.text.Text
 
 
+def test_child_lookups_memoized(monkeypatch):
+    client = testutils.client_from_wsdl(testutils.wsdl("""\
+      <xsd:complexType name="Node">
+        <xsd:sequence>
+          <xsd:element name="node" type="my_xsd:Node" minOccurs="0"/>
+          <xsd:element name="value" type="xsd:int" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:element name="Wrapper">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="node" type="my_xsd:Node"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>""", output="Wrapper"))
+    reply = virtwho.virt.esx.suds.byte_str("""\
+<?xml version="1.0"?>
+<Envelope xmlns="http://schemas.xmlsoap.org/soap/envelope/">
+  <Body>
+    <Wrapper xmlns="my-xsd-namespace">%s<value>42</value>%s</Wrapper>
+  </Body>
+</Envelope>""" % ("<node>" * 50, "</node>" * 50))
+    sxbase = virtwho.virt.esx.suds.xsd.sxbase.SchemaObject
+    get_child = sxbase.get_child
+    calls = []
+
+    def counting_get_child(self, name):
+        calls.append(name)
+        return get_child(self, name)
+    monkeypatch.setattr(sxbase, "get_child", counting_get_child)
+
+    for i in range(2):
+        # The single 'node' wrapper child is unwrapped.
+        node = client.service.f(__inject=dict(reply=reply))
+        for i in range(49):
+            node = node.node
+        assert node.value == 42
+        assert node.__class__.__name__ == "Node"
+
+    # Node children are looked up once, for the first reply only.
+    assert sorted(calls) == ["node", "value"]
+
+
 def _attributes(object):
     result = set()
     for x in object:
@@ -21,13 +21,16 @@ from __future__ import print_function
 from base import TestBase
 from mock import patch, call, ANY, Mock
 from requests import Session
+from requests.exceptions import ConnectionError
 from queue import Queue
-from threading import Event
+import time
+from threading import Event, Timer
 
 from virtwho import DefaultInterval
 from virtwho import virt
 from virtwho.datastore import Datastore
-from virtwho.virt.ahv.ahv import AhvConfigSection
+from virtwho.virt.ahv.ahv import Ahv, AhvConfigSection
+from virtwho.virt.ahv.ahv_interface import AhvInterface2, AhvInterface3, CircuitBreaker
 from virtwho.virt import Virt, VirtError, Guest, Hypervisor, StatusReport
 
 
@@ -44,6 +47,8 @@ PE_SECTION_VALUES = {
     'hypervisor_id': 'uuid',
     'is_hypervisor': True,
     'ahv_internal_debug': False,
+    'page_size': 500,
+    'workers': 4,
 }
 
 CLUSTER_NAMES = [("0005809e-62e4-75c7-611b-0cc47ac3b354", "cluster_1")]
@@ -734,6 +739,16 @@ class TestAhvConfigSection(TestBase):
         ]
         self.assertCountEqual(expected_result, result)
 
+    def test_validate_ahv_page_size_too_big(self):
+        """
+        Test validation of ahv config. Page size is limited by the API.
+        """
+        self.init_virt_config_section()
+        self.ahv_config['page_size'] = '1000'
+        result = self.ahv_config.validate()
+        self.assertEqual(result, [('warning', '"page_size" can be at most 500, using 500')])
+        self.assertEqual(self.ahv_config['page_size'], 500)
+
 
 class TestAhv(TestBase):
 
@@ -776,17 +791,18 @@ class TestAhv(TestBase):
         self.assertEqual(mock_get.call_count, 3)
         call_list = [
             call('https://10.10.10.10:9440/api/nutanix/v2.0/clusters',
-                 data=ANY, headers=ANY, timeout=ANY, verify=ANY),
+                 data=ANY, headers=ANY, timeout=ANY, verify=ANY, params={'page': 1, 'count': 500}),
             call('https://10.10.10.10:9440/api/nutanix/v2.0/vms',
                  data=ANY, headers=ANY, timeout=ANY, verify=ANY),
             call('https://10.10.10.10:9440/api/nutanix/v2.0/hosts',
-                 data=ANY, headers=ANY, timeout=ANY, verify=ANY)
+                 data=ANY, headers=ANY, timeout=ANY, verify=ANY, params={'page': 1, 'count': 500})
         ]
         mock_get.assert_has_calls(call_list, any_order=True)
 
     @patch.object(Session, 'get')
     def test_status(self, mock_get):
         mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {'entities': []}
         self.ahv.status = True
         self.ahv._send_data = Mock()
         self.run_once()
@@ -795,6 +811,28 @@ class TestAhv(TestBase):
         self.assertTrue(isinstance(self.ahv._send_data.mock_calls[0].kwargs['data_to_send'], StatusReport))
         self.assertEqual(self.ahv._send_data.mock_calls[0].kwargs['data_to_send'].data['source']['server'], self.ahv.config['server'])
 
+    def test_status_failed_requests(self):
+        unavailable = Mock(ok=False, status_code=503, text='Service Unavailable')
+        for side_effect, attempts in ((ConnectionError('refused'), 5), ([unavailable], 1)):
+            self.setUp()
+            self.ahv.status = True
+            self.ahv._send_data = Mock()
+            self.ahv._interface._retry_interval = 0
+            self.ahv._oneshot = True
+            with patch.object(Session, 'get', side_effect=side_effect) as mock_get:
+                self.ahv.run()
+            self.assertEqual(mock_get.call_count, attempts)
+
+            self.ahv._send_data.assert_called_once_with(data_to_send=ANY)
+            report = self.ahv._send_data.mock_calls[0].kwargs['data_to_send']
+            self.assertIsInstance(report, StatusReport)
+            self.assertEqual(report.data['source']['status_string'], 'failure')
+            self.assertEqual(
+                report.data['source']['message'],
+                'Unable to get list of clusters; GET https://10.10.10.10:9440/api/nutanix/v2.0/clusters'
+                ' failed 1 time(s), its circuit breaker is closed.'
+            )
+
     @patch.object(Session, 'post')
     def test_connect_PC(self, mock_post):
         self.setUp(is_pc=True)
@@ -1043,3 +1081,364 @@ class TestAhv(TestBase):
 
         for index in range(0, len(result)):
             self.assertEqual(expected_result[index].toDict(), result[index].toDict())
+
+
+class TestAhvInterface3(TestBase):
+
+    @staticmethod
+    def vm_page(offset, length, total):
+        entities = [{'metadata': {'uuid': 'vm-%d' % i}} for i in range(offset, min(offset + length, total))]
+        response = Mock()
+        response.json.return_value = {
+            'entities': entities,
+            'metadata': {'length': len(entities), 'offset': offset, 'total_matches': total},
+        }
+        return response
+
+    def test_get_vm_entities_concurrent_pages(self):
+        interface = AhvInterface3(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440,
+                                  page_size=100, workers=3)
+        total = 1050
+
+        def post(uri, **kwargs):
+            self.assertEqual(uri, '/vms/list')
+            return self.vm_page(kwargs['json']['offset'], kwargs['json']['length'], total)
+
+        with patch.object(interface, 'post', side_effect=post) as mock_post:
+            entities = interface.get_vm_entities()
+
+        self.assertEqual([entity['metadata']['uuid'] for entity in entities], ['vm-%d' % i for i in range(total)])
+        self.assertCountEqual(
+            [c[1]['json'] for c in mock_post.call_args_list],
+            [{'offset': offset, 'length': 100} for offset in range(0, total, 100)]
+        )
+
+    def test_get_vm_entities_failed_page(self):
+        interface = AhvInterface3(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440,
+                                  page_size=10, workers=2)
+
+        def post(uri, **kwargs):
+            if kwargs['json']['offset'] == 10:
+                return None
+            return self.vm_page(kwargs['json']['offset'], kwargs['json']['length'], 30)
+
+        with patch.object(interface, 'post', side_effect=post):
+            entities = interface.get_vm_entities()
+
+        self.assertEqual(
+            [entity['metadata']['uuid'] for entity in entities],
+            ['vm-%d' % i for i in list(range(10)) + list(range(20, 30))]
+        )
+        self.assertTrue(interface.incomplete)
+
+    def test_build_host_to_uvm_map(self):
+        interface = AhvInterface3(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440)
+        hosts = [{'metadata': {'uuid': 'host-%d' % i}} for i in range(3)]
+        vms = [
+            {'metadata': {'uuid': 'vm-0'}, 'status': {'resources': {'host_reference': {'uuid': 'host-2'}}}},
+            {'metadata': {'uuid': 'vm-1'}, 'status': {'resources': {'host_reference': {'uuid': 'host-0'}}}},
+            {'metadata': {'uuid': 'vm-2'}, 'status': {'resources': {'host_reference': {'uuid': 'host-2'}}}},
+            {'metadata': {'uuid': 'vm-3'}, 'status': {'resources': {'host_reference': {'uuid': 'unknown'}}}},
+            {'metadata': {'uuid': 'vm-4'}, 'status': {'resources': {}}},
+        ]
+        with patch.object(interface, 'get_host_list', return_value=hosts), \
+                patch.object(interface, 'get_vm_entities', return_value=vms):
+            host_uvm_map = interface.build_host_to_uvm_map()
+
+        self.assertEqual(
+            dict((uuid, [vm['metadata']['uuid'] for vm in host['guest_list']]) for uuid, host in host_uvm_map.items()),
+            {'host-0': ['vm-1'], 'host-1': [], 'host-2': ['vm-0', 'vm-2']}
+        )
+
+    def test_get_host_cluster_name(self):
+        interface = AhvInterface3(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440)
+        cluster_names = interface.get_cluster_names([('cluster-1', 'one'), ('cluster-2', 'two')])
+        host = {'status': {'cluster_reference': {'uuid': 'cluster-2'}}}
+        self.assertEqual(interface.get_host_cluster_name(host, cluster_names), 'two')
+        host = {'status': {'cluster_reference': {'uuid': 'cluster-3'}}}
+        self.assertEqual(interface.get_host_cluster_name(host, cluster_names), 'cluster-3')
+
+    def test_get_host_list_pages(self):
+        interface = AhvInterface3(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440,
+                                  page_size=2, workers=2)
+
+        def post(uri, **kwargs):
+            self.assertEqual(uri, '/hosts/list')
+            offset = kwargs['json']['offset']
+            entities = [{'metadata': {'uuid': 'host-%d' % i}} for i in range(offset, min(offset + 2, 5))]
+            response = Mock()
+            response.json.return_value = {
+                'entities': entities,
+                'metadata': {'length': len(entities), 'offset': offset, 'total_matches': 5},
+            }
+            return response
+
+        with patch.object(interface, 'post', side_effect=post) as mock_post:
+            hosts = interface.get_host_list()
+
+        self.assertEqual([host['metadata']['uuid'] for host in hosts], ['host-%d' % i for i in range(5)])
+        self.assertEqual(mock_post.call_count, 3)
+
+
+class TestAhvInterface2(TestBase):
+
+    @staticmethod
+    def list_page(prefix, page, count, total):
+        entities = [{'uuid': '%s-%d' % (prefix, i)} for i in range((page - 1) * count, min(page * count, total))]
+        response = Mock()
+        response.json.return_value = {
+            'entities': entities,
+            'metadata': {'count': len(entities), 'page': page, 'total_entities': total, 'grand_total_entities': total},
+        }
+        return response
+
+    def test_get_host_list_pages(self):
+        interface = AhvInterface2(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440,
+                                  page_size=10, workers=3)
+
+        def get(uri, **kwargs):
+            self.assertEqual(uri, '/hosts')
+            return self.list_page('host', kwargs['params']['page'], kwargs['params']['count'], 45)
+
+        with patch.object(interface, 'get', side_effect=get) as mock_get:
+            hosts = interface.get_host_list()
+
+        self.assertEqual([host['uuid'] for host in hosts], ['host-%d' % i for i in range(45)])
+        self.assertCountEqual(
+            [c[1]['params'] for c in mock_get.call_args_list],
+            [{'page': page, 'count': 10} for page in range(1, 6)]
+        )
+
+    def test_get_cluster_list_limited_page(self):
+        """
+        Server returning less entities in one page than requested
+        """
+        interface = AhvInterface2(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440,
+                                  page_size=500, workers=2)
+
+        def get(uri, **kwargs):
+            self.assertEqual(uri, '/clusters')
+            response = self.list_page('cluster', kwargs['params']['page'], min(kwargs['params']['count'], 3), 7)
+            for cluster in response.json.return_value['entities']:
+                cluster['name'] = cluster['uuid'].replace('cluster', 'name')
+            return response
+
+        with patch.object(interface, 'get', side_effect=get):
+            clusters = interface.get_ahv_cluster_uuid_name_list()
+
+        self.assertEqual(clusters, [('cluster-%d' % i, 'name-%d' % i) for i in range(7)])
+
+    def test_build_host_to_uvm_map(self):
+        interface = AhvInterface2(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440)
+        hosts = [{'uuid': 'host-0', 'cluster_uuid': 'cluster-1'}, {'uuid': 'host-1', 'cluster_uuid': 'cluster-1'}]
+        vms = [
+            {'uuid': 'vm-0', 'host_uuid': 'host-1'},
+            {'uuid': 'vm-1'},
+            {'uuid': 'vm-2', 'host_uuid': 'host-1'},
+        ]
+        with patch.object(interface, 'get_host_list', return_value=hosts), \
+                patch.object(interface, 'get_vm_entities', return_value=vms):
+            host_uvm_map = interface.build_host_to_uvm_map()
+
+        self.assertEqual(list(host_uvm_map), ['host-0', 'host-1'])
+        self.assertEqual(host_uvm_map['host-0']['guest_list'], [])
+        self.assertEqual(host_uvm_map['host-1']['guest_list'], [vms[0], vms[2]])
+        cluster_names = interface.get_cluster_names([('cluster-1', 'one')])
+        self.assertEqual(interface.get_host_cluster_name(host_uvm_map['host-0'], cluster_names), 'one')
+
+
+class TestAhvRetries(TestBase):
+
+    def create_interface(self, **kwargs):
+        return AhvInterface3(self.logger, 'https://10.10.10.10:9440', 'username', 'password', 9440, **kwargs)
+
+    @staticmethod
+    def response(status_code, headers=None):
+        response = Mock()
+        response.ok = status_code < 400
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.text = ''
+        return response
+
+    def test_exponential_backoff(self):
+        interface = self.create_interface(retries=5, retry_interval=10, max_retry_interval=50)
+        terminate_event = Mock()
+        terminate_event.wait.return_value = False
+        interface._terminate_event = terminate_event
+        with patch.object(Session, 'post', side_effect=ConnectionError('refused')):
+            self.assertIsNone(interface.post('/clusters/list'))
+
+        delays = [c[0][0] for c in terminate_event.wait.call_args_list]
+        self.assertEqual(len(delays), 4)
+        for delay, maximum in zip(delays, [10, 20, 40, 50]):
+            self.assertGreaterEqual(delay, maximum / 2)
+            self.assertLessEqual(delay, maximum)
+
+    def test_retry_after(self):
+        interface = self.create_interface(retries=2, retry_interval=10)
+        terminate_event = Mock()
+        terminate_event.wait.return_value = False
+        interface._terminate_event = terminate_event
+        responses = [self.response(429, {'Retry-After': '7'}), self.response(200)]
+        with patch.object(Session, 'post', side_effect=responses):
+            self.assertEqual(interface.post('/clusters/list'), responses[1])
+        terminate_event.wait.assert_called_once_with(7.0)
+
+    def test_retry_interrupted(self):
+        terminate_event = Event()
+        terminate_event.set()
+        interface = self.create_interface(retries=5, retry_interval=600, terminate_event=terminate_event,
+                                          breaker_threshold=1)
+        interface._logger = Mock()
+        for side_effect in (ConnectionError('refused'), [self.response(429)]):
+            with patch.object(Session, 'post', side_effect=side_effect) as mock_post:
+                self.assertIsNone(interface.post('/clusters/list'))
+            self.assertEqual(mock_post.call_count, 1)
+        # Termination is not a failure of the endpoint
+        self.assertEqual(interface.breaker_states(), {})
+        interface._logger.error.assert_not_called()
+
+    def test_circuit_breaker(self):
+        interface = self.create_interface(retries=1, breaker_threshold=2, breaker_cooldown=60)
+        with patch.object(Session, 'post', return_value=self.response(503)) as mock_post:
+            self.assertIsNone(interface.post('/clusters/list'))
+            self.assertEqual(
+                interface.breaker_states(),
+                {'POST https://10.10.10.10:9440/clusters/list': (CircuitBreaker.CLOSED, 1)}
+            )
+            self.assertIsNone(interface.post('/clusters/list'))
+            self.assertEqual(
+                interface.breaker_states(),
+                {'POST https://10.10.10.10:9440/clusters/list': (CircuitBreaker.OPEN, 2)}
+            )
+            self.assertRaises(VirtError, interface.post, '/clusters/list')
+            self.assertEqual(mock_post.call_count, 2)
+
+            # Other endpoints are not affected
+            mock_post.return_value = self.response(200)
+            self.assertIsNotNone(interface.post('/hosts/list'))
+
+        # After the cool-down one request is let through
+        breaker = interface._breaker('post', 'https://10.10.10.10:9440/clusters/list')
+        breaker.opened -= 60
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with patch.object(Session, 'post', return_value=self.response(200)):
+            self.assertIsNotNone(interface.post('/clusters/list'))
+        self.assertEqual(interface.breaker_states(), {})
+
+
+class TestAhvRefresh(TestBase):
+
+    def setUp(self):
+        config = AhvConfigSection('test', None)
+        config.update(type='ahv', server='10.10.10.10', username='username', password='password',
+                      owner='owner', prism_central=True)
+        config.validate()
+        self.ahv = Ahv(self.logger, config, Datastore(), interval=DefaultInterval)
+
+    @patch('virtwho.virt.ahv.ahv.Ahv.get_host_guest_mapping_v3')
+    def test_mapping_reused_without_changes(self, get_mapping):
+        get_mapping.side_effect = lambda: {'hypervisors': []}
+        with patch.object(self.ahv._interface, 'get_change_marker', return_value=((10, 'vm', 5, 1),)) as marker:
+            first = self.ahv.getHostGuestMapping()
+            self.assertIs(self.ahv.getHostGuestMapping(), first)
+            self.assertEqual(get_mapping.call_count, 1)
+
+            marker.return_value = ((11, 'vm', 6, 1),)
+            self.assertIsNot(self.ahv.getHostGuestMapping(), first)
+            self.assertEqual(get_mapping.call_count, 2)
+
+            # Unknown state of VMs and hosts
+            marker.return_value = None
+            self.ahv.getHostGuestMapping()
+            self.ahv.getHostGuestMapping()
+            self.assertEqual(get_mapping.call_count, 4)
+
+    @patch('virtwho.virt.ahv.ahv.Ahv.get_host_guest_mapping_v3')
+    def test_mapping_reuses_limited(self, get_mapping):
+        get_mapping.side_effect = lambda: {'hypervisors': []}
+        self.assertEqual(self.ahv.interval, DefaultInterval)
+        waits = []
+
+        def wait(wait_time):
+            waits.append(wait_time)
+            if len(waits) == 8:
+                self.ahv.stop()
+
+        self.ahv.wait = wait
+        self.ahv._send_data = Mock()
+        with patch.object(self.ahv._interface, 'get_change_marker', return_value=((10, 'vm', 5, 1),)):
+            self.ahv._run()
+
+        self.assertEqual(waits, [DefaultInterval] * 8)
+        # Full walk in the first cycle and after three reuses of its mapping
+        self.assertEqual(get_mapping.call_count, 2)
+        self.assertEqual(self.ahv._send_data.call_count, 8)
+
+    @patch('virtwho.virt.ahv.ahv.Ahv.getHostGuestMapping', return_value={'hypervisors': []})
+    def test_mapping_sent_each_interval(self, get_mapping):
+        self.ahv.interval = 0.01
+        reports = []
+
+        def send_data(data_to_send):
+            reports.append(data_to_send)
+            if len(reports) == 3:
+                self.ahv.terminate_event.set()
+
+        self.ahv._send_data = send_data
+        self.ahv._run()
+
+        self.assertEqual(get_mapping.call_count, 3)
+        for report in reports:
+            self.assertIsInstance(report, virt.HostGuestAssociationReport)
+
+    def test_wait_interrupted(self):
+        self.ahv.terminate_event.set()
+        with patch('virtwho.virt.ahv.ahv.time.sleep') as sleep:
+            self.ahv.wait(3600)
+        sleep.assert_not_called()
+
+    def test_wait_stopped(self):
+        self.ahv.terminate_event = Event()
+        self.ahv.delta_time = 3600
+        timer = Timer(0.05, self.ahv.stop)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        start = time.monotonic()
+        self.ahv.wait(3600)
+        self.assertLess(time.monotonic() - start, 60)
+
+    @patch('virtwho.virt.ahv.ahv.Ahv.get_host_guest_mapping_v3')
+    def test_partial_mapping_not_reused(self, get_mapping):
+        def mapping():
+            # The first walk misses some pages
+            if get_mapping.call_count == 1:
+                self.ahv._interface.incomplete = True
+            return {'hypervisors': []}
+        get_mapping.side_effect = mapping
+        with patch.object(self.ahv._interface, 'get_change_marker', return_value=((10, 'vm', 5, 1),)):
+            for i in range(3):
+                self.ahv.getHostGuestMapping()
+        # The complete mapping of the second walk is reused
+        self.assertEqual(get_mapping.call_count, 2)
+
+    def test_change_marker(self):
+        interface = self.ahv._interface
+
+        def post(uri, **kwargs):
+            self.assertEqual(kwargs['json']['sort_attribute'], 'last_update_time')
+            response = Mock()
+            response.json.return_value = {
+                'entities': [{'metadata': {'uuid': uri, 'last_update_time': '2026-01-01T00:00:00Z', 'spec_version': 3}}],
+                'metadata': {'length': 1, 'offset': 0, 'total_matches': 42},
+            }
+            return response
+
+        with patch.object(interface, 'post', side_effect=post):
+            self.assertEqual(interface.get_change_marker(), (
+                (42, '/vms/list', '2026-01-01T00:00:00Z', 3),
+                (42, '/hosts/list', '2026-01-01T00:00:00Z', 3),
+            ))
+        with patch.object(interface, 'post', return_value=None):
+            self.assertIsNone(interface.get_change_marker())
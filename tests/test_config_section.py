@@ -207,6 +207,23 @@ class TestConfigSection(TestBase):
         self.assertEqual(self.my_config['my_bool'], True)
         self.assertEqual(self.my_config.state, ValidationState.VALID)
 
+    def test_validate_positive_integer_option(self):
+        """
+        Test validation of positive integer option, wrong value is replaced by default
+        """
+        self.my_config.add_key('my_int', validation_method=self.my_config._validate_positive_integer, default=5)
+        self.my_config['my_int'] = '20'
+        self.assertEqual(self.my_config.validate(), [])
+        self.assertEqual(self.my_config['my_int'], 20)
+
+        for value in ('0', '-1', 'many'):
+            self.init_config_section()
+            self.my_config.add_key('my_int', validation_method=self.my_config._validate_positive_integer, default=5)
+            self.my_config['my_int'] = value
+            result = self.my_config.validate()
+            self.assertEqual(result, [('warning', '"my_int" must be a positive integer, using default: 5')])
+            self.assertEqual(self.my_config['my_int'], 5)
+
     def test_update_values(self):
         """
         Test updating values
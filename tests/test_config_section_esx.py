@@ -66,6 +66,14 @@ class TestEsxConfigSection(ConfigSectionValidationTests, TestBase):
         'exclude_host_parents': None,
         'hypervisor_id': 'uuid',
         'simplified_vim': True,
+        'generate_simplified_vim': False,
+        'container_view': False,
+        'wsdl_cache_dir': '/var/cache/virt-who/esx',
+        'pool_size': 10,
+        'keepalive_interval': 600,
+        'page_size': 1000,
+        'partition': 'none',
+        'partition_workers': 4,
         'sm_type': SAT6,
     }
 
@@ -21,7 +21,10 @@ from __future__ import print_function
 Test validating of HypervConfigSection
 """
 
+import tempfile
+
 from base import ConfigSectionValidationTests, TestBase
+from virtwho.config import ValidationState
 from virtwho.virt.hyperv.hyperv import HypervConfigSection
 
 
@@ -50,5 +53,38 @@ class TestHyperVConfigSection(ConfigSectionValidationTests, TestBase):
 
     DEFAULTS = {
         'hypervisor_id': 'uuid',
+        'page_size': 100,
+        'pool_size': 4,
+        'host_facts_ttl': 3600,
+        'workers': 10,
+        'use_events': False,
         'sm_type': 'sam',
     }
+
+    def _validated(self, **values):
+        config = self._modified_dict(self.VALID_CONFIG, excluding=['server'])
+        config.update(values)
+        config = self.CONFIG_CLASS.from_dict(config, "test", None)
+        config.validate()
+        return config
+
+    def test_hosts_instead_of_server(self):
+        config = self._validated(hosts='host1, https://host2, http://host3:1234/wsman')
+        self.assertEqual(config.state, ValidationState.VALID)
+        self.assertEqual(config['hosts'], [
+            'http://host1:5985/wsman',
+            'https://host2:5986/wsman',
+            'http://host3:1234/wsman',
+        ])
+
+    def test_hosts_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+            f.write('# Hyper-V servers\nhost1\n\n  host2  \n')
+            f.flush()
+            config = self._validated(hosts_file=f.name)
+        self.assertEqual(config.state, ValidationState.VALID)
+        self.assertEqual(config['hosts_file_urls'], ['http://host1:5985/wsman', 'http://host2:5985/wsman'])
+
+    def test_hosts_file_missing(self):
+        config = self._validated(hosts_file='/nonexistent/hosts.txt')
+        self.assertEqual(config.state, ValidationState.INVALID)
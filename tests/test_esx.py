@@ -21,10 +21,15 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 
 import os
+import shutil
+import tempfile
 import requests
 import virtwho.virt.esx.suds
+from collections import defaultdict
+from io import BytesIO
 from mock import patch, ANY, MagicMock, Mock
 from threading import Event
+from xml.parsers.expat import ExpatError
 
 from base import TestBase
 from virtwho import DefaultInterval
@@ -34,7 +39,12 @@ from virtwho.virt import VirtError, Guest, Hypervisor, HostGuestAssociationRepor
 
 from proxy import Proxy
 
-from virtwho.virt.esx.esx import EsxConfigSection
+from virtwho.virt.esx.esx import EsxConfigSection, WsdlCache, RequestsTransport, ResponseStream, SessionRegistry, Host, VM, Cluster
+from virtwho.virt.esx.updates import UpdateSetPlugin
+from virtwho.virt.esx.minimal_vim import MinimalWsdl, InvalidWsdlError
+
+
+ESX_DATA = os.path.join(os.path.dirname(__file__), 'complex', 'data', 'esx')
 
 
 class TestEsx(TestBase):
@@ -65,23 +75,25 @@ class TestEsx(TestBase):
 
     @patch('virtwho.virt.esx.suds.client.Client')
     def test_connect(self, mock_client):
-        mock_client.return_value.service.WaitForUpdatesEx.return_value = None
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
         self.run_once()
 
         self.assertTrue(mock_client.called)
-        mock_client.assert_called_with(ANY, location="https://localhost/sdk", cache=None, transport=ANY)
+        mock_client.assert_called_with(ANY, location="https://localhost/sdk", cache=WsdlCache.memory, cachingpolicy=1, transport=ANY,
+                                       lazyschema=True, compactobjects=True, plugins=ANY)
         mock_client.return_value.service.RetrieveServiceContent.assert_called_once_with(_this=ANY)
         mock_client.return_value.service.Login.assert_called_once_with(_this=ANY, userName='username', password='password')
 
     @patch('virtwho.virt.esx.suds.client.Client')
     def test_connect_utf_password(self, mock_client):
-        mock_client.return_value.service.WaitForUpdatesEx.return_value = None
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
         # Change password to include some UTF character
         self.esx.password = 'Žluťoučký_kůň'
         self.run_once()
 
         self.assertTrue(mock_client.called)
-        mock_client.assert_called_with(ANY, location="https://localhost/sdk", cache=None, transport=ANY)
+        mock_client.assert_called_with(ANY, location="https://localhost/sdk", cache=WsdlCache.memory, cachingpolicy=1, transport=ANY,
+                                       lazyschema=True, compactobjects=True, plugins=ANY)
         mock_client.return_value.service.RetrieveServiceContent.assert_called_once_with(_this=ANY)
         mock_client.return_value.service.Login.assert_called_once_with(
             _this=ANY, userName='username', password=u'Žluťoučký_kůň'
@@ -101,15 +113,271 @@ class TestEsx(TestBase):
     def test_disable_simplified_vim(self, mock_client):
         self.esx.config.simplified_vim = False
         mock_client.return_value.service.RetrievePropertiesEx.return_value = None
-        mock_client.return_value.service.WaitForUpdatesEx.return_value.truncated = False
         self.run_once()
 
         self.assertTrue(mock_client.called)
         mock_client.assert_called_with(ANY, location="https://localhost/sdk", transport=ANY,
-                                       cache=None)
+                                       cache=WsdlCache.memory, cachingpolicy=1, lazyschema=True, compactobjects=True, plugins=ANY)
         mock_client.return_value.service.RetrieveServiceContent.assert_called_once_with(_this=ANY)
         mock_client.return_value.service.Login.assert_called_once_with(_this=ANY, userName='username', password='password')
 
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_container_view(self, mock_client):
+        self.esx.config['container_view'] = True
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
+        views = [Mock(), Mock(), Mock()]
+        mock_client.return_value.service.CreateContainerView.side_effect = views
+        mock_client.return_value.factory.create.side_effect = lambda *args: Mock()
+        self.run_once()
+
+        service = mock_client.return_value.service
+        sc = service.RetrieveServiceContent.return_value
+        self.assertEqual(
+            [call.kwargs['type'] for call in service.CreateContainerView.call_args_list],
+            [['HostSystem'], ['VirtualMachine'], ['ClusterComputeResource']])
+        for call in service.CreateContainerView.call_args_list:
+            self.assertEqual(call.kwargs['_this'], sc.viewManager)
+            self.assertEqual(call.kwargs['container'], sc.rootFolder)
+            self.assertTrue(call.kwargs['recursive'])
+        spec = service.RetrievePropertiesEx.call_args.kwargs['specSet'][0]
+        self.assertEqual([oSpec.obj for oSpec in spec.objectSet], views)
+        self.assertEqual([oSpec.skip for oSpec in spec.objectSet], [True] * 3)
+        # Views are destroyed after the objects are retrieved
+        self.assertEqual([call.args[0] for call in service.DestroyView.call_args_list], views)
+        self.assertEqual(self.esx.views, [])
+
+    @patch('virtwho.virt.esx.esx.RequestsTransport.open')
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_wsdl_cache(self, mock_client, mock_open):
+        versions = (b'<namespaces version="1.0"><namespace><name>urn:vim25</name>'
+                    b'<version>7.0.3.0</version></namespace></namespaces>')
+
+        def open_url(request):
+            if request.url.endswith('/sdk/vimServiceVersions.xml'):
+                return BytesIO(versions)
+            return BytesIO(b'<definitions/>')
+        mock_open.side_effect = open_url
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.esx.config['simplified_vim'] = False
+        self.esx.config['wsdl_cache_dir'] = cache_dir
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
+        self.run_once()
+
+        mock_client.assert_called_with("https://localhost/sdk/vimService.wsdl", location="https://localhost/sdk",
+                                       transport=ANY, cache=ANY, cachingpolicy=1,
+                                       lazyschema=True, compactobjects=True, plugins=ANY)
+        wsdl_cache = mock_client.call_args[1]['cache']
+        self.assertIsInstance(wsdl_cache, WsdlCache)
+        self.assertEqual(wsdl_cache.key, 'vim25-7.0.3.0')
+        self.assertEqual(wsdl_cache.location, cache_dir)
+        # Only suds reads the WSDL, when the definitions aren't cached yet
+        self.assertEqual([c.args[0].url for c in mock_open.call_args_list],
+                         ['https://localhost/sdk/vimServiceVersions.xml'])
+
+    @patch('virtwho.virt.esx.esx.RequestsTransport.open')
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_wsdl_cache_unknown_version(self, mock_client, mock_open):
+        mock_open.side_effect = requests.HTTPError('404 Not Found')
+        self.esx.config['simplified_vim'] = False
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
+        self.run_once()
+
+        mock_client.assert_called_with("https://localhost/sdk/vimService.wsdl", location="https://localhost/sdk",
+                                       transport=ANY, cache=None, cachingpolicy=1,
+                                       lazyschema=True, compactobjects=True, plugins=ANY)
+
+    @patch('virtwho.virt.esx.suds.client.ServiceSelector')
+    @patch('virtwho.virt.esx.suds.client.Definitions', wraps=virtwho.virt.esx.suds.wsdl.Definitions)
+    def test_simplified_vim_parsed_once(self, definitions, service_selector):
+        WsdlCache.clear_memory()
+        self.addCleanup(WsdlCache.clear_memory)
+        other = Esx(self.logger, self.esx.config, None, interval=DefaultInterval)
+        for esx in (self.esx, self.esx, other):
+            esx.login()
+
+        # Logins of all instances share definitions of the bundled WSDL
+        self.assertEqual(definitions.call_count, 1)
+        self.assertEqual(len(WsdlCache.memory), 1)
+        self.assertIs(self.esx.client.wsdl, other.client.wsdl)
+
+    def test_wsdl_cache_shared(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.addCleanup(WsdlCache.clear_memory)
+        definitions = {'types': ['HostSystem', 'VirtualMachine']}
+        WsdlCache('vim25-7.0-abc', location=cache_dir).put('ignored', definitions)
+
+        # Another instance for the same version gets the same object
+        self.assertIs(WsdlCache('vim25-7.0-abc', location=cache_dir).get('other'), definitions)
+        self.assertIsNone(WsdlCache('vim25-8.0-abc', location=cache_dir).get('ignored'))
+
+        # Definitions survive restart of the process on disk
+        WsdlCache.clear_memory()
+        self.assertEqual(WsdlCache('vim25-7.0-abc', location=cache_dir).get('ignored'), definitions)
+
+    @patch('virtwho.virt.esx.esx.RequestsTransport.open')
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_generate_simplified_vim(self, mock_client, mock_open):
+        versions = (b'<namespaces version="1.0"><namespace><name>urn:vim25</name>'
+                    b'<version>8.0.2.0</version></namespace></namespaces>')
+        with open(os.path.join(os.path.dirname(virtwho.virt.esx.esx.__file__), 'vimServiceMinimal.wsdl'), 'rb') as f:
+            wsdl = f.read()
+
+        def open_url(request):
+            if request.url.endswith('/sdk/vimServiceVersions.xml'):
+                return BytesIO(versions)
+            if request.url.endswith('/sdk/vimService.wsdl'):
+                return BytesIO(wsdl)
+            raise requests.HTTPError('404 Not Found')
+        mock_open.side_effect = open_url
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.esx.config['generate_simplified_vim'] = True
+        self.esx.config['wsdl_cache_dir'] = cache_dir
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
+        self.run_once()
+
+        path = os.path.join(cache_dir, 'vimServiceMinimal-8.0.2.0.wsdl')
+        mock_client.assert_called_with('file://' + path, location="https://localhost/sdk", transport=ANY,
+                                       cache=WsdlCache.memory, cachingpolicy=1, lazyschema=True, compactobjects=True, plugins=ANY)
+        self.assertTrue(os.path.exists(path))
+
+        # The WSDL is created only once for the API version
+        mock_open.reset_mock()
+        self.run_once()
+        self.assertEqual([c.args[0].url for c in mock_open.call_args_list],
+                         ['https://localhost/sdk/vimServiceVersions.xml'])
+        mock_client.assert_called_with('file://' + path, location=ANY, transport=ANY, cache=WsdlCache.memory, cachingpolicy=1,
+                                       lazyschema=True, compactobjects=True, plugins=ANY)
+
+    @patch('virtwho.virt.esx.esx.RequestsTransport.open')
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_generate_simplified_vim_failure(self, mock_client, mock_open):
+        versions = (b'<namespaces version="1.0"><namespace><name>urn:vim25</name>'
+                    b'<version>8.0.2.0</version></namespace></namespaces>')
+
+        def open_url(request):
+            if request.url.endswith('/sdk/vimServiceVersions.xml'):
+                return BytesIO(versions)
+            return BytesIO(b'<definitions/>')
+        mock_open.side_effect = open_url
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.esx.config['generate_simplified_vim'] = True
+        self.esx.config['wsdl_cache_dir'] = cache_dir
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
+        self.run_once()
+
+        # The bundled WSDL is used instead
+        self.assertTrue(mock_client.call_args.args[0].endswith('/esx/vimServiceMinimal.wsdl'))
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_minimal_wsdl(self):
+        documents = {
+            'https://localhost/sdk/vimService.wsdl': b"""<?xml version="1.0" encoding="UTF-8"?>
+<definitions targetNamespace="urn:vim25Service" xmlns="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:interface="urn:vim25" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/">
+  <import location="vim.wsdl" namespace="urn:vim25"/>
+  <service name="VimService">
+    <port binding="interface:VimBinding" name="VimPort">
+      <soap:address location="https://localhost/sdk/vimService"/>
+    </port>
+  </service>
+</definitions>""",
+            'https://localhost/sdk/vim.wsdl': b"""<?xml version="1.0" encoding="UTF-8"?>
+<definitions targetNamespace="urn:vim25" xmlns="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" xmlns:vim25="urn:vim25">
+  <types>
+    <schema targetNamespace="urn:vim25" xmlns="http://www.w3.org/2001/XMLSchema" elementFormDefault="qualified">
+      <include schemaLocation="vim-messages.xsd"/>
+    </schema>
+  </types>
+  <message name="CurrentTimeRequestMsg"><part name="parameters" element="vim25:CurrentTime"/></message>
+  <message name="CurrentTimeResponseMsg"><part name="parameters" element="vim25:CurrentTimeResponse"/></message>
+  <message name="RebootHostRequestMsg"><part name="parameters" element="vim25:RebootHost"/></message>
+  <portType name="VimPortType">
+    <operation name="CurrentTime">
+      <input message="vim25:CurrentTimeRequestMsg"/>
+      <output message="vim25:CurrentTimeResponseMsg"/>
+    </operation>
+    <operation name="RebootHost">
+      <input message="vim25:RebootHostRequestMsg"/>
+    </operation>
+  </portType>
+  <binding name="VimBinding" type="vim25:VimPortType">
+    <soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+    <operation name="CurrentTime">
+      <soap:operation soapAction="urn:vim25/8.0" style="document"/>
+      <input><soap:body use="literal"/></input>
+      <output><soap:body use="literal"/></output>
+    </operation>
+    <operation name="RebootHost">
+      <soap:operation soapAction="urn:vim25/8.0" style="document"/>
+      <input><soap:body use="literal"/></input>
+    </operation>
+  </binding>
+</definitions>""",
+            'https://localhost/sdk/vim-messages.xsd': b"""<?xml version="1.0" encoding="UTF-8"?>
+<schema targetNamespace="urn:vim25" xmlns="http://www.w3.org/2001/XMLSchema" xmlns:vim25="urn:vim25"
+    elementFormDefault="qualified">
+  <include schemaLocation="vim-types.xsd"/>
+  <element name="CurrentTime" type="vim25:CurrentTimeRequestType"/>
+  <element name="CurrentTimeResponse">
+    <complexType><sequence><element name="returnval" type="dateTime"/></sequence></complexType>
+  </element>
+  <element name="RebootHost" type="vim25:RebootHostRequestType"/>
+</schema>""",
+            'https://localhost/sdk/vim-types.xsd': b"""<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema targetNamespace="urn:vim25" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:vim="urn:vim25"
+    elementFormDefault="qualified">
+  <xsd:complexType name="ManagedObjectReference">
+    <xsd:simpleContent>
+      <xsd:extension base="xsd:string"><xsd:attribute name="type" type="xsd:string"/></xsd:extension>
+    </xsd:simpleContent>
+  </xsd:complexType>
+  <xsd:complexType name="CurrentTimeRequestType">
+    <xsd:sequence><xsd:element name="_this" type="vim:ManagedObjectReference"/></xsd:sequence>
+  </xsd:complexType>
+  <xsd:complexType name="RebootHostRequestType">
+    <xsd:sequence><xsd:element name="_this" type="vim:ManagedObjectReference"/></xsd:sequence>
+  </xsd:complexType>
+  <xsd:complexType name="DynamicData">
+    <xsd:sequence><xsd:element name="dynamicType" type="xsd:string" minOccurs="0"/></xsd:sequence>
+  </xsd:complexType>
+  <xsd:complexType name="HostListSummary">
+    <xsd:complexContent>
+      <xsd:extension base="vim:DynamicData">
+        <xsd:sequence><xsd:element name="host" type="vim:ManagedObjectReference"/></xsd:sequence>
+      </xsd:extension>
+    </xsd:complexContent>
+  </xsd:complexType>
+  <xsd:complexType name="VirtualMachineSummary">
+    <xsd:complexContent>
+      <xsd:extension base="vim:DynamicData">
+        <xsd:sequence><xsd:element name="vm" type="vim:ManagedObjectReference"/></xsd:sequence>
+      </xsd:extension>
+    </xsd:complexContent>
+  </xsd:complexType>
+</xsd:schema>""",
+        }
+        wsdl = MinimalWsdl(lambda url: documents[url], methods=['CurrentTime'], types=['HostListSummary'])
+        content = wsdl.build('https://localhost/sdk/vimService.wsdl')
+
+        self.assertNotIn(b'RebootHost', content)
+        self.assertNotIn(b'VirtualMachineSummary', content)
+        store = virtwho.virt.esx.suds.store.DocumentStore(wsdl=content)
+        suds_client = virtwho.virt.esx.suds.client.Client('suds://wsdl', documentStore=store, cache=None, nosend=True)
+        self.assertEqual([m for m in suds_client.wsdl.services[0].ports[0].methods], ['CurrentTime'])
+        self.assertEqual(sorted(t[0] for t in suds_client.wsdl.schema.types),
+                         ['CurrentTimeRequestType', 'DynamicData', 'HostListSummary', 'ManagedObjectReference'])
+        summary = suds_client.factory.create('ns0:HostListSummary')
+        self.assertEqual(sorted(k for k, v in summary), ['dynamicType', 'host'])
+
+        # All the operations virt-who uses have to be there
+        wsdl = MinimalWsdl(lambda url: documents[url])
+        self.assertRaises(InvalidWsdlError, wsdl.build, 'https://localhost/sdk/vimService.wsdl')
+
     @patch('virtwho.virt.esx.suds.client.Client')
     def test_getHostGuestMapping(self, mock_client):
         expected_hostname = 'hostname.domainname'
@@ -166,9 +434,71 @@ class TestEsx(TestBase):
         result = self.esx.getHostGuestMapping()['hypervisors'][0]
         self.assertEqual(expected_result.toDict(), result.toDict())
 
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_prepare_reuses_session(self, mock_client):
+        service = mock_client.return_value.service
+        service.CreateFilter.side_effect = ['filter1', 'filter2', 'filter3']
+        self.esx._prepare()
+        self.esx._prepare()
+        # Only the filter is created again while the session is valid
+        self.assertEqual(mock_client.call_count, 1)
+        service.Login.assert_called_once_with(_this=ANY, userName='username', password='password')
+        service.CurrentTime.prepare.assert_called_once_with([], _this=self.esx.moRef)
+        service.CurrentTime.prepare.return_value.assert_called_once_with()
+        service.DestroyPropertyFilter.assert_called_once_with('filter1')
+        self.assertEqual(self.esx.filter, 'filter2')
+
+        # Log in again when the server dropped the session
+        service.CurrentTime.prepare.return_value.side_effect = virtwho.virt.esx.suds.WebFault(
+            Mock(faultstring='The session is not authenticated.'), '')
+        self.esx._prepare()
+        self.assertEqual(service.Login.call_count, 2)
+        self.assertEqual(service.DestroyPropertyFilter.call_count, 1)
+        self.assertEqual(self.esx.filter, 'filter3')
+
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_resume_version(self, mock_client):
+        service = mock_client.return_value.service
+        versions = []
+
+        def wait_for_updates(version):
+            versions.append(version)
+            if len(versions) == 1:
+                return Mock(version='1', truncated=False, filterSet=[])
+            if len(versions) == 2:
+                raise requests.Timeout('timed out')
+            if len(versions) == 3:
+                raise virtwho.virt.esx.suds.WebFault(Mock(faultstring='Unknown error'), '')
+            if len(versions) == 4:
+                raise virtwho.virt.esx.suds.WebFault(Mock(faultstring='Unknown error'), '')
+            self.esx.stop()
+            return None
+        service.WaitForUpdatesEx.prepare.return_value.side_effect = wait_for_updates
+        self.esx.dest = Mock(spec=Datastore())
+        self.esx.interval = 0
+        self.esx._run()
+
+        # Timeout and the first fault are retried from the same version,
+        # repeated fault creates new filter in the same session
+        self.assertEqual(versions, ['', '1', '1', '1', ''])
+        service.Login.assert_called_once_with(_this=ANY, userName='username', password='password')
+        self.assertEqual(service.CreateFilter.call_count, 2)
+
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_wait_keepalive(self, mock_client):
+        self.esx.login()
+        self.esx.config['keepalive_interval'] = 1
+        self.esx.wait = Mock()
+        with patch('virtwho.virt.esx.esx.time') as mock_time:
+            # Every wait lasts one keepalive interval
+            mock_time.side_effect = [0, 0, 1, 1, 2, 2, 3, 3]
+            self.esx.waitKeepAlive(3)
+        self.assertEqual(self.esx.wait.call_count, 3)
+        self.assertEqual(mock_client.return_value.service.CurrentTime.prepare.return_value.call_count, 2)
+
     @patch('virtwho.virt.esx.suds.client.Client')
     def test_status(self, mock_client):
-        mock_client.return_value.service.WaitForUpdatesEx.return_value = None
+        mock_client.return_value.service.WaitForUpdatesEx.prepare.return_value.return_value = None
         self.esx.status = True
         self.esx._send_data = Mock()
         self.run_once()
@@ -384,12 +714,8 @@ class TestEsx(TestBase):
     def test_oneshot(self, mock_client):
         expected_assoc = '"well formed HostGuestMapping"'
         expected_report = HostGuestAssociationReport(self.esx.config, expected_assoc)
-        updateSet = Mock()
-        updateSet.version = 'some_new_version_string'
-        updateSet.truncated = False
-        mock_client.return_value.service.WaitForUpdatesEx.return_value = updateSet
+        mock_client.return_value.service.RetrievePropertiesEx.return_value = None
         datastore = Datastore()
-        self.esx.applyUpdates = Mock()
         getHostGuestMappingMock = Mock()
         getHostGuestMappingMock.return_value = expected_assoc
         self.esx.getHostGuestMapping = getHostGuestMappingMock
@@ -399,6 +725,98 @@ class TestEsx(TestBase):
         self.assertEqual(expected_report.config._values, result_report.config._values)
         self.assertEqual(expected_report._assoc, result_report._assoc)
 
+    def test_oneshot_snapshot(self):
+        # Parse the pages by real suds client
+        wsdl = 'file://%s/vimServiceMinimal.wsdl' % os.path.dirname(virtwho.virt.esx.esx.__file__)
+        client = virtwho.virt.esx.suds.client.Client(
+            wsdl, location="https://localhost/sdk", transport=RequestsTransport(),
+            cache=None, lazyschema=True, compactobjects=True, nosend=True)
+        pages = []
+        for method in ['RetrievePropertiesEx', 'ContinueRetrievePropertiesEx']:
+            request = getattr(client.service, method)()
+            with open(os.path.join(ESX_DATA, 'esx_%sresponse.xml' % method.lower()), 'rb') as f:
+                pages.append(request.process_reply(f.read()))
+
+        self.esx.config['page_size'] = 4
+        datastore = Datastore()
+        with patch('virtwho.virt.esx.suds.client.Client') as mock_client:
+            service = mock_client.return_value.service
+            service.RetrievePropertiesEx.return_value = pages[0]
+            service.ContinueRetrievePropertiesEx.return_value = pages[1]
+            self.run_once(datastore)
+
+        self.assertEqual(service.RetrievePropertiesEx.call_args.kwargs['options'].maxObjects, 4)
+        service.ContinueRetrievePropertiesEx.assert_called_once_with(_this=ANY, token='1')
+        service.CreateFilter.assert_not_called()
+        service.WaitForUpdatesEx.prepare.return_value.assert_not_called()
+        service.Logout.assert_called_once_with(_this=ANY)
+
+        # The snapshot gives the same mapping as the initial update set
+        esx = Esx(self.logger, self.esx.config, None, interval=DefaultInterval)
+        esx.hosts = defaultdict(Host)
+        esx.vms = defaultdict(VM)
+        esx.clusters = defaultdict(Cluster)
+        with open(os.path.join(ESX_DATA, 'esx_waitforupdatesexresponse_0.xml'), 'rb') as f:
+            self.processWaitForUpdates(esx, False, f.read())
+        result_report = datastore.get(self.esx.config.name)
+        self.assertEqual(
+            [hypervisor.toDict() for hypervisor in result_report._assoc['hypervisors']],
+            [hypervisor.toDict() for hypervisor in esx.getHostGuestMapping()['hypervisors']])
+
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_partitions(self, mock_client):
+        self.esx.config['partition'] = 'cluster'
+        self.esx.config['partition_workers'] = 2
+        service = mock_client.return_value.service
+        mock_client.return_value.factory.create.side_effect = lambda *args: Mock()
+        roots = [Mock(), Mock(), Mock()]
+
+        def objectContent(type, value):
+            content = Mock(propSet=[])
+            content.obj._type = type
+            content.obj.value = value
+            return content
+
+        def retrieve(_this, specSet, options):
+            objectSet = specSet[0].objectSet
+            if objectSet[0].skip is True:
+                # Listing of the clusters
+                return Mock(objects=[Mock(obj=root) for root in roots], token=None)
+            # Every worker reports one host for each of its clusters
+            return Mock(objects=[objectContent('HostSystem', str(roots.index(oSpec.obj)))
+                                 for oSpec in objectSet], token=None)
+        service.RetrievePropertiesEx.side_effect = retrieve
+        self.esx.getHostGuestMapping = Mock(return_value={'hypervisors': []})
+        self.run_once()
+
+        # One session to list the clusters and one for each worker
+        self.assertEqual(service.Login.call_count, 3)
+        self.assertEqual(service.Logout.call_count, 3)
+        service.CreateContainerView.assert_called_once_with(
+            _this=ANY, container=ANY, type=['ComputeResource'], recursive=True)
+        specs = [call.kwargs['specSet'][0] for call in service.RetrievePropertiesEx.call_args_list[1:]]
+        self.assertEqual(
+            sorted([roots.index(oSpec.obj) for oSpec in spec.objectSet] for spec in specs),
+            [[0, 2], [1]])
+        self.assertEqual(sorted(self.esx.hosts), ['0', '1', '2'])
+        self.assertEqual(self.esx.partitions, [])
+
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_partition_collect_updates(self, mock_client):
+        service = mock_client.return_value.service
+        service.WaitForUpdatesEx.prepare.return_value.side_effect = [
+            Mock(version='1', truncated=True, filterSet=[]),
+            Mock(version='2', truncated=False, filterSet=[]),
+            None,
+        ]
+        self.esx.roots = [Mock()]
+        self.assertEqual(self.esx.collectUpdates(), '2')
+        self.assertEqual(service.WaitForUpdatesEx.prepare.return_value.call_args.kwargs['version'], '1')
+        # The filter is kept for the next collection
+        self.assertEqual(self.esx.collectUpdates(), '2')
+        service.CreateFilter.assert_called_once_with(_this=ANY, spec=ANY, partialUpdates=0)
+        self.assertEqual(service.WaitForUpdatesEx.prepare.return_value.call_args.kwargs['version'], '2')
+
     def test_proxy(self):
         self.esx.config['simplified_vim'] = True
         proxy = Proxy()
@@ -592,3 +1010,186 @@ class TestEsx(TestBase):
         # multi-list no match
         self.esx.config['exclude_host_parents'] = ["wrongParent", "notThisOne"]
         self.assertFalse(self.esx.skip_for_parent("test", host))
+
+    def processWaitForUpdates(self, esx, plugin, reply):
+        ''' Process WaitForUpdatesEx reply by real suds client '''
+        wsdl = 'file://%s/vimServiceMinimal.wsdl' % os.path.dirname(virtwho.virt.esx.esx.__file__)
+        plugins = [UpdateSetPlugin(esx.applyObjectUpdate)] if plugin else []
+        esx.client = virtwho.virt.esx.suds.client.Client(
+            wsdl, location="https://localhost/sdk", transport=RequestsTransport(),
+            cache=None, lazyschema=True, compactobjects=True, nosend=True, plugins=plugins)
+        propertyCollector = virtwho.virt.esx.suds.sudsobject.Property('propertyCollector')
+        propertyCollector._type = 'PropertyCollector'
+        request = esx.client.service.WaitForUpdatesEx(_this=propertyCollector)
+        updateSet = request.process_reply(reply)
+        esx.applyUpdates(updateSet)
+        return updateSet
+
+    def test_update_set_decoder(self):
+        esx = Esx(self.logger, self.esx.config, None, interval=DefaultInterval)
+        for esx_instance, plugin in ((self.esx, True), (esx, False)):
+            esx_instance.hosts = defaultdict(Host)
+            esx_instance.vms = defaultdict(VM)
+            esx_instance.clusters = defaultdict(Cluster)
+            for filename in ['esx_waitforupdatesexresponse_0.xml', 'esx_waitforupdatesexresponse_1.xml']:
+                with open(os.path.join(ESX_DATA, filename), 'rb') as f:
+                    updateSet = self.processWaitForUpdates(esx_instance, plugin, f.read())
+                if plugin:
+                    # Decoded update set contains only the version
+                    self.assertFalse(hasattr(updateSet, 'filterSet'))
+            self.assertEqual(updateSet.version, '2')
+
+        self.assertEqual(sorted(self.esx.hosts), sorted(esx.hosts))
+        self.assertEqual(sorted(self.esx.vms), sorted(esx.vms))
+        self.assertEqual(sorted(self.esx.clusters), sorted(esx.clusters))
+        host = self.esx.hosts['ha-host']
+        self.assertEqual(host['hardware.cpuInfo.numCpuPackages'], 1)
+        self.assertEqual(host['parent']._type, 'ClusterComputeResource')
+        self.assertEqual(host['parent'].value, 'ha-compute-res')
+        self.assertEqual(
+            [vm.value for vm in host['vm'].ManagedObjectReference],
+            [vm.value for vm in esx.hosts['ha-host']['vm'].ManagedObjectReference])
+        self.assertEqual(
+            [hypervisor.toDict() for hypervisor in self.esx.getHostGuestMapping()['hypervisors']],
+            [hypervisor.toDict() for hypervisor in esx.getHostGuestMapping()['hypervisors']])
+
+    def test_update_set_decoder_fault(self):
+        self.esx.hosts = defaultdict(Host)
+        self.esx.vms = defaultdict(VM)
+        self.esx.clusters = defaultdict(Cluster)
+        fault = b'''<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body>
+    <soapenv:Fault>
+      <faultcode>ServerFaultCode</faultcode>
+      <faultstring>The session is not authenticated.</faultstring>
+    </soapenv:Fault>
+  </soapenv:Body>
+</soapenv:Envelope>'''
+        # Streamed fault is replayed to suds after it's read by the decoder
+        for reply in (fault, BytesIO(fault)):
+            with self.assertRaises(virtwho.virt.esx.suds.WebFault) as e:
+                self.processWaitForUpdates(self.esx, True, reply)
+            self.assertEqual(e.exception.fault.faultstring, 'The session is not authenticated.')
+            self.assertEqual(self.esx.hosts, {})
+
+    def test_update_set_decoder_truncated(self):
+        with open(os.path.join(ESX_DATA, 'esx_waitforupdatesexresponse_0.xml'), 'rb') as f:
+            data = f.read()
+        # Cut the reply inside the second objectSet
+        second = data.index(b'<objectSet>', data.index(b'</objectSet>'))
+        truncated = data[:second + 40]
+        for reply in (truncated, BytesIO(truncated)):
+            self.esx.hosts = defaultdict(Host)
+            self.esx.vms = defaultdict(VM)
+            self.esx.clusters = defaultdict(Cluster)
+            # The parser error is raised, not replaced by failure of suds
+            with self.assertRaises(ExpatError):
+                self.processWaitForUpdates(self.esx, True, reply)
+
+    @patch('virtwho.virt.esx.suds.client.Client')
+    def test_invalid_update_set_resync(self, mock_client):
+        service = mock_client.return_value.service
+        versions = []
+
+        def wait_for_updates(version):
+            versions.append(version)
+            if len(versions) == 1:
+                return Mock(version='1', truncated=False, filterSet=[])
+            if len(versions) == 2:
+                raise ExpatError('no element found')
+            self.esx.stop()
+            return None
+        service.WaitForUpdatesEx.prepare.return_value.side_effect = wait_for_updates
+        self.esx.dest = Mock(spec=Datastore())
+        self.esx.interval = 0
+        self.esx._run()
+
+        # Inventory is collected again from scratch with new filter
+        self.assertEqual(versions, ['', '1', ''])
+        self.assertEqual(service.CreateFilter.call_count, 2)
+
+    def test_update_set_decoder_stream(self):
+        self.esx.hosts = defaultdict(Host)
+        self.esx.vms = defaultdict(VM)
+        self.esx.clusters = defaultdict(Cluster)
+        with open(os.path.join(ESX_DATA, 'esx_waitforupdatesexresponse_0.xml'), 'rb') as f:
+            updateSet = self.processWaitForUpdates(self.esx, True, f)
+        self.assertEqual(updateSet.version, '1')
+        self.assertEqual(len(self.esx.hosts), 4)
+        self.assertEqual(self.esx.vms['1百']['runtime.powerState'], 'poweredOn')
+
+    @patch('virtwho.virt.esx.updates.CHUNK_SIZE', 1024)
+    def test_update_set_decoder_concurrent_reply(self):
+        with open(os.path.join(ESX_DATA, 'esx_waitforupdatesexresponse_0.xml'), 'rb') as f:
+            data = f.read()
+        cancel = b'''<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body>
+    <CancelWaitForUpdatesResponse xmlns="urn:vim25"></CancelWaitForUpdatesResponse>
+  </soapenv:Body>
+</soapenv:Envelope>'''
+        plugin = UpdateSetPlugin(self.esx.applyObjectUpdate)
+        self.esx.hosts = defaultdict(Host)
+        self.esx.vms = defaultdict(VM)
+        self.esx.clusters = defaultdict(Cluster)
+
+        class Reply(BytesIO):
+            # Another reply is received in the middle of the update set
+            def read(self, size=-1):
+                if self.tell() == 1024:
+                    plugin.received(Mock(reply=BytesIO(cancel)))
+                return BytesIO.read(self, size)
+        context = Mock(reply=Reply(data))
+        plugin.received(context)
+
+        self.assertIn(b'<version>1</version>', context.reply)
+        self.assertEqual(len(self.esx.hosts), 4)
+        self.assertEqual(self.esx.vms['1百']['runtime.powerState'], 'poweredOn')
+
+    def test_response_stream(self):
+        data = b'<?xml version="1.0"?><Envelope/>' * 1000
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = BytesIO(data)
+        stream = ResponseStream(response)
+        self.assertEqual(stream.read(10), data[:10])
+        self.assertEqual(stream.read(), data[10:])
+        self.assertEqual(stream.read(10), b'')
+        response.close = Mock()
+        stream.close()
+        self.assertTrue(stream.closed)
+        response.close.assert_called_once_with()
+
+    def test_session_registry(self):
+        SessionRegistry.clear()
+        self.addCleanup(SessionRegistry.clear)
+        first = SessionRegistry.transport('https://vcenter1', 4)
+        second = SessionRegistry.transport('https://vcenter1', 8)
+        other = SessionRegistry.transport('https://vcenter2:8443')
+
+        # Connection pool is shared, session cookies are not
+        adapter = first._session.get_adapter('https://vcenter1/sdk')
+        self.assertIs(adapter, second._session.get_adapter('https://vcenter1/sdk'))
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertIsNot(first._session, second._session)
+        self.assertIsNot(adapter, other._session.get_adapter('https://vcenter2:8443/sdk'))
+
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = BytesIO(b'<Envelope/>')
+        stream = ResponseStream(response, first._stats)
+        first._stats.add_request(100, 0, 0.5)
+        stream.read()
+        stream.close()
+        second._stats.add_request(50, 0, 1.5)
+
+        self.assertEqual(SessionRegistry.stats('https://vcenter1/sdk'), {
+            'requests': 2,
+            'bytes_sent': 150,
+            'bytes_received': 11,
+            'avg_latency': 1.0,
+            'max_latency': 1.5,
+        })
+        self.assertEqual(SessionRegistry.stats('https://vcenter2:8443')['requests'], 0)
+        self.assertEqual(sorted(SessionRegistry.stats()), ['vcenter1', 'vcenter2:8443'])
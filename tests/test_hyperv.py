@@ -22,16 +22,21 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 
 import os
+import re
+import time
 from mock import patch, MagicMock, ANY, Mock
+from concurrent.futures import ThreadPoolExecutor
 from threading import Event
-from queue import Queue
+from queue import Queue, Empty
 import requests
 
 from base import TestBase
 from proxy import Proxy
+from winrm import WinRM
 
 from virtwho import DefaultInterval
-from virtwho.virt.hyperv.hyperv import HyperV, HypervConfigSection
+from virtwho.virt.hyperv.hyperv import HyperV, HyperVSoap, HypervConfigSection, HyperVException, HyperVCallFailed
+from virtwho.virt.hyperv.hyperv import HOST_RETRY_MAX
 from virtwho.virt import VirtError, Guest, Hypervisor, StatusReport
 
 
@@ -137,6 +142,48 @@ class HyperVMock(object):
         pass
 
 
+class HyperVEvents(object):
+    """
+    WS-Management eventing of the fake WinRM endpoint, other requests are
+    answered by HyperVMock.
+    """
+    def __init__(self):
+        self.events = Queue()
+        self.subscribed = Event()
+        self.unsubscribed = Event()
+
+    def respond(self, data):
+        if 'eventing/Subscribe' in data:
+            self.subscribed.set()
+            return 200, HyperVMock.envelope('''
+                <e:SubscribeResponse xmlns:e="http://schemas.xmlsoap.org/ws/2004/08/eventing">
+                    <e:SubscriptionManager>
+                        <a:ReferenceParameters>
+                            <e:Identifier>uuid:00000000-0000-0000-0000-000000000010</e:Identifier>
+                        </a:ReferenceParameters>
+                    </e:SubscriptionManager>
+                    <wsen:EnumerationContext>uuid:00000000-0000-0000-0000-000000000009</wsen:EnumerationContext>
+                </e:SubscribeResponse>''').content
+        elif 'eventing/Unsubscribe' in data:
+            self.unsubscribed.set()
+            return 200, HyperVMock.envelope('').content
+        elif 'uuid:00000000-0000-0000-0000-000000000009' in data:
+            timeout = int(re.search(r'<wsman:OperationTimeout>PT(\d+)S', data).group(1))
+            try:
+                event = self.events.get(timeout=timeout)
+            except Empty:
+                return 500, HyperVMock.envelope('''
+                    <s:Fault>
+                        <s:Code>
+                            <s:Value>s:Receiver</s:Value>
+                            <s:Subcode><s:Value>w:TimedOut</s:Value></s:Subcode>
+                        </s:Code>
+                    </s:Fault>''').content
+            return 200, HyperVMock.pull(9, event).content
+        response = HyperVMock.post(None, data)
+        return response.status_code, response.content
+
+
 class TestHyperV(TestBase):
     def setUp(self):
         config_values = {
@@ -280,6 +327,290 @@ class TestHyperV(TestBase):
         result = self.hyperv.getHostGuestMapping()['hypervisors'][0]
         assert expected_result.toDict() == result.toDict()
 
+    @patch('requests.adapters.HTTPAdapter')
+    @patch('requests.Session')
+    def test_session_reused(self, session, adapter):
+        session.return_value.post.side_effect = HyperVMock.post
+        self.hyperv.config['pool_size'] = 4
+        self.hyperv.getHostGuestMapping()
+        self.hyperv.getHostGuestMapping()
+        self.hyperv.statusConfirmConnection()
+
+        session.assert_called_once_with()
+        adapter.assert_called_once_with(pool_connections=1, pool_maxsize=4)
+
+        self.hyperv.cleanup()
+        session.return_value.close.assert_called_once_with()
+        self.assertIsNone(self.hyperv.hosts[0].session)
+
+    @patch('requests.Session')
+    def test_session_renewed_after_401(self, session):
+        first, second = Mock(), Mock()
+        session.side_effect = [first, second]
+        first.post.side_effect = HyperVMock.post
+        second.post.side_effect = HyperVMock.post
+        self.hyperv.getHostGuestMapping()
+
+        # The server doesn't accept the kept session anymore
+        first.post.side_effect = None
+        first.post.return_value.status_code = 401
+        result = self.hyperv.getHostGuestMapping()['hypervisors'][0]
+
+        self.assertEqual(result.name, 'hostname.domainname')
+        first.close.assert_called_once_with()
+        self.assertIs(self.hyperv.hosts[0].session, second)
+
+    @patch('virtwho.virt.hyperv.hyperv.time')
+    @patch('requests.Session')
+    def test_host_facts_cached(self, session, time):
+        session.return_value.post.side_effect = HyperVMock.post
+        time.return_value = 1000
+        self.hyperv.getHostGuestMapping()
+
+        session.return_value.post.reset_mock()
+        time.return_value = 1000 + 3599
+        result = self.hyperv.getHostGuestMapping()['hypervisors'][0]
+        self.assertEqual(result.name, 'hostname.domainname')
+        self.assertEqual(result.facts[Hypervisor.HYPERVISOR_VERSION_FACT], '0.1.2345.67890')
+        queries = [call[0][1] for call in session.return_value.post.call_args_list]
+        self.assertFalse([query for query in queries if 'root/cimv2' in query])
+
+        # Facts are retrieved again once they expire
+        session.return_value.post.reset_mock()
+        time.return_value = 1000 + 3600
+        self.hyperv.getHostGuestMapping()
+        queries = [call[0][1] for call in session.return_value.post.call_args_list]
+        for wql in ('from CIM_Datafile', 'from Win32_ComputerSystem', 'from Win32_ComputerSystemProduct'):
+            self.assertTrue([query for query in queries if wql in query])
+
+    @patch('requests.Session')
+    def test_concurrent_queries(self, session):
+        session.return_value.post.side_effect = HyperVMock.post
+        self.hyperv.getHostGuestMapping()
+        # Queries run concurrently once the session is authenticated
+        session.return_value.auth.authenticated = True
+        self.hyperv.hosts[0].hostFacts = None
+        with patch('virtwho.virt.hyperv.hyperv.ThreadPoolExecutor', wraps=ThreadPoolExecutor) as executor:
+            result = self.hyperv.getHostGuestMapping()['hypervisors'][0]
+        executor.assert_called_once_with(max_workers=4)
+        self.assertEqual(result.hypervisorId, '12345678-90AB-CDEF-1234-567890ABCDEF')
+        self.assertEqual(result.facts[Hypervisor.CPU_SOCKET_FACT], '1')
+        self.assertEqual(len(result.guestIds), 1)
+
+    def _multihost(self):
+        config = HypervConfigSection('test', None)
+        config.update(type='hyperv', hosts='host1, host2, host3', username='username',
+                      password='password', owner='owner', workers=2)
+        config.validate()
+        return HyperV(self.logger, config, None, interval=DefaultInterval)
+
+    @patch('requests.Session')
+    def test_multiple_hosts(self, session):
+        session.return_value.post.side_effect = HyperVMock.post
+        hyperv = self._multihost()
+        result = hyperv.getHostGuestMapping()['hypervisors']
+
+        self.assertEqual(len(result), 3)
+        urls = set(call[0][0] for call in session.return_value.post.call_args_list)
+        self.assertEqual(urls, {'http://host1:5985/wsman', 'http://host2:5985/wsman', 'http://host3:5985/wsman'})
+        self.assertEqual(session.call_count, 3)
+
+    @patch('virtwho.virt.hyperv.hyperv.time')
+    @patch('requests.Session')
+    def test_failing_host_backoff(self, session, time):
+        def post(url, data, **kwargs):
+            if url == 'http://host2:5985/wsman':
+                raise requests.ConnectionError('Connection refused')
+            return HyperVMock.post(url, data, **kwargs)
+        session.return_value.post.side_effect = post
+        time.return_value = 1000
+        hyperv = self._multihost()
+        self.assertEqual(len(hyperv.getHostGuestMapping()['hypervisors']), 2)
+
+        # The failing host isn't polled until its retry delay passes
+        session.return_value.post.reset_mock()
+        time.return_value = 1000 + 59
+        self.assertEqual(len(hyperv.getHostGuestMapping()['hypervisors']), 2)
+        urls = set(call[0][0] for call in session.return_value.post.call_args_list)
+        self.assertNotIn('http://host2:5985/wsman', urls)
+
+        # The last hypervisor reported by a host is used while it fails
+        session.return_value.post.side_effect = HyperVMock.post
+        time.return_value = 1000 + 60
+        self.assertEqual(len(hyperv.getHostGuestMapping()['hypervisors']), 3)
+        session.return_value.post.side_effect = post
+        hyperv.hosts[1].retryTime = 0
+        self.assertEqual(len(hyperv.getHostGuestMapping()['hypervisors']), 3)
+        self.assertEqual(hyperv.hosts[1].failures, 1)
+
+    @patch('requests.Session')
+    def test_all_hosts_failing(self, session):
+        session.return_value.post.side_effect = requests.ConnectionError('Connection refused')
+        hyperv = self._multihost()
+        self.assertRaises(VirtError, hyperv.getHostGuestMapping)
+
+    def _events(self, server='localhost'):
+        config = HypervConfigSection('test', None)
+        config.update(type='hyperv', server=server, username='username',
+                      password='password', owner='owner', use_events=True)
+        config.validate()
+        return HyperV(self.logger, config, None, interval=3600)
+
+    def test_events(self):
+        hyperv = self._events()
+        hyperv.getHostGuestMapping = Mock(return_value={'hypervisors': []})
+        hyperv._send_data = Mock()
+        hyperv.cleanup = Mock()
+        timeouts = []
+
+        def wait_for_events(timeout):
+            timeouts.append(timeout)
+            if len(timeouts) == 3:
+                hyperv.stop()
+            # Only the first wait gets an event
+            return len(timeouts) == 1
+        hyperv.waitForEvents = wait_for_events
+        hyperv._run()
+
+        # Collected at the start and after the event only
+        self.assertEqual(hyperv.getHostGuestMapping.call_count, 2)
+        self.assertEqual(hyperv._send_data.call_count, 2)
+        self.assertEqual(len(timeouts), 3)
+        for timeout in timeouts:
+            self.assertTrue(3500 < timeout <= 3600)
+        hyperv.cleanup.assert_called_once_with()
+
+    def test_events_subscription(self):
+        events = HyperVEvents()
+        winrm = WinRM(events.respond)
+        winrm.start()
+        self.addCleanup(winrm.terminate)
+        hyperv = self._events(winrm.address)
+        host = hyperv.hosts[0]
+        host.getHostGuestMapping()
+
+        # Event about a virtual machine is reported as a change
+        events.events.put({'p:TargetInstance': 'Msvm_ComputerSystem'})
+        self.assertTrue(hyperv._hostEvents(host, 1))
+        self.assertTrue(events.subscribed.is_set())
+        # No event within the timeout
+        self.assertFalse(hyperv._hostEvents(host, 1))
+        self.assertIsNotNone(host.subscription)
+
+        host.disconnect()
+        self.assertTrue(events.unsubscribed.is_set())
+        self.assertIsNone(host.subscription)
+
+    @patch.object(HyperVSoap, 'Unsubscribe')
+    @patch.object(HyperVSoap, 'PullEvents')
+    @patch.object(HyperVSoap, 'Subscribe')
+    def test_events_failures(self, subscribe, pull_events, unsubscribe):
+        hyperv = self._events()
+        host = hyperv.hosts[0]
+        host.namespace = 'root/virtualization/v2'
+
+        # Server refusing to subscribe is asked again much later
+        subscribe.side_effect = HyperVCallFailed('Communication with Hyper-V failed, HTTP error: 500')
+        self.assertFalse(hyperv._hostEvents(host, 1))
+        self.assertAlmostEqual(host.eventsRetryTime, time.time() + HOST_RETRY_MAX, delta=10)
+
+        # Failures to get the events drop the subscription and back off
+        subscribe.side_effect = None
+        subscribe.return_value = ('uuid:10', 'uuid:9')
+        pull_events.side_effect = HyperVException('Unable to connect to Hyper-V server: timed out')
+        for delay in (60, 120):
+            self.assertFalse(hyperv._hostEvents(host, 1))
+            unsubscribe.assert_called_with('uuid:10', 'root/virtualization/v2')
+            self.assertIsNone(host.subscription)
+            self.assertAlmostEqual(host.eventsRetryTime, time.time() + delay, delta=10)
+        self.assertEqual(unsubscribe.call_count, 2)
+
+        # Events could be missed before subscribing again
+        pull_events.side_effect = None
+        pull_events.return_value = ('uuid:9', [])
+        self.assertTrue(hyperv._hostEvents(host, 1))
+        self.assertEqual(host.eventFailures, 0)
+        self.assertFalse(hyperv._hostEvents(host, 1))
+        self.assertEqual(subscribe.call_count, 4)
+
+    def test_batched_pull(self):
+        def items(*names):
+            return '<wsen:Items>%s</wsen:Items>' % ''.join(
+                '<p:Msvm_ComputerSystem xmlns:p="urn:test"><p:ElementName>%s</p:ElementName></p:Msvm_ComputerSystem>'
+                % name for name in names)
+        connection = Mock()
+        connection.post.side_effect = [
+            HyperVMock.enumerate(1),
+            HyperVMock.envelope('''
+                <wsen:PullResponse>
+                    <wsen:EnumerationContext>uuid:00000000-0000-0000-0000-000000000001</wsen:EnumerationContext>
+                    %s
+                </wsen:PullResponse>''' % items('vm1', 'vm2')),
+            HyperVMock.envelope('''
+                <wsen:PullResponse>
+                    %s
+                    <wsen:EndOfSequence/>
+                </wsen:PullResponse>''' % items('vm3')),
+        ]
+        hypervsoap = HyperVSoap('http://localhost:5985/wsman', connection, self.logger, page_size=2)
+
+        instances = hypervsoap.Query("select ElementName from Msvm_ComputerSystem")
+
+        self.assertEqual([instance['ElementName'] for instance in instances], ['vm1', 'vm2', 'vm3'])
+        self.assertEqual(connection.post.call_count, 3)
+        enumerate_body = connection.post.call_args_list[0].args[1]
+        self.assertIn('<wsman:OptimizeEnumeration/>', enumerate_body)
+        self.assertIn('<wsman:MaxElements>2</wsman:MaxElements>', enumerate_body)
+        for call in connection.post.call_args_list[1:]:
+            self.assertIn('<wsen:MaxElements>2</wsen:MaxElements>', call.args[1])
+
+    def test_optimized_enumeration(self):
+        connection = Mock()
+        connection.post.return_value = HyperVMock.envelope('''
+            <wsen:EnumerateResponse>
+                <wsen:EnumerationContext>uuid:00000000-0000-0000-0000-000000000001</wsen:EnumerationContext>
+                <w:Items>
+                    <p:Win32_ComputerSystem xmlns:p="urn:test">
+                        <p:DNSHostName>hostname.domainname</p:DNSHostName>
+                        <p:NumberOfProcessors>2</p:NumberOfProcessors>
+                    </p:Win32_ComputerSystem>
+                </w:Items>
+                <w:EndOfSequence/>
+            </wsen:EnumerateResponse>''')
+        hypervsoap = HyperVSoap('http://localhost:5985/wsman', connection, self.logger)
+
+        instances = hypervsoap.Query("select DNSHostName, NumberOfProcessors from Win32_ComputerSystem",
+                                     "root/cimv2")
+
+        # All the instances came with the Enumerate response, nothing to pull
+        self.assertEqual(instances, [{'DNSHostName': 'hostname.domainname', 'NumberOfProcessors': '2'}])
+        self.assertEqual(connection.post.call_count, 1)
+
+    @patch('virtwho.virt.hyperv.hyperv.PARSE_CHUNK_SIZE', 7)
+    def test_incremental_parsing(self):
+        connection = Mock()
+        connection.post.return_value = HyperVMock.method('''
+            <vsms:GetSummaryInformation_OUTPUT>
+                <vsms:SummaryInformation xmlns:si="%(si)s">
+                    <si:Name>vm1</si:Name>
+                    <si:EnabledState>2</si:EnabledState>
+                </vsms:SummaryInformation>
+                <vsms:SummaryInformation xmlns:si="%(si)s">
+                    <si:Name>vm2</si:Name>
+                    <si:EnabledState>3</si:EnabledState>
+                </vsms:SummaryInformation>
+                <vsms:ReturnValue>0</vsms:ReturnValue>
+            </vsms:GetSummaryInformation_OUTPUT>''' % {
+            'si': 'http://schemas.microsoft.com/wbem/wsman/1/wmi/root/virtualization/Msvm_SummaryInformation'})
+        hypervsoap = HyperVSoap('http://localhost:5985/wsman', connection, self.logger)
+
+        self.assertEqual(hypervsoap.Invoke_GetSummaryInformation('root/virtualization'),
+                         {'vm1': Guest.STATE_RUNNING, 'vm2': Guest.STATE_SHUTOFF})
+
+        # Response of other operation isn't accepted
+        connection.post.return_value = HyperVMock.enumerate(1)
+        self.assertRaises(VirtError, hypervsoap.Invoke_GetSummaryInformation, 'root/virtualization')
+
     def test_proxy(self):
         proxy = Proxy()
         self.addCleanup(proxy.terminate)
@@ -0,0 +1,56 @@
+from __future__ import print_function
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+
+class WinRMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if 'Authorization' not in self.headers:
+            status, content, headers = 401, '', {'WWW-Authenticate': 'Basic realm="WSMAN"'}
+        else:
+            status, content = self.server.respond(data)
+            headers = {'Content-Type': 'application/soap+xml;charset=UTF-8'}
+        content = content.encode('utf-8')
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WinRMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class WinRM(Thread):
+    """
+    Fake WS-Management endpoint requiring Basic authentication.
+
+    Bodies of the requests are passed to `respond` callable which returns
+    tuple of HTTP status code and content of the response.
+    """
+    def __init__(self, respond):
+        super(WinRM, self).__init__()
+        self.daemon = True
+        self.server = WinRMServer(('127.0.0.1', 0), WinRMHandler)
+        self.server.respond = respond
+
+    def terminate(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run(self):
+        self.server.serve_forever(poll_interval=0.1)
+
+    @property
+    def address(self):
+        return 'http://127.0.0.1:%d/wsman' % self.server.server_address[1]
@@ -811,6 +811,24 @@ class ConfigSection(collections.abc.MutableMapping):
                     result = ('warning', '"%s" cannot be empty and has no default value' % key)
         return result
 
+    def _validate_positive_integer(self, key):
+        try:
+            value = int(self._values[key])
+        except KeyError:
+            if not self.has_default(key):
+                return 'warning', 'Value for %s not set' % key
+            return None
+        except (TypeError, ValueError):
+            value = 0
+        if value > 0:
+            self._values[key] = value
+            return None
+        if self.has_default(key):
+            self._values[key] = self.defaults[key]
+            return 'warning', '"%s" must be a positive integer, using default: %s' % (key, self.defaults[key])
+        del self._values[key]
+        return 'warning', '"%s" must be a positive integer, ignoring' % key
+
     def _validate_list(self, list_key):
         result = None
         if self.is_default(list_key):
@@ -29,6 +29,14 @@ DefaultUpdateInterval = 1800
 MinimumUpdateInterval = 60
 DefaultWaitTime = 900
 MinWaitTime = 60
+# Number of entities requested in one page of a list, the API returns at most 500
+DefaultPageSize = 500
+MaxPageSize = 500
+# Maximum number of requests sent at once
+DefaultWorkers = 4
+# Number of intervals in a row the host-guest mapping is reused at most when no
+# change of VMs and hosts is reported
+MaxMappingReuses = 3
 
 
 class Ahv(virt.Virt):
@@ -76,6 +84,9 @@ class Ahv(virt.Virt):
         self.url = self.SERVER_BASE_URIL % (self.config['server'], self.port, self.version)
         self.username = self.config['username']
         self.password = self.config['password']
+        self._mapping = None
+        self._change_marker = None
+        self._mapping_reuses = 0
         if self.version == AhvInterface2.VERSION:
             self._interface = AhvInterface2(
                 logger,
@@ -83,7 +94,10 @@ class Ahv(virt.Virt):
                 self.username,
                 self.password,
                 self.port,
-                ahv_internal_debug=self.config['ahv_internal_debug']
+                ahv_internal_debug=self.config['ahv_internal_debug'],
+                page_size=self.config['page_size'],
+                workers=self.config['workers'],
+                terminate_event=self.terminate_event
             )
         elif self.version == AhvInterface3.VERSION:
             self._interface = AhvInterface3(
@@ -92,7 +106,10 @@ class Ahv(virt.Virt):
                 self.username,
                 self.password,
                 self.port,
-                ahv_internal_debug=self.config['ahv_internal_debug']
+                ahv_internal_debug=self.config['ahv_internal_debug'],
+                page_size=self.config['page_size'],
+                workers=self.config['workers'],
+                terminate_event=self.terminate_event
             )
         else:
             raise ValueError("Unsupported version of REST API")
@@ -108,7 +125,9 @@ class Ahv(virt.Virt):
 
         host_uvm_map = self._interface.build_host_to_uvm_map()
 
-        cluster_uuid_name_list = self._interface.get_ahv_cluster_uuid_name_list()
+        cluster_names = self._interface.get_cluster_names(
+            self._interface.get_ahv_cluster_uuid_name_list()
+        )
 
         for host_uuid in host_uvm_map:
             host = host_uvm_map[host_uuid]
@@ -145,7 +164,7 @@ class Ahv(virt.Virt):
             else:
                 self.logger.debug("Host '%s' doesn't have any vms", host_uuid)
 
-            cluster_name = self._interface.get_host_cluster_name(host, cluster_uuid_name_list)
+            cluster_name = self._interface.get_host_cluster_name(host, cluster_names)
             host_version = self._interface.get_host_version(host)
             host_name = host["status"]['name']
 
@@ -180,7 +199,9 @@ class Ahv(virt.Virt):
 
         host_uvm_map = self._interface.build_host_to_uvm_map()
 
-        cluster_uuid_name_list = self._interface.get_ahv_cluster_uuid_name_list()
+        cluster_names = self._interface.get_cluster_names(
+            self._interface.get_ahv_cluster_uuid_name_list()
+        )
 
         for host_uuid in host_uvm_map:
             host = host_uvm_map[host_uuid]
@@ -215,7 +236,7 @@ class Ahv(virt.Virt):
             else:
                 self.logger.debug("Host '%s' doesn't have any vms", host_uuid)
 
-            cluster_name = self._interface.get_host_cluster_name(host, cluster_uuid_name_list)
+            cluster_name = self._interface.get_host_cluster_name(host, cluster_names)
             host_version = self._interface.get_host_version(host)
             host_name = host['name']
 
@@ -238,16 +259,65 @@ class Ahv(virt.Virt):
 
     def getHostGuestMapping(self):
         """
-        Get a dict of host to uvm mapping.
+        Get a dict of host to uvm mapping. The mapping from the previous call
+        is reused when the server reports no change of VMs and hosts since then
+        and all the lists were read completely, up to MaxMappingReuses times
+        in a row.
         Args:
             None.
         Returns:
-            None.
+            Dictionary with host-guest mapping
         """
+        # The mapping is never reused in oneshot mode
+        marker = None if self._oneshot else self._interface.get_change_marker()
+        if marker is not None and marker == self._change_marker and \
+                self._mapping_reuses < MaxMappingReuses:
+            self.logger.debug("No change of AHV VMs and hosts reported, using the last host-guest mapping")
+            self._mapping_reuses += 1
+            return self._mapping
+
+        self._interface.incomplete = False
         if self.version == AhvInterface3.VERSION:
-            return self.get_host_guest_mapping_v3()
+            mapping = self.get_host_guest_mapping_v3()
         elif self.version == AhvInterface2.VERSION:
-            return self.get_host_guest_mapping_v2()
+            mapping = self.get_host_guest_mapping_v2()
+        if self._interface.incomplete:
+            # Don't reuse the partial mapping, read the lists again next time
+            self.logger.warning("Some lists of AHV entities are incomplete, the host-guest mapping may be partial")
+            marker = None
+        self._mapping = mapping
+        self._change_marker = marker
+        self._mapping_reuses = 0
+        return mapping
+
+    def statusConfirmConnection(self):
+        """
+        This call will confirm the credentials and that the list of clusters
+        can be read. The result outside of that is not important in the
+        status scenario.
+        Raises:
+            VirtError: When the list can't be read, with the endpoints whose
+            requests failed and the state of their circuit breakers.
+        """
+        self._interface.incomplete = False
+        self._interface.get_ahv_cluster_uuid_name_list()
+        if self._interface.incomplete:
+            message = "Unable to get list of clusters"
+            for endpoint, (state, failures) in sorted(self._interface.breaker_states().items()):
+                message += "; %s failed %d time(s), its circuit breaker is %s" % (endpoint, failures, state)
+            raise virt.VirtError(message)
+
+    def wait(self, wait_time):
+        """
+        Wait `wait_time` seconds, interrupted right away by stop() and
+        within `delta_time` by terminate_event.
+        """
+        end = time.monotonic() + wait_time
+        while not self.is_terminated():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            self._internal_terminate_event.wait(min(remaining, self.delta_time))
 
     def _run(self):
         """
@@ -257,28 +327,18 @@ class Ahv(virt.Virt):
         Returns:
             None.
         """
-        self.next_update = None
-        initial = True
         while not self.is_terminated():
-
-            if initial:
-                if self.status:
-                    report = virt.StatusReport(self.config)
-                    self._send_data(data_to_send=report)
-                else:
-                    assoc = self.getHostGuestMapping()
-                    self._send_data(data_to_send=virt.HostGuestAssociationReport(self.config, assoc))
-                initial = False
-                self.next_update = time.time() + self.interval
+            if self.status:
+                self.statusConfirmConnection()
+                self._send_data(data_to_send=virt.StatusReport(self.config))
+            else:
+                assoc = self.getHostGuestMapping()
+                self._send_data(data_to_send=virt.HostGuestAssociationReport(self.config, assoc))
 
             if self._oneshot:
                 break
 
-            time.sleep(1)
-            if time.time() > self.next_update:
-                report = virt.StatusReport(self.config)
-                self._send_data(data_to_send=report)
-                self.next_update = time.time() + self.interval
+            self.wait(self.interval)
 
 
 class AhvConfigSection(VirtConfigSection):
@@ -329,6 +389,34 @@ class AhvConfigSection(VirtConfigSection):
             validation_method=self._validate_str_to_bool,
             default=False
         )
+        self.add_key(
+            'page_size',
+            validation_method=self._validate_page_size,
+            default=DefaultPageSize
+        )
+        self.add_key(
+            'workers',
+            validation_method=self._validate_positive_integer,
+            default=DefaultWorkers
+        )
+
+    def _validate_page_size(self, key):
+        """
+        Validate the number of entities requested in one page.
+        Args:
+            key (Str): page size.
+        Returns:
+            Warning is returned when the page size isn't a positive integer
+            or is greater than the API allows.
+        """
+        error = self._validate_positive_integer(key)
+        if error is None and key in self._values and self._values[key] > MaxPageSize:
+            self._values[key] = MaxPageSize
+            error = (
+                'warning',
+                '"%s" can be at most %d, using %d' % (key, MaxPageSize, MaxPageSize)
+            )
+        return error
 
     def _validate_server(self, key):
         """
@@ -17,13 +17,74 @@
 #
 
 import json
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from threading import Event, Lock
 from requests import Session
 from requests.exceptions import ConnectionError, ReadTimeout
-from functools import reduce
 
 from virtwho import virt
 
+# Maximum number of seconds to wait between retries of a request
+MAX_RETRY_INTERVAL = 300
+# Number of consecutive failed requests of one endpoint opening its circuit breaker
+BREAKER_THRESHOLD = 3
+# Number of seconds requests of an endpoint fail immediately once its breaker is open
+BREAKER_COOLDOWN = 300
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker of one REST API endpoint.
+
+    After `threshold` consecutive failed requests the breaker opens and
+    requests of the endpoint fail immediately for `cooldown` seconds. Then
+    one request is let through, its success closes the breaker again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return self.CLOSED
+        if time.monotonic() < self.opened + self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """
+        Returns True when a request can be sent.
+        """
+        with self._lock:
+            state = self.state
+            if state == self.HALF_OPEN:
+                # Let just this one request through
+                self.opened = time.monotonic()
+            return state != self.OPEN
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened = time.monotonic()
+
 
 class AhvInterface(object):
     """
@@ -44,20 +105,44 @@ class AhvInterface(object):
                 timeout(optional, int): Max seconds to wait before HTTP connection
                 times-out. Default 30 seconds.
                 retries (optional, int): Maximum number of retires. Default: 5.
-                retry_interval (optional, int): Time to sleep between retry intervals.
+                retry_interval (optional, int): Time to sleep before the first retry,
+                doubled with each following retry. Default: 30 seconds.
+                max_retry_interval (optional, int): Maximum time to sleep between
+                retries. Default: 300 seconds.
+                terminate_event (optional, Event): Event interrupting the sleep
+                between retries.
+                breaker_threshold (optional, int): Number of consecutive failed
+                requests of one endpoint after which its requests fail immediately.
+                Default: 3.
+                breaker_cooldown (optional, int): Time the requests of an endpoint
+                fail immediately. Default: 300 seconds.
                 ahv_internal_debug (optional, bool): Detail log of the rest calls.
                 Default: 5 seconds.
+                page_size (optional, int): Number of entities requested in one
+                page of a list. Default: 500.
+                workers (optional, int): Maximum number of pages requested at once.
+                Default: 4.
         """
         self._session = Session()
         self._timeout = kwargs.get('timeout', 30)
         self._retries = kwargs.get('retries', 5)
         self._retry_interval = kwargs.get('retry_interval', 30)
+        self._max_retry_interval = kwargs.get('max_retry_interval', MAX_RETRY_INTERVAL)
+        self._terminate_event = kwargs.get('terminate_event') or Event()
+        self._breaker_threshold = kwargs.get('breaker_threshold', BREAKER_THRESHOLD)
+        self._breaker_cooldown = kwargs.get('breaker_cooldown', BREAKER_COOLDOWN)
+        self._breakers = {}
+        self._breakers_lock = Lock()
+        # Set when a list of entities couldn't be read completely
+        self.incomplete = False
         self._logger = logger
         self._url = url
         self._user = username.encode('utf-8')
         self._password = password.encode('utf-8')
         self._port = port
         self._ahv_internal_debug = kwargs.get('ahv_internal_debug', False)
+        self._page_size = kwargs.get('page_size', 500)
+        self._workers = kwargs.get('workers', 4)
         self._create_session(self._user, self._password)
 
     def _create_session(self, user=None, password=None):
@@ -136,6 +221,60 @@ class AhvInterface(object):
         func = getattr(self, method)
         return func(uri, *args, **kwargs)
 
+    def _breaker(self, method, url):
+        """
+        Returns circuit breaker of the endpoint.
+        """
+        with self._breakers_lock:
+            key = (method.upper(), url.split('?')[0])
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self._breaker_threshold, self._breaker_cooldown)
+            return self._breakers[key]
+
+    def breaker_states(self):
+        """
+        Returns states of circuit breakers of the endpoints whose last
+        requests failed.
+        Returns:
+            states (dict): State of the breaker and the number of consecutive
+            failed requests by 'METHOD url' of the endpoint.
+        """
+        with self._breakers_lock:
+            breakers = list(self._breakers.items())
+        states = {}
+        for (method, url), breaker in breakers:
+            if breaker.failures > 0:
+                states['%s %s' % (method, url)] = (breaker.state, breaker.failures)
+        return states
+
+    def _retry_delay(self, attempt, retry_interval, response=None):
+        """
+        Returns time to sleep before the next retry of a request. The time is
+        given by the Retry-After header of the response when it's present,
+        otherwise it grows exponentially with random jitter.
+        Args:
+            attempt (int): Number of the failed attempt, starting with 0.
+            retry_interval (int): Time to sleep after the first attempt.
+            response (requests.Response): Response of the failed attempt.
+        Returns:
+            delay (float): Time to sleep in seconds.
+        """
+        retry_after = None
+        if response is not None and response.headers is not None:
+            retry_after = response.headers.get('Retry-After')
+        if isinstance(retry_after, str):
+            try:
+                return min(max(float(retry_after), 0), self._max_retry_interval)
+            except ValueError:
+                pass
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                return min(max(delay, 0), self._max_retry_interval)
+            except (TypeError, ValueError):
+                pass
+        delay = min(retry_interval * 2 ** attempt, self._max_retry_interval)
+        return delay / 2 + random.uniform(0, delay / 2)
+
     def _send(self, method, url, **kwargs):
         """This private method acting as proxy for all http methods.
         Args:
@@ -147,7 +286,16 @@ class AhvInterface(object):
 
         Returns:
             Response (requests.Response): The response object.
-        """
+        Raises:
+            VirtError: When the circuit breaker of the endpoint is open.
+        """
+        breaker = self._breaker(method, url)
+        if not breaker.allow():
+            raise virt.VirtError(
+                'Circuit breaker of %s %s is open after %d failed requests' % (
+                    method.upper(), url, breaker.failures)
+            )
+
         kwargs['verify'] = kwargs.get('verify', False)
         if 'timeout' not in kwargs:
             kwargs['timeout'] = self._timeout
@@ -179,24 +327,36 @@ class AhvInterface(object):
 
             except (ConnectionError, ReadTimeout) as e:
                 self._logger.warning("Request failed with error: %s" % e)
-                if ii != retry_count - 1:
-                    time.sleep(retry_interval)
+                response = None
+                if ii != retry_count - 1 and self._terminate_event.wait(self._retry_delay(ii, retry_interval)):
+                    # Terminated, it's not a failure of the endpoint
+                    return None
                 continue
             if response.ok:
+                breaker.success()
                 return response
             if response.status_code in [401, 403]:
+                breaker.success()
                 raise virt.VirtError(
                     'HTTP Auth Failed %s %s. \n res: response: %s' % (method, url, response)
                 )
             elif response.status_code == 409:
+                breaker.success()
                 raise virt.VirtError(
                     'HTTP conflict with the current state of the '
                     'target resource %s %s. \n res: %s' % (method, url, response)
                 )
             elif response.status_code in self.NO_RETRY_HTTP_CODES:
                 break
-            if ii != retry_count - 1:
-                time.sleep(retry_interval)
+            if ii != retry_count - 1 and self._terminate_event.wait(self._retry_delay(ii, retry_interval, response)):
+                # Terminated, it's not a failure of the endpoint
+                return None
+
+        # Server errors and unavailable server count as failures of the endpoint
+        if response is None or response.status_code >= 500 or response.status_code == 429:
+            breaker.failure()
+        else:
+            breaker.success()
 
         if response is not None:
             msg = 'HTTP %s %s failed: ' % (method, url)
@@ -206,6 +366,90 @@ class AhvInterface(object):
         else:
             self._logger.error("Failed to make the HTTP request (%s, %s)" % (method, url))
 
+    def _list_failed(self, message):
+        """
+        Log error reading a list of entities and mark the lists incomplete.
+        """
+        self._logger.error(message)
+        self.incomplete = True
+
+    def _get_pages(self, get_page, pages, name):
+        """
+        Returns entities of the pages of a list, requested concurrently by
+        at most `workers` threads. Pages that can't be retrieved are skipped,
+        get_page marks the lists incomplete then.
+        Args:
+            get_page (callable): Gets identifier of a page, returns the response.
+            pages (list): Identifiers of the pages.
+            name (str): Name of the entities used in log messages.
+        Returns:
+            entities (list): Entities in the order of the pages.
+        """
+        entities = []
+        if len(pages) == 0:
+            return entities
+        self._logger.debug("Requesting %d more pages of %s" % (len(pages), name))
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for data in executor.map(get_page, pages):
+                if data is not None:
+                    entities.extend(data["entities"])
+        return entities
+
+    def build_host_to_uvm_map(self):
+        """
+        Builds a dictionary of every ahv host along with the vms they are hosting.
+        Hosts without any vm are included with empty list of guests.
+        Returns:
+            host_uvm_map (dict): Dict of ahv host with its uvms.
+        """
+        host_uvm_map = {}
+        for host in self.get_host_list():
+            host_uuid = self.get_host_uuid(host)
+            if host_uuid is None:
+                continue
+            host['guest_list'] = []
+            host_uvm_map[host_uuid] = host
+        if len(host_uvm_map) == 0:
+            self._logger.warning("No Available AHV host found")
+
+        vm_entities = self.get_vm_entities()
+        if len(vm_entities) == 0:
+            self._logger.warning("No available VMs found")
+
+        for vm_entity in vm_entities:
+            if not vm_entity:
+                continue
+            host_uuid = self.get_host_uuid_from_vm(vm_entity)
+            if host_uuid is None:
+                continue
+            host = host_uvm_map.get(host_uuid)
+            if host is None:
+                self._logger.warning("Host %s is not in the list of hosts" % host_uuid)
+                continue
+            host['guest_list'].append(vm_entity)
+
+        return host_uvm_map
+
+    def get_change_marker(self):
+        """
+        Returns marker of the state of VMs and hosts. The marker changes when
+        any VM or host is added, removed or updated.
+        Returns:
+            marker (tuple): The marker, None when it can't be determined.
+        """
+        return None
+
+    @staticmethod
+    def get_cluster_names(cluster_uuid_name_list):
+        """
+        Returns dict of cluster names indexed by cluster uuid.
+        Args:
+            cluster_uuid_name_list: List of tuples (UUID, name) of clusters
+        Returns:
+            cluster_names (dict): Cluster names indexed by cluster uuid.
+        """
+        return dict(cluster_uuid_name_list)
+
 
 class AhvInterface2(AhvInterface):
     """
@@ -226,7 +470,7 @@ class AhvInterface2(AhvInterface):
         res = self.make_rest_call(method="get", uri="/vms")
 
         if res is None:
-            self._logger.error("Unable to get list of VMs")
+            self._list_failed("Unable to get list of VMs")
             return vm_uuid_list
 
         vm_entities = res.json()
@@ -234,30 +478,96 @@ class AhvInterface2(AhvInterface):
         self._logger.info("Total number of vms uuids found and saved for processing %s" % len(vm_entities))
         return vm_entities["entities"]
 
+    def get_list_page(self, uri, name, page, count):
+        """
+        Returns one page of a list of entities.
+        Args:
+            uri (str): Uri of the list.
+            name (str): Name of the entities used in log messages.
+            page (int): Number of the page, starting with 1.
+            count (int): Number of entities in one page.
+        Returns:
+            data (dict): The response, None when the request failed.
+        """
+        res = self.make_rest_call(method="get", uri=uri, params={'page': page, 'count': count})
+        if res is None:
+            self._list_failed("Unable to get list of %s" % name)
+            return None
+        data = res.json()
+        if 'entities' not in data:
+            self._list_failed("No entities in the list of %s" % name)
+            return None
+        return data
+
+    def get_entities(self, uri, name):
+        """
+        Returns all entities of a list.
+
+        Once the first page tells how many entities there are, the
+        remaining pages are requested concurrently.
+        Args:
+            uri (str): Uri of the list.
+            name (str): Name of the entities used in log messages.
+        Returns:
+            entities (list): List of entities.
+        """
+        entities = []
+        data = self.get_list_page(uri, name, 1, self._page_size)
+        if data is None:
+            return entities
+        entities.extend(data["entities"])
+
+        # The server can return less entities in one page than requested
+        count = min(len(entities), self._page_size)
+        if count == 0:
+            return entities
+        metadata = data.get("metadata", {})
+        total = metadata.get("total_entities", metadata.get("grand_total_entities"))
+        if total is not None:
+            pages = list(range(2, (total + count - 1) // count + 1))
+            entities.extend(self._get_pages(
+                lambda page: self.get_list_page(uri, name, page, count), pages, name
+            ))
+            return entities
+
+        # Number of entities is unknown, get the pages one by one
+        page = 1
+        while len(data["entities"]) >= count:
+            page += 1
+            data = self.get_list_page(uri, name, page, count)
+            if data is None:
+                break
+            entities.extend(data["entities"])
+        return entities
+
     def get_host_list(self):
         """
         Returns the list of hosts.
         Returns:
             host_list (list): list of hosts.
         """
-        host_list = []
-
-        res = self.make_rest_call(method="get", uri="/hosts")
+        return self.get_entities("/hosts", "hosts")
 
-        # FIXME: when there is lot of hosts, then there is risk that not all hosts are returned
-        # in one response (more details are in "metadata").
-
-        data = res.json()
-        if "entities" in data:
-            host_list = data["entities"]
-        return host_list
+    def get_host_uuid(self, host_info):
+        """
+        Returns host's uuid.
+        Args:
+            host_info (dict): Host info dict.
+        Returns:
+            host_uuid (str): Host uuid if found, None otherwise.
+        """
+        try:
+            return host_info['uuid']
+        except (TypeError, KeyError):
+            self._logger.warning("host info does not contain uuid")
+            return None
 
-    def get_host_cluster_name(self, host_info, cluster_ids):
+    def get_host_cluster_name(self, host_info, cluster_names):
         """
         Returns host's cluster identifier if one exists.
         Args:
             host_info (dict): Host info dict.
-            cluster_ids: List of tuples (UUID, name) of clusters
+            cluster_names (dict): Cluster names indexed by cluster uuid.
         Returns:
             host_cluster_name: The host's cluster name. If no name exists, then
                                the host's uuid will be returned. Otherwise, None
@@ -268,9 +578,8 @@ class AhvInterface2(AhvInterface):
             self._logger.error("No cluster UUID found for host.")
             return None
 
-        for uuid, name in cluster_ids:
-            if cluster_uuid == uuid:
-                return name
+        if cluster_uuid in cluster_names:
+            return cluster_names[cluster_uuid]
 
         if cluster_uuid:
             self._logger.warning("No name found for host with uuid: %s. Using uuid." % cluster_uuid)
@@ -285,15 +594,7 @@ class AhvInterface2(AhvInterface):
         """
         ahv_host_cluster_uuid_names = []
 
-        res = self.make_rest_call(method="get", uri="/clusters")
-        data = res.json()
-
-        # FIXME: It is also possible that the list could not be complete, when the list of clusters
-        # is too long. Information about number of gathered clusters is in metadata section too.
-        # I cannot implement it ATM, because I don't know how this situation looks like and I
-        # don't have system with more than one cluster.
-
-        for cluster in data["entities"]:
+        for cluster in self.get_entities("/clusters", "clusters"):
             try:
                 cluster_uuid = cluster['uuid']
                 cluster_name = cluster["name"]
@@ -341,51 +642,6 @@ class AhvInterface2(AhvInterface):
             )
         return None
 
-    def build_host_to_uvm_map(self):
-        """
-        Builds a dictionary of every ahv host along with the vms they are hosting
-        Returns:
-            host_uvm_map (dict): Dict of ahv host with its uvms.
-        """
-        host_uvm_map = {}
-
-        host_list = self.get_host_list()
-
-        def reduce_host_vm_map(_host_uvm_map, _vm_entity):
-            """
-            This function is used by reduce() and it reduces generated list of entities
-            to dictionary. Key is host UUID containing list of VMs running on this host
-            """
-            _host_uuid = None
-            if _vm_entity:
-                _host_uuid = self.get_host_uuid_from_vm(_vm_entity)
-            if _host_uuid:
-                if _host_uuid not in _host_uvm_map:
-                    for _host in host_list:
-                        if _host["uuid"] == _host_uuid:
-                            _host_uvm_map[_host_uuid] = _host
-                            _host_uvm_map[_host_uuid]['guest_list'] = []
-                _host_uvm_map[_host_uuid]['guest_list'].append(_vm_entity)
-            return _host_uvm_map
-
-        vm_entities = self.get_vm_entities()
-
-        host_uvm_map = reduce(reduce_host_vm_map, vm_entities, host_uvm_map)
-
-        if len(host_uvm_map) > 0:
-            return host_uvm_map
-        else:
-            self._logger.warning("No available VMs found. Trying to get list of hosts...")
-            if len(host_list) > 0:
-                for host in host_list:
-                    host_uuid = host["uuid"]
-                    if host_uuid not in host_uvm_map:
-                        host_uvm_map[host_uuid] = host
-                        host_uvm_map[host_uuid]['guest_list'] = []
-            else:
-                self._logger.warning("No Available AHV host found")
-            return host_uvm_map
-
 
 class AhvInterface3(AhvInterface):
     """
@@ -394,58 +650,120 @@ class AhvInterface3(AhvInterface):
 
     VERSION = 'v3'
 
-    NUM_OF_REQUESTED_VMS = 20
-
-    def get_vm_entities(self):
+    def get_list_page(self, uri, name, offset, length):
         """
-        Try to get list of VM entities
+        Returns one page of a list of entities.
+        Args:
+            uri (str): Uri of the list.
+            name (str): Name of the entities used in log messages.
+            offset (int): Offset of the first entity.
+            length (int): Number of entities requested.
+        Returns:
+            data (dict): The response, None when the request failed.
         """
-        self._logger.info("Getting the list of available VM entities")
-        vm_entities = []
-        length = self.NUM_OF_REQUESTED_VMS
-        offset = 0
+        res = self.make_rest_call(method="post", uri=uri, json={'length': length, 'offset': offset})
+        if res is None:
+            self._list_failed("Unable to get list of %s" % name)
+            return None
+        data = res.json()
+        if 'entities' not in data:
+            self._list_failed("No entities in the list of %s" % name)
+            return None
+        return data
 
-        kwargs = {
-            "method": "post",
-            "uri": "/vms/list",
-            "json": {
-                'length': length,
-                'offset': offset
-            }
-        }
+    def get_entities(self, uri, name):
+        """
+        Returns all entities of a list.
 
+        Once the first page tells how many entities there are, the
+        remaining pages are requested concurrently.
+        Args:
+            uri (str): Uri of the list.
+            name (str): Name of the entities used in log messages.
+        Returns:
+            entities (list): List of entities.
+        """
+        entities = []
+        data = self.get_list_page(uri, name, 0, self._page_size)
+        if data is None:
+            return entities
+        entities.extend(data["entities"])
+
+        metadata = data.get("metadata", {})
+        length = metadata.get("length", len(data["entities"]))
+        total = metadata.get("total_matches")
+        if total is not None:
+            if length > 0:
+                offsets = list(range(len(entities), total, length))
+                entities.extend(self._get_pages(
+                    lambda offset: self.get_list_page(uri, name, offset, length), offsets, name
+                ))
+            return entities
+
+        # Number of entities is unknown, get the pages one by one
+        offset = 0
         while True:
-            res = self.make_rest_call(**kwargs)
-
-            if res is None:
-                self._logger.error("Unable to get list of VMs")
-                break
-
-            data = res.json()
-
-            # Try to get entities from the response
-            if 'entities' in data:
-                if len(data["entities"]) > 0:
-                    vm_entities.extend(data["entities"])
-                else:
-                    # When the list of entities is empty, then we have gathered all
-                    # entities, and we can break the loop
-                    self._logger.debug("Gathered all VM entities")
-                    break
-            else:
-                self._logger.error("No entities in the list of VMs")
+            if len(data["entities"]) == 0:
+                # When the list of entities is empty, then we have gathered all
+                # entities, and we can break the loop
+                self._logger.debug("Gathered all %s" % name)
                 break
 
             if "metadata" in data:
                 if "length" in data["metadata"]:
                     length = data["metadata"]["length"]
+                else:
+                    length = len(data["entities"])
             else:
-                self._logger.error("No metadata in the list of VMs")
+                self._list_failed("No metadata in the list of %s" % name)
                 break
 
-            kwargs["json"]['offset'] = kwargs["json"]['offset'] + length
-            self._logger.debug('Next vm list call has this body: %s' % kwargs["json"])
+            offset += length
+            self._logger.debug('Next %s list call has offset: %d' % (name, offset))
+            data = self.get_list_page(uri, name, offset, self._page_size)
+
+            if data is None:
+                break
+            entities.extend(data["entities"])
+        return entities
 
+    def get_change_marker(self):
+        """
+        Returns marker of the state of VMs and hosts. The marker consists of
+        the number of VMs and hosts and the last update time and spec version
+        of the latest updated VM and host.
+        Returns:
+            marker (tuple): The marker, None when it can't be determined.
+        """
+        marker = []
+        for uri in ("/vms/list", "/hosts/list"):
+            res = self.make_rest_call(method="post", uri=uri, json={
+                'length': 1,
+                'offset': 0,
+                'sort_attribute': 'last_update_time',
+                'sort_order': 'DESCENDING',
+            })
+            if res is None:
+                return None
+            data = res.json()
+            try:
+                total = data["metadata"]["total_matches"]
+                entities = data["entities"]
+                latest = entities[0]["metadata"] if len(entities) > 0 else {}
+                marker.append((
+                    total, latest.get("uuid"), latest.get("last_update_time"), latest.get("spec_version")
+                ))
+            except (TypeError, KeyError, IndexError, AttributeError):
+                self._logger.debug("Unable to get last update of %s" % uri)
+                return None
+        return tuple(marker)
+
+    def get_vm_entities(self):
+        """
+        Try to get list of VM entities
+        """
+        self._logger.info("Getting the list of available VM entities")
+        vm_entities = self.get_entities("/vms/list", "VMs")
         self._logger.info("Total number of vms uuids found and saved for processing %s" % len(vm_entities))
         return vm_entities
 
@@ -455,24 +773,28 @@ class AhvInterface3(AhvInterface):
         Returns:
             host_list (list): list of hosts.
         """
-        host_list = []
+        return self.get_entities("/hosts/list", "hosts")
 
-        res = self.make_rest_call(method="post", uri="/hosts/list")
-
-        # FIXME: when there is lot of hosts, then there is risk that not all hosts are returned
-        # in one response (more details are in "metadata")
-
-        data = res.json()
-        if "entities" in data:
-            host_list = data["entities"]
-        return host_list
+    def get_host_uuid(self, host_info):
+        """
+        Returns host's uuid.
+        Args:
+            host_info (dict): Host info dict.
+        Returns:
+            host_uuid (str): Host uuid if found, None otherwise.
+        """
+        try:
+            return host_info["metadata"]['uuid']
+        except (TypeError, KeyError):
+            self._logger.warning("host info does not contain metadata->uuid")
+            return None
 
-    def get_host_cluster_name(self, host_info, cluster_uuid_name_list):
+    def get_host_cluster_name(self, host_info, cluster_names):
         """
         Returns host's cluster identifier if one exists.
         Args:
             host_info (dict): Host info dict.
-            cluster_uuid_name_list: List of tuples (UUID, name) of clusters
+            cluster_names (dict): Cluster names indexed by cluster uuid.
         Returns:
             host_cluster_name: The host's cluster name. If no name exists, then
                                the host's uuid will be returned. Otherwise, None
@@ -483,9 +805,8 @@ class AhvInterface3(AhvInterface):
             self._logger.warning("host info does not contain status->cluster_reference->uuid")
             return None
 
-        for uuid, name in cluster_uuid_name_list:
-            if host_cluster_uuid == uuid:
-                return name
+        if host_cluster_uuid in cluster_names:
+            return cluster_names[host_cluster_uuid]
 
         if host_cluster_uuid:
             self._logger.warning("No name found for host with uuid: %s. Using uuid." % host_cluster_uuid)
@@ -500,15 +821,7 @@ class AhvInterface3(AhvInterface):
         """
         ahv_host_cluster_uuid_names = []
 
-        res = self.make_rest_call(method="post", uri="/clusters/list")
-        data = res.json()
-
-        # FIXME: It is also possible that the list could not be complete, when the list of clusters
-        # is too long. Information about number of gathered clusters is in metadata section too.
-        # I cannot implement it ATM, because I don't know how this situation looks like and I
-        # don't have system with more than one cluster.
-
-        for cluster in data["entities"]:
+        for cluster in self.get_entities("/clusters/list", "clusters"):
             try:
                 cluster_uuid = cluster["metadata"]['uuid']
                 cluster_name = cluster["spec"]["name"]
@@ -572,51 +885,6 @@ class AhvInterface3(AhvInterface):
 
         return None
 
-    def build_host_to_uvm_map(self):
-        """
-        Builds a dictionary of every ahv host along with the vms they are hosting
-        Returns:
-            host_uvm_map (dict): Dict of ahv host with its uvms.
-        """
-        host_uvm_map = {}
-
-        host_list = self.get_host_list()
-
-        def reduce_host_vm_map_v3(_host_uvm_map, _vm_entity):
-            """
-            This function is used by reduce() and it reduces generated list of entities
-            to dictionary. Key is host UUID containing list of VMs running on this host
-            """
-            _host_uuid = None
-            if _vm_entity and "status" in _vm_entity:
-                _host_uuid = self.get_host_uuid_from_vm(_vm_entity)
-            if _host_uuid:
-                if _host_uuid not in _host_uvm_map:
-                    for _host in host_list:
-                        if _host["metadata"]["uuid"] == _host_uuid:
-                            _host_uvm_map[_host_uuid] = _host
-                            _host_uvm_map[_host_uuid]['guest_list'] = []
-                _host_uvm_map[_host_uuid]['guest_list'].append(_vm_entity)
-            return _host_uvm_map
-
-        vm_entities = self.get_vm_entities()
-
-        host_uvm_map = reduce(reduce_host_vm_map_v3, vm_entities, host_uvm_map)
-
-        if len(host_uvm_map) > 0:
-            return host_uvm_map
-        else:
-            self._logger.warning("No available VMs found. Trying to get list of hosts...")
-            if len(host_list) > 0:
-                for host in host_list:
-                    host_uuid = host["metadata"]["uuid"]
-                    if host_uuid not in host_uvm_map:
-                        host_uvm_map[host_uuid] = host
-                        host_uvm_map[host_uuid]['guest_list'] = []
-            else:
-                self._logger.warning("No Available AHV host found")
-            return host_uvm_map
-
 
 class Failure(Exception):
     def __init__(self, details):
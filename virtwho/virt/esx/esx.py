@@ -25,6 +25,8 @@ import requests
 import errno
 import stat
 import re
+import tempfile
+import threading
 from io import BytesIO
 import io
 import logging
@@ -32,20 +34,41 @@ from time import time
 from urllib.error import URLError
 import socket
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from http.client import HTTPException
+from xml.etree import ElementTree
+from xml.parsers.expat import ExpatError
+from xml.sax import SAXException
 
 from virtwho import virt
 from virtwho.config import VirtConfigSection
 from virtwho.virt import StatusReport
+from virtwho.virt.esx.suds import cache
 from virtwho.virt.esx.suds import client
 from virtwho.virt.esx.suds import sudsobject
 from virtwho.virt.esx.suds import transport
 from virtwho.virt.esx.suds import WebFault
+from virtwho.virt.esx.updates import UpdateSetPlugin, ObjectUpdate, PropertyChange
+from virtwho.virt.esx.minimal_vim import MinimalWsdl, InvalidWsdlError
 
 try:
-    from urllib.parse import unquote as urldecode
+    from urllib.parse import unquote as urldecode, urlparse
 except ImportError:
     from urllib import unquote as urldecode
+    from urlparse import urlparse
+
+
+WSDL_CACHE_DIR = "/var/cache/virt-who/esx"
+POOL_SIZE = 10
+KEEPALIVE_INTERVAL = 600
+PAGE_SIZE = 1000
+PARTITION_WORKERS = 4
+
+# Types of the objects the inventory can be partitioned by
+PARTITION_TYPES = {
+    'datacenter': 'Datacenter',
+    'cluster': 'ComputeResource',
+}
 
 
 class FileAdapter(requests.adapters.BaseAdapter):
@@ -88,15 +111,21 @@ class RequestsTransport(transport.Transport):
     This unifies network handling with other backends. For example
     proxy support will be same as for other modules.
     '''
-    def __init__(self, session=None):
+    def __init__(self, session=None, stats=None):
         transport.Transport.__init__(self)
-        self._session = session or requests.Session()
-        self._session.mount('file://', FileAdapter())
+        if session is None:
+            session = requests.Session()
+            session.mount('file://', FileAdapter())
+        self._session = session
+        self._stats = stats
 
     def open(self, request):
         resp = self._session.get(request.url, headers=request.headers, verify=False)
         resp.raise_for_status()
-        return BytesIO(resp.content)
+        content = resp.content
+        if self._stats is not None and not request.url.startswith('file://'):
+            self._stats.add_request(0, resp.raw.tell(), resp.elapsed.total_seconds())
+        return BytesIO(content)
 
     def send(self, request):
         resp = self._session.post(
@@ -104,21 +133,195 @@ class RequestsTransport(transport.Transport):
             data=request.message,
             headers=request.headers,
             timeout=self.options.timeout,
-            verify=False
+            verify=False,
+            stream=True
         )
+        if self._stats is not None:
+            self._stats.add_request(len(request.message or b''), 0, resp.elapsed.total_seconds())
         ct = resp.headers.get('content-type', '')
         if 'application/soap+xml' not in ct and 'text/xml' not in ct:
             resp.raise_for_status()
+            content = resp.content
+            if self._stats is not None:
+                self._stats.add_received(resp.raw.tell())
+            return transport.Reply(
+                resp.status_code,
+                resp.headers,
+                content,
+            )
+        # SOAP replies are parsed as they are received instead of
+        # buffering the whole body first
         return transport.Reply(
             resp.status_code,
             resp.headers,
-            resp.content,
+            ResponseStream(resp, self._stats),
         )
 
 
+class ResponseStream(io.RawIOBase):
+    '''
+    File-like object with body of the streamed requests response.
+
+    The connection is returned to the pool when the stream is closed.
+    '''
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, response, stats=None):
+        super(ResponseStream, self).__init__()
+        self._response = response
+        self._stats = stats
+        self._chunks = response.iter_content(self.CHUNK_SIZE)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._buffer:
+            self._buffer = next(self._chunks, b'')
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if self._stats is not None and not self.closed:
+            # Size of the body as it was received, i.e. compressed
+            self._stats.add_received(self._response.raw.tell())
+        self._response.close()
+        super(ResponseStream, self).close()
+
+
+class HostStats(object):
+    '''
+    Counters of the requests sent to one vCenter server.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    def add_request(self, sent, received, latency):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def add_received(self, received):
+        with self._lock:
+            self.bytes_received += received
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'avg_latency': self.latency / self.requests if self.requests else 0.0,
+                'max_latency': self.max_latency,
+            }
+
+
+class SessionRegistry(object):
+    '''
+    Registry of HTTP connection pools shared by all Esx instances.
+
+    Pools are keyed by the vCenter host, so reconnects and configurations
+    pointing to the same vCenter reuse already established connections.
+    Every login still gets its own requests session, the vCenter session
+    cookie is not shared between them.
+    '''
+    _adapters = {}
+    _stats = {}
+    _file_adapter = FileAdapter()
+    _lock = threading.Lock()
+
+    @classmethod
+    def transport(cls, url, pool_size=POOL_SIZE):
+        '''
+        Get RequestsTransport using the connection pool for given vCenter url
+
+        The pool size of the first transport created for the host is used.
+        '''
+        parsed = urlparse(url)
+        prefix = '%s://%s/' % (parsed.scheme, parsed.netloc)
+        with cls._lock:
+            adapter = cls._adapters.get(parsed.netloc)
+            if adapter is None:
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                cls._adapters[parsed.netloc] = adapter
+                cls._stats[parsed.netloc] = HostStats()
+            stats = cls._stats[parsed.netloc]
+        session = requests.Session()
+        session.mount('file://', cls._file_adapter)
+        session.mount(prefix, adapter)
+        return RequestsTransport(session, stats)
+
+    @classmethod
+    def stats(cls, url=None):
+        '''
+        Get counters of the requests to given vCenter url or to all of them
+        '''
+        with cls._lock:
+            if url is not None:
+                stats = cls._stats.get(urlparse(url).netloc)
+                return stats.as_dict() if stats is not None else None
+            return dict((host, stats.as_dict()) for host, stats in cls._stats.items())
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            for adapter in cls._adapters.values():
+                adapter.close()
+            cls._adapters.clear()
+            cls._stats.clear()
+
+
+class WsdlCache(cache.ObjectCache):
+    '''
+    Cache of compiled vSphere WSDL definitions.
+
+    Entries are stored under the vCenter API version instead of the WSDL
+    URL, so all vCenters running the same API version share one entry.
+    Definitions are also kept in the process-wide `memory` cache and shared
+    by all Esx instances in the process.
+    '''
+    memory = cache.MemoryCache()
+
+    def __init__(self, key, location=None, **duration):
+        cache.ObjectCache.__init__(self, location, **duration)
+        self.key = key
+
+    def get(self, id):
+        wsdl = self.memory.get(self.key)
+        if wsdl is None:
+            wsdl = cache.ObjectCache.get(self, self.key)
+            if wsdl is not None:
+                self.memory.put(self.key, wsdl)
+        return wsdl
+
+    def put(self, id, object):
+        self.memory.put(self.key, object)
+        return cache.ObjectCache.put(self, self.key, object)
+
+    def purge(self, id):
+        self.memory.purge(self.key)
+        cache.ObjectCache.purge(self, self.key)
+
+    @classmethod
+    def clear_memory(cls):
+        cls.memory.clear()
+
+
 class Esx(virt.Virt):
     CONFIG_TYPE = "esx"
     MAX_WAIT_TIME = 60  # 1 minute
+    _client_lock = threading.Lock()
 
     def __init__(self, logger, config, dest, terminate_event=None,
                  interval=None, oneshot=False, status=False):
@@ -132,32 +335,55 @@ class Esx(virt.Virt):
         self.password = self.config['password']
 
         self.filter = None
+        self.views = []
         self.sc = None
+        # Objects the inventory is collected from, root folder when None
+        self.roots = None
+        self.partitions = []
+        self.version = None
 
     def _prepare(self):
-        """ Prepare for obtaining information from ESX server. """
-        self.logger.debug("Log into ESX")
-        self.login()
+        """
+        Prepare for obtaining information from ESX server. The session is
+        reused when it's still valid, only the event filter is created again.
+        """
+        if self.sc is not None and self.keepAlive():
+            self.logger.debug("Reusing ESX session")
+            self.destroyFilter()
+        else:
+            # Views and filter are gone together with the session
+            self.views = []
+            self.filter = None
+            self.logger.debug("Log into ESX")
+            self.login()
 
         self.logger.debug("Creating ESX event filter")
         self.filter = self.createFilter()
 
     def _cancel_wait(self):
         try:
-            self.client.service.CancelWaitForUpdates(_this=self.sc.propertyCollector)
+            self.cancelWaitForUpdates()
         except Exception:
             pass
 
     def _run(self):
+        if self.config['partition'] != 'none' and not self.status:
+            self._run_partitioned()
+            return
+
+        if self._oneshot and not self.status:
+            self._run_snapshot()
+            return
+
         self._prepare()
 
         version = ''
+        retry_version = None
         last_version = 'last_version'  # Bogus value so version != last_version from the start
         self.hosts = defaultdict(Host)
         self.vms = defaultdict(VM)
         self.clusters = defaultdict(Cluster)
         next_update = time()
-        options = {'maxWaitSeconds': 0}
 
         while self._oneshot or not self.is_terminated():
 
@@ -171,15 +397,11 @@ class Esx(virt.Virt):
                 # if the ESX shuts down in the middle of waiting
                 self.client.set_options(timeout=self.MAX_WAIT_TIME)
                 self.logger.debug("calling esx service")
-                updateSet = self.client.service.WaitForUpdatesEx(
-                    _this=self.sc.propertyCollector,
-                    version=version,
-                    options=options)
+                updateSet = self.waitForUpdates(version=version)
             except (socket.error, URLError, requests.exceptions.Timeout):
                 self.logger.debug("Wait for ESX event finished, timeout")
                 self._cancel_wait()
-                # Get the initial update again
-                version = ''
+                # The filter survives the timeout, continue from the same version
                 continue
             except (WebFault, HTTPException) as e:
                 suppress_exception = False
@@ -189,6 +411,8 @@ class Esx(virt.Virt):
                             # Do not print the exception if we get 'not authenticated',
                             # it's quite normal behaviour and nothing to worry about
                             suppress_exception = True
+                            # The server dropped the session, log in again
+                            self.sc = None
                         if e.fault.faultstring == 'The task was canceled by a user.':
                             # Do not print the exception if we get 'canceled by user',
                             # this happens when the wait is terminated when
@@ -199,10 +423,24 @@ class Esx(virt.Virt):
                 if not suppress_exception:
                     self.logger.exception("Waiting for ESX events fails:")
                 self._cancel_wait()
+                if self.sc is not None and version and retry_version != version and self.keepAlive():
+                    # Session is still valid, try once more from the same version
+                    retry_version = version
+                    continue
+                # Start over with new filter and full update
+                version = ''
+                self._prepare()
+                continue
+            except ExpatError as e:
+                # Some updates of the invalid reply may be applied already,
+                # start over with new filter and full update
+                self.logger.warning("Invalid reply to WaitForUpdatesEx, starting over: %s", str(e))
                 version = ''
                 self._prepare()
                 continue
 
+            retry_version = None
+
             if self.status:
                 self._send_data(data_to_send=StatusReport(self.config))
                 break
@@ -219,14 +457,200 @@ class Esx(virt.Virt):
                 self._send_data(data_to_send=virt.HostGuestAssociationReport(self.config, assoc))
                 next_update = time() + self.interval
                 last_version = version
+                self.logger.debug("Requests to ESX: %s", SessionRegistry.stats(self.url))
 
             if self._oneshot:
                 break
             else:
-                self.wait(self.interval)
+                self.waitKeepAlive(self.interval)
 
         self.cleanup()
 
+    def _run_snapshot(self):
+        """
+        Obtain the host-to-guest mapping once using paged RetrievePropertiesEx
+        calls. No property filter is created on the server in this mode.
+        """
+        self.collectSnapshot()
+
+        assoc = self.getHostGuestMapping()
+        self._send_data(data_to_send=virt.HostGuestAssociationReport(self.config, assoc))
+        self.logger.debug("Requests to ESX: %s", SessionRegistry.stats(self.url))
+
+    def _run_partitioned(self):
+        """
+        Obtain the host-to-guest mapping from several sessions, each collecting
+        part of the inventory on its own worker thread.
+        """
+        self.partitions = self.createPartitions()
+        self.logger.debug("Collecting ESX inventory by %d workers", len(self.partitions))
+        if self._oneshot:
+            def collect(partition):
+                return partition.collectSnapshot()
+        else:
+            def collect(partition):
+                return partition.collectUpdates()
+
+        last_versions = None
+        next_update = time()
+        executor = ThreadPoolExecutor(max_workers=len(self.partitions) or 1)
+        try:
+            while self._oneshot or not self.is_terminated():
+                versions = list(executor.map(collect, self.partitions))
+
+                if last_versions != versions or time() > next_update:
+                    self.mergePartitions()
+                    assoc = self.getHostGuestMapping()
+                    self._send_data(data_to_send=virt.HostGuestAssociationReport(self.config, assoc))
+                    next_update = time() + self.interval
+                    last_versions = versions
+                    self.logger.debug("Requests to ESX: %s", SessionRegistry.stats(self.url))
+
+                if self._oneshot:
+                    break
+                else:
+                    self.waitKeepAlive(self.interval)
+        finally:
+            executor.shutdown()
+            for partition in self.partitions:
+                partition.cleanup()
+            self.partitions = []
+
+    def createPartitions(self):
+        """
+        Split the inventory by datacenters or compute resources
+
+        The parts are distributed to at most `partition_workers` Esx
+        instances, each of them logs in with its own session.
+        """
+        self.logger.debug("Log into ESX")
+        self.login()
+        try:
+            roots = self.listPartitionRoots()
+        finally:
+            self.destroyViews()
+            self.logout()
+
+        count = min(self.config['partition_workers'], len(roots))
+        partitions = []
+        for i in range(count):
+            partition = Esx(self.logger, self.config, None,
+                            terminate_event=self.terminate_event,
+                            interval=self.interval,
+                            oneshot=self._oneshot)
+            partition.roots = roots[i::count]
+            partitions.append(partition)
+        return partitions
+
+    def listPartitionRoots(self):
+        type = PARTITION_TYPES[self.config['partition']]
+        try:
+            view = self.client.service.CreateContainerView(
+                _this=self.sc.viewManager, container=self.sc.rootFolder, type=[type], recursive=True)
+        except requests.RequestException as e:
+            raise virt.VirtError(str(e))
+        self.views.append(view)
+
+        oSpec = self.objectSpec()
+        oSpec.obj = view
+        oSpec.skip = True
+        oSpec.selectSet = [self.createTraversalSpec("traverseView", "ContainerView", "view", [])]
+        pfs = self.propertyFilterSpec()
+        pfs.objectSet = [oSpec]
+        pfs.propSet = [self.createPropertySpec(type, [])]
+        return [objectContent.obj for objectContent in self.retrieveObjects(pfs)]
+
+    def mergePartitions(self):
+        self.hosts = defaultdict(Host)
+        self.vms = defaultdict(VM)
+        self.clusters = defaultdict(Cluster)
+        for partition in self.partitions:
+            self.hosts.update(partition.hosts)
+            self.vms.update(partition.vms)
+            self.clusters.update(partition.clusters)
+
+    def collectSnapshot(self):
+        """
+        Log in, retrieve all objects and log out again
+        """
+        self.logger.debug("Log into ESX")
+        self.login()
+
+        self.hosts = defaultdict(Host)
+        self.vms = defaultdict(VM)
+        self.clusters = defaultdict(Cluster)
+        try:
+            self.retrieveSnapshot()
+        finally:
+            self.destroyViews()
+            self.logout()
+
+    def collectUpdates(self):
+        """
+        Apply all pending updates of the property filter, the filter is
+        created on the first call. Returns version of the last update set.
+        """
+        try:
+            return self._collectUpdates()
+        except (socket.error, URLError, requests.exceptions.Timeout):
+            self.logger.debug("Wait for ESX event finished, timeout")
+            self._cancel_wait()
+            # The filter survives the timeout, continue from the same version
+            return self._collectUpdates()
+        except (WebFault, HTTPException, ExpatError) as e:
+            self.logger.debug("Collecting ESX updates failed, starting over: %s", str(e))
+            self._cancel_wait()
+            self.version = None
+            return self._collectUpdates()
+
+    def _collectUpdates(self):
+        if self.version is None:
+            self.hosts = defaultdict(Host)
+            self.vms = defaultdict(VM)
+            self.clusters = defaultdict(Cluster)
+            self.version = ''
+            self._prepare()
+
+        while True:
+            updateSet = self.waitForUpdates(version=self.version)
+            if updateSet is None:
+                break
+            self.version = updateSet.version
+            self.applyUpdates(updateSet)
+            if not getattr(updateSet, 'truncated', False):
+                break
+        return self.version
+
+    def waitKeepAlive(self, wait_time):
+        """
+        Wait `wait_time` seconds, the sessions are kept alive meanwhile
+        so they don't expire between the updates.
+        """
+        end = time() + wait_time
+        while not self.is_terminated():
+            remaining = end - time()
+            if remaining <= 0:
+                break
+            self.wait(min(remaining, self.config['keepalive_interval']))
+            if time() < end and not self.is_terminated():
+                for partition in self.partitions:
+                    partition.keepAlive()
+                if self.sc is not None:
+                    self.keepAlive()
+
+    def keepAlive(self):
+        """
+        Call CurrentTime to keep the session from expiring
+
+        Returns False when the session is no longer valid.
+        """
+        try:
+            self.currentTime()
+        except (WebFault, HTTPException, requests.RequestException, socket.error, URLError) as e:
+            self.logger.debug("ESX session is not valid: %s", str(e))
+            return False
+        return True
+
     def _format_hostname(self, host, domain):
         return u'{0}.{1}'.format(host, domain)
 
@@ -236,8 +660,16 @@ class Esx(virt.Virt):
         super(Esx, self).stop()
 
     def cleanup(self):
+        for partition in self.partitions:
+            partition.cleanup()
+
         self._cancel_wait()
+        self.destroyFilter()
+        self.version = None
+        self.logout()
 
+    def destroyFilter(self):
+        self.destroyViews()
         if self.filter is not None:
             try:
                 self.client.service.DestroyPropertyFilter(self.filter)
@@ -245,7 +677,13 @@ class Esx(virt.Virt):
                 pass
             self.filter = None
 
-        self.logout()
+    def destroyViews(self):
+        for view in self.views:
+            try:
+                self.client.service.DestroyView(view)
+            except WebFault:
+                pass
+        self.views = []
 
     def getHostGuestMapping(self):
         mapping = {'hypervisors': []}
@@ -356,20 +794,106 @@ class Esx(virt.Virt):
                 return True
         return False
 
+    def apiVersion(self, soap_transport):
+        """
+        Get version of the vim25 API provided by the vCenter server
+
+        Returns None when the server doesn't publish list of its API versions.
+        """
+        request = transport.Request(self.url + '/sdk/vimServiceVersions.xml')
+        try:
+            root = ElementTree.fromstring(soap_transport.open(request).read())
+        except (requests.RequestException, ElementTree.ParseError) as e:
+            self.logger.debug("Unable to get vCenter API version: %s", str(e))
+            return None
+        for namespace in root.iter('namespace'):
+            if namespace.findtext('name') == 'urn:vim25':
+                return namespace.findtext('version')
+        return None
+
+    def wsdlCache(self, soap_transport):
+        """
+        Get cache of compiled definitions for the server provided WSDL
+
+        The cache is keyed by the vCenter API version, so the WSDL itself is
+        only downloaded when there are no definitions for the version yet.
+        Returns None when the version is unknown.
+        """
+        version = self.apiVersion(soap_transport)
+        if version is None:
+            return None
+        return WsdlCache('vim25-%s' % version, location=self.config['wsdl_cache_dir'])
+
+    def minimalWsdl(self, soap_transport):
+        """
+        Get URL of stripped-down WSDL for the vCenter API version
+
+        The WSDL is derived from the server provided one on the first
+        connection to a server with given API version and stored in the
+        WSDL cache directory. The WSDL bundled with virt-who is used when
+        the version is unknown or the WSDL can't be derived.
+        """
+        bundled = 'file://%s/vimServiceMinimal.wsdl' % os.path.dirname(os.path.abspath(__file__))
+        version = self.apiVersion(soap_transport)
+        if version is None:
+            return bundled
+        path = os.path.join(os.path.abspath(self.config['wsdl_cache_dir']),
+                            'vimServiceMinimal-%s.wsdl' % re.sub(r'[^\w.-]', '_', version))
+        if os.path.exists(path):
+            return 'file://%s' % path
+
+        def fetch(url):
+            return soap_transport.open(transport.Request(url)).read()
+        try:
+            content = MinimalWsdl(fetch).build(self.url + '/sdk/vimService.wsdl')
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            # Other instances may be reading the file already
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.rename(tmp, path)
+        except (requests.RequestException, InvalidWsdlError, SAXException, OSError, IOError) as e:
+            self.logger.warning("Unable to create WSDL for vCenter API version %s, using the bundled one: %s",
+                                version, str(e))
+            return bundled
+        self.logger.info("Created WSDL for vCenter API version %s: %s", version, path)
+        return 'file://%s' % path
+
     def login(self):
         """
         Log into ESX
         """
 
-        kwargs = {'transport': RequestsTransport()}
-        # Connect to the vCenter server
-        if self.config['simplified_vim']:
-            wsdl = 'file://%s/vimServiceMinimal.wsdl' % os.path.dirname(os.path.abspath(__file__))
-            kwargs['cache'] = None
-        else:
-            wsdl = self.url + '/sdk/vimService.wsdl'
+        # Only a few of the vim25 types are ever used by virt-who, so let
+        # suds build them on their first use, and unmarshal the replies into
+        # compact objects (their metadata is shared and never modified here)
+        kwargs = {
+            'transport': SessionRegistry.transport(self.url, self.config['pool_size']),
+            'lazyschema': True,
+            'compactobjects': True,
+        }
+        # Decode the WaitForUpdatesEx replies directly into the inventory
+        kwargs['plugins'] = [UpdateSetPlugin(self.applyObjectUpdate)]
         try:
-            self.client = client.Client(wsdl, location="%s/sdk" % self.url, **kwargs)
+            # Connect to the vCenter server
+            if self.config['simplified_vim']:
+                if self.config['generate_simplified_vim']:
+                    wsdl = self.minimalWsdl(kwargs['transport'])
+                else:
+                    wsdl = 'file://%s/vimServiceMinimal.wsdl' % os.path.dirname(os.path.abspath(__file__))
+                # The stripped-down WSDL is local, so its definitions are
+                # only kept in memory, under the WSDL URL
+                kwargs['cache'] = WsdlCache.memory
+            else:
+                wsdl = self.url + '/sdk/vimService.wsdl'
+                kwargs['cache'] = self.wsdlCache(kwargs['transport'])
+            # Cache the whole WSDL object, not single documents
+            kwargs['cachingpolicy'] = 1
+            # Build the definitions for one API version at a time, other
+            # instances then pick them up from the cache
+            with Esx._client_lock:
+                self.client = client.Client(wsdl, location="%s/sdk" % self.url, **kwargs)
         except requests.RequestException as e:
             raise virt.VirtError(str(e))
 
@@ -402,6 +926,13 @@ class Esx(virt.Virt):
             self.logger.exception("Unable to login to ESX")
             raise virt.VirtError(str(e))
 
+        # Requests repeated during the session are marshalled only once
+        self.waitForUpdates = self.client.service.WaitForUpdatesEx.prepare(
+            ['version'], _this=self.sc.propertyCollector, options={'maxWaitSeconds': 0})
+        self.cancelWaitForUpdates = self.client.service.CancelWaitForUpdates.prepare(
+            [], _this=self.sc.propertyCollector)
+        self.currentTime = self.client.service.CurrentTime.prepare([], _this=self.moRef)
+
     def logout(self):
         """ Log out from ESX. """
         try:
@@ -412,12 +943,56 @@ class Esx(virt.Virt):
             self.logger.info("Can't log out from ESX: %s", str(e))
 
     def createFilter(self):
-        oSpec = self.objectSpec()
-        oSpec.obj = self.sc.rootFolder
-        oSpec.selectSet = self.buildFullTraversal()
+        try:
+            return self.client.service.CreateFilter(
+                _this=self.sc.propertyCollector, spec=self.propertyFilter(), partialUpdates=0)
+        except requests.RequestException as e:
+            raise virt.VirtError(str(e))
+
+    def retrieveSnapshot(self):
+        """
+        Retrieve all objects page by page, each page is applied as soon
+        as it's received.
+        """
+        for objectContent in self.retrieveObjects(self.propertyFilter()):
+            self.applyObjectContent(objectContent)
+
+    def retrieveObjects(self, spec):
+        options = self.client.factory.create('ns0:RetrieveOptions')
+        options.maxObjects = self.config['page_size']
+        try:
+            result = self.client.service.RetrievePropertiesEx(
+                _this=self.sc.propertyCollector, specSet=[spec], options=options)
+            while result is not None:
+                for objectContent in result.objects:
+                    yield objectContent
+                if not getattr(result, 'token', None):
+                    break
+                result = self.client.service.ContinueRetrievePropertiesEx(
+                    _this=self.sc.propertyCollector, token=result.token)
+        except requests.RequestException as e:
+            raise virt.VirtError(str(e))
+
+    def propertyFilter(self):
+        roots = [self.sc.rootFolder] if self.roots is None else self.roots
+        if self.config['container_view']:
+            objectSet = self.createContainerViews(roots)
+            if self.roots is not None:
+                # Containers aren't part of the views, add them as well
+                for root in roots:
+                    oSpec = self.objectSpec()
+                    oSpec.obj = root
+                    objectSet.append(oSpec)
+        else:
+            objectSet = []
+            for root in roots:
+                oSpec = self.objectSpec()
+                oSpec.obj = root
+                oSpec.selectSet = self.buildFullTraversal()
+                objectSet.append(oSpec)
 
         pfs = self.propertyFilterSpec()
-        pfs.objectSet = [oSpec]
+        pfs.objectSet = objectSet
         pfs.propSet = [
             self.createPropertySpec("VirtualMachine", ["config.uuid", "config.version", "runtime.powerState"]),
             self.createPropertySpec("ClusterComputeResource", ["name"]),
@@ -431,21 +1006,60 @@ class Esx(virt.Virt):
                                                    "config.network.dnsConfig.hostName",
                                                    "config.network.dnsConfig.domainName"])
         ]
+        return pfs
 
-        try:
-            return self.client.service.CreateFilter(_this=self.sc.propertyCollector, spec=pfs, partialUpdates=0)
-        except requests.RequestException as e:
-            raise virt.VirtError(str(e))
+    def createContainerViews(self, containers):
+        """
+        Create container views with all hosts, guests and clusters
+
+        The server doesn't need to evaluate the folder traversal for the
+        views and reports every object only once.
+        """
+        self.views = []
+        objectSet = []
+        for container in containers:
+            for type in ["HostSystem", "VirtualMachine", "ClusterComputeResource"]:
+                try:
+                    view = self.client.service.CreateContainerView(
+                        _this=self.sc.viewManager, container=container, type=[type], recursive=True)
+                except requests.RequestException as e:
+                    raise virt.VirtError(str(e))
+                self.views.append(view)
+                oSpec = self.objectSpec()
+                oSpec.obj = view
+                oSpec.skip = True
+                oSpec.selectSet = [self.createTraversalSpec("traverseView", "ContainerView", "view", [])]
+                objectSet.append(oSpec)
+        return objectSet
 
     def applyUpdates(self, updateSet):
-        for filterSet in updateSet.filterSet:
+        # Updates decoded by UpdateSetPlugin are already applied and
+        # the update set contains only the version
+        for filterSet in getattr(updateSet, 'filterSet', []):
             for objectSet in filterSet.objectSet:
-                if objectSet.obj._type == 'VirtualMachine':  # pylint: disable=W0212
-                    self.applyVirtualMachineUpdate(objectSet)
-                elif objectSet.obj._type == 'HostSystem':  # pylint: disable=W0212
-                    self.applyHostSystemUpdate(objectSet)
-                elif objectSet.obj._type == 'ClusterComputeResource':
-                    self.applyClusterComputeResource(objectSet)
+                self.applyObjectUpdate(objectSet)
+
+    def applyObjectUpdate(self, objectSet):
+        if objectSet.obj._type == 'VirtualMachine':  # pylint: disable=W0212
+            self.applyVirtualMachineUpdate(objectSet)
+        elif objectSet.obj._type == 'HostSystem':  # pylint: disable=W0212
+            self.applyHostSystemUpdate(objectSet)
+        elif objectSet.obj._type == 'ClusterComputeResource':
+            self.applyClusterComputeResource(objectSet)
+
+    def applyObjectContent(self, objectContent):
+        # Retrieved object is applied as if it entered the property filter
+        objectSet = ObjectUpdate()
+        objectSet.kind = 'enter'
+        objectSet.obj = objectContent.obj
+        for prop in getattr(objectContent, 'propSet', []):
+            change = PropertyChange()
+            change.name = prop.name
+            change.op = 'assign'
+            if hasattr(prop, 'val'):
+                change.val = prop.val
+            objectSet.changeSet.append(change)
+        self.applyObjectUpdate(objectSet)
 
     def applyClusterComputeResource(self, objectSet):
         if objectSet.kind in ['enter', 'kind']:
@@ -570,8 +1184,24 @@ class EsxConfigSection(VirtConfigSection):
         self.add_key('username', validation_method=self._validate_username, required=True)
         self.add_key('password', validation_method=self._validate_unencrypted_password, required=True)
         self.add_key('simplified_vim', validation_method=self._validate_str_to_bool, default=True)
+        self.add_key('generate_simplified_vim', validation_method=self._validate_str_to_bool, default=False)
+        self.add_key('container_view', validation_method=self._validate_str_to_bool, default=False)
         self.add_key('filter_host_parents', validation_method=self._validate_filter, default=None)
         self.add_key('exclude_host_parents', validation_method=self._validate_filter, default=None)
+        self.add_key('wsdl_cache_dir', validation_method=self._validate_non_empty_string, default=WSDL_CACHE_DIR)
+        self.add_key('pool_size', validation_method=self._validate_positive_integer, default=POOL_SIZE)
+        self.add_key('keepalive_interval', validation_method=self._validate_positive_integer,
+                     default=KEEPALIVE_INTERVAL)
+        self.add_key('page_size', validation_method=self._validate_positive_integer, default=PAGE_SIZE)
+        self.add_key('partition', validation_method=self._validate_partition, default='none')
+        self.add_key('partition_workers', validation_method=self._validate_positive_integer,
+                     default=PARTITION_WORKERS)
+
+    def _validate_partition(self, key):
+        partitions = ['none'] + sorted(PARTITION_TYPES)
+        if self._values.get(key) not in partitions:
+            return 'error', "'%s' must be one of: '%s'" % (key, ", ".join(partitions))
+        return None
 
     def _validate_server(self, key):
         error = super(EsxConfigSection, self)._validate_server(key)
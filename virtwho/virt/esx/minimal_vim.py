@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Generator of stripped-down vSphere WSDL, part of virt-who
+
+Copyright (C) 2024 Red Hat, Inc.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from virtwho.virt.esx.suds import byte_str
+from virtwho.virt.esx.suds.sax.document import Document
+from virtwho.virt.esx.suds.sax.parser import Parser
+from virtwho.virt.esx.suds.xsd import qualify
+
+try:
+    from urllib.parse import urljoin
+except ImportError:
+    from urlparse import urljoin
+
+
+WSDL_NS = (None, 'http://schemas.xmlsoap.org/wsdl/')
+XSD_NS = (None, 'http://www.w3.org/2001/XMLSchema')
+
+# Operations called by virt-who
+METHODS = (
+    'Login', 'Logout', 'RetrieveServiceContent', 'CurrentTime',
+    'RetrieveProperties', 'RetrievePropertiesEx', 'ContinueRetrievePropertiesEx',
+    'CreateFilter', 'WaitForUpdatesEx', 'DestroyPropertyFilter',
+    'CancelWaitForUpdates', 'CreateContainerView', 'DestroyView',
+)
+
+# Types created or received by virt-who that the operations don't refer to
+TYPES = (
+    'TraversalSpec', 'ArrayOfManagedObjectReference', 'ArrayOfDynamicProperty',
+    'DynamicData', 'VimFault', 'PropertyFilterSpec',
+)
+
+# Attributes of schema components referring to types
+TYPE_REFERENCES = ('type', 'base', 'itemType')
+
+
+class InvalidWsdlError(Exception):
+    pass
+
+
+def _move(element, parent):
+    '''
+    Move the element under another parent.
+
+    Namespace declarations in scope of the element are declared on the
+    element itself, so prefixed names in it keep their meaning.
+    '''
+    scope = element.parent
+    while scope is not None:
+        for prefix, uri in scope.nsprefixes.items():
+            element.nsprefixes.setdefault(prefix, uri)
+        if element.expns is None:
+            element.expns = scope.expns
+        scope = scope.parent
+    element.parent = parent
+    parent.children.append(element)
+
+
+def _qualify(ref, node, default):
+    '''Get (name, namespace) of the referenced component.'''
+    try:
+        return qualify(ref, node, default)
+    except Exception as e:
+        raise InvalidWsdlError(str(e))
+
+
+def _space(element):
+    '''Symbol space of a top level schema component.'''
+    if element.name in ('complexType', 'simpleType'):
+        return 'type'
+    return element.name
+
+
+class MinimalWsdl(object):
+    '''
+    Builder of a minimal WSDL from the full vSphere one.
+
+    The minimal WSDL is one self-contained document with just the given
+    operations and the types they need, which suds loads several times
+    faster than the full WSDL. Documents imported and included by the full
+    WSDL are retrieved by the `fetch` callable, which gets the document
+    URL and returns its content.
+    '''
+    def __init__(self, fetch, methods=METHODS, types=TYPES):
+        self.fetch = fetch
+        self.methods = set(methods)
+        self.types = types
+
+    def build(self, url):
+        '''
+        Build the minimal WSDL from the full WSDL at given URL
+
+        Returns the minimal WSDL as bytes. Raises InvalidWsdlError when
+        the full WSDL doesn't define all the operations or types.
+        '''
+        definitions = self._loadDefinitions(url, [], set())
+        bases = [root for root, _ in definitions if root.getChild('binding', WSDL_NS) is not None]
+        if not bases:
+            raise InvalidWsdlError("No binding found in %s" % url)
+        base = bases[0]
+        tns = base.get('targetNamespace')
+
+        components = {}
+        visited = set()
+        schema = None
+        for root, location in definitions:
+            types = root.getChild('types', WSDL_NS)
+            if types is None:
+                continue
+            for child in types.getChildren('schema', XSD_NS):
+                if schema is None and root is base:
+                    schema = child
+                self._loadSchema(child, location, components, visited)
+        if schema is None:
+            raise InvalidWsdlError("No schema found in %s" % url)
+
+        messages, elements = self._pruneOperations(base, tns)
+        types = [('type', name, schema.get('targetNamespace')) for name in self.types]
+        kept = self._closure(types + elements, components)
+
+        schema.children = []
+        for key, component in components.items():
+            if key in kept:
+                _move(component, schema)
+
+        types = base.getChild('types', WSDL_NS)
+        types.children = [schema]
+        children = base.children
+        base.children = []
+        for child in children:
+            if child.match('import', WSDL_NS):
+                continue
+            if child.match('message', WSDL_NS) and child.get('name') not in messages:
+                continue
+            base.children.append(child)
+        for root, _ in definitions:
+            if root is not base:
+                for service in root.getChildren('service', WSDL_NS):
+                    _move(service, base)
+        return byte_str(str(Document(base)))
+
+    def _load(self, url):
+        root = Parser().parse(string=self.fetch(url)).root()
+        if root is None:
+            raise InvalidWsdlError("Empty document %s" % url)
+        return root
+
+    def _loadDefinitions(self, url, definitions, visited):
+        '''Load the WSDL and all WSDLs it imports as (root, url) list.'''
+        visited.add(url)
+        root = self._load(url)
+        definitions.append((root, url))
+        for child in root.getChildren('import', WSDL_NS):
+            location = child.get('location')
+            if location is None:
+                continue
+            location = urljoin(url, location)
+            if location not in visited:
+                self._loadDefinitions(location, definitions, visited)
+        return definitions
+
+    def _loadSchema(self, schema, url, components, visited):
+        '''Collect top level components of the schema and its includes.'''
+        tns = schema.get('targetNamespace')
+        for child in schema.children:
+            if child.match('include', XSD_NS) or child.match('import', XSD_NS):
+                location = child.get('schemaLocation')
+                if location is None:
+                    continue
+                location = urljoin(url, location)
+                if location not in visited:
+                    visited.add(location)
+                    self._loadSchema(self._load(location), location, components, visited)
+            elif child.get('name') is not None:
+                components.setdefault((_space(child), child.get('name'), tns), child)
+
+    def _pruneOperations(self, base, tns):
+        '''
+        Remove the operations virt-who doesn't call
+
+        Returns names of messages used by the remaining operations and
+        references to elements of their parts.
+        '''
+        messages = set()
+        for portType in base.getChildren('portType', WSDL_NS):
+            operations = [op for op in portType.children if op.get('name') in self.methods]
+            missing = self.methods - set(op.get('name') for op in operations)
+            if missing:
+                raise InvalidWsdlError("Operations not found: %s" % ", ".join(sorted(missing)))
+            portType.children = operations
+            for operation in operations:
+                for child in operation.children:
+                    if child.get('message') is not None:
+                        messages.add(_qualify(child.get('message'), child, (None, tns))[0])
+        for binding in base.getChildren('binding', WSDL_NS):
+            binding.children = [
+                child for child in binding.children
+                if not child.match('operation', WSDL_NS) or child.get('name') in self.methods
+            ]
+
+        elements = []
+        for message in base.getChildren('message', WSDL_NS):
+            if message.get('name') not in messages:
+                continue
+            for part in message.getChildren('part', WSDL_NS):
+                if part.get('element') is not None:
+                    name, ns = _qualify(part.get('element'), part, (None, tns))
+                    elements.append(('element', name, ns))
+        return messages, elements
+
+    def _closure(self, keys, components):
+        '''Get keys of the components and all components they refer to.'''
+        kept = set()
+        pending = list(keys)
+        while pending:
+            key = pending.pop()
+            if key in kept or key[2] == XSD_NS[1]:
+                continue
+            component = components.get(key)
+            if component is None:
+                raise InvalidWsdlError("Schema component not found: %s %s" % (key[0], key[1]))
+            kept.add(key)
+            pending.extend(self._references(component))
+        namespaces = set(key[2] for key in kept)
+        if len(namespaces) > 1:
+            raise InvalidWsdlError("Types from several namespaces: %s" % ", ".join(map(str, namespaces)))
+        return kept
+
+    @staticmethod
+    def _references(component):
+        nodes = [component]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.children)
+            for name in TYPE_REFERENCES:
+                value = node.get(name)
+                if value is not None:
+                    yield ('type',) + _qualify(value, node, node.defaultNamespace())
+            value = node.get('ref')
+            if value is not None:
+                yield (node.name,) + _qualify(value, node, node.defaultNamespace())
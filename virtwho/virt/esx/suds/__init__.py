@@ -133,6 +133,8 @@ else:
 
 # Idea from 'http://lucumr.pocoo.org/2011/1/22/forwards-compatible-python'.
 class UnicodeMixin(object):
+    __slots__ = ()
+
     if sys.version_info >= (3, 0):
         # For Python 3, __str__() and __unicode__() should be identical.
         __str__ = lambda x: x.__unicode__()
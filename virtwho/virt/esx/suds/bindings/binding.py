@@ -75,7 +75,7 @@ class Binding(object):
         @rtype: L{UmxTyped}
 
         """
-        return UmxTyped(self.schema())
+        return UmxTyped(self.schema(), self.options().compactobjects)
 
     def marshaller(self):
         """
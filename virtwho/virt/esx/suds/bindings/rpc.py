@@ -88,4 +88,4 @@ class Encoded(RPC):
         @rtype: L{UmxTyped}
 
         """
-        return UmxEncoded(self.schema())
+        return UmxEncoded(self.schema(), self.options().compactobjects)
@@ -22,6 +22,7 @@ import virtwho.virt.esx.suds
 import virtwho.virt.esx.suds.sax.element
 import virtwho.virt.esx.suds.sax.parser
 
+import collections
 import datetime
 import os
 try:
@@ -30,6 +31,7 @@ except Exception:
     import pickle
 import shutil
 import tempfile
+import threading
 
 from logging import getLogger
 log = getLogger(__name__)
@@ -87,6 +89,66 @@ class NoCache(Cache):
         pass
 
 
+class MemoryCache(Cache):
+    """
+    A bounded in-memory object cache.
+
+    Objects are kept as they are, not copied, so all users of the cache get
+    the same objects. The least recently used objects are evicted once there
+    are more than I{size} of them.
+
+    @ivar size: The maximum number of cached objects.
+    @type size: int
+    @ivar hits: The number of objects found.
+    @type hits: int
+    @ivar misses: The number of objects not found.
+    @type misses: int
+
+    """
+
+    def __init__(self, size=16):
+        """
+        @param size: The maximum number of cached objects.
+        @type size: int
+
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.__objects = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, id):
+        with self.__lock:
+            object = self.__objects.get(id)
+            if object is None:
+                self.misses += 1
+                return
+            self.__objects.move_to_end(id)
+            self.hits += 1
+            return object
+
+    def put(self, id, object):
+        with self.__lock:
+            self.__objects[id] = object
+            self.__objects.move_to_end(id)
+            while len(self.__objects) > self.size:
+                evicted, _ = self.__objects.popitem(last=False)
+                log.debug("evicted from memory: %s", evicted)
+        return object
+
+    def purge(self, id):
+        with self.__lock:
+            self.__objects.pop(id, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__objects.clear()
+
+    def __len__(self):
+        return len(self.__objects)
+
+
 class FileCache(Cache):
     """
     A file-based URL cache.
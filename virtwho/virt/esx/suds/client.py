@@ -30,6 +30,7 @@ from virtwho.virt.esx.suds.properties import Unskin
 from virtwho.virt.esx.suds.reader import DefinitionsReader
 from virtwho.virt.esx.suds.resolver import PathResolver
 from virtwho.virt.esx.suds.sax.document import Document
+from virtwho.virt.esx.suds.sax.enc import Encoder
 import virtwho.virt.esx.suds.sax.parser
 from virtwho.virt.esx.suds.servicedefinition import ServiceDefinition
 import virtwho.virt.esx.suds.transport
@@ -41,6 +42,7 @@ from virtwho.virt.esx.suds import sudsobject
 from http.cookiejar import CookieJar
 from copy import deepcopy
 import http.client
+import uuid
 
 from logging import getLogger
 log = getLogger(__name__)
@@ -579,6 +581,98 @@ class Method:
             return _SimClient
         return _SoapClient
 
+    def prepare(self, variables, *args, **kwargs):
+        """
+        Prepare the method for repeated invocation.
+
+        The SOAP request envelope is marshalled only once, using the given
+        arguments. Parameters named in I{variables} are passed to the
+        returned L{PreparedMethod} on each call and substituted into the
+        envelope as text.
+
+        @param variables: Names of the parameters given on each call.
+        @type variables: [str,...]
+        @return: A prepared method.
+        @rtype: L{PreparedMethod}
+
+        """
+        return PreparedMethod(self, variables, args, kwargs)
+
+
+class PreparedMethod:
+    """
+    A web service method with a pre-marshalled SOAP request envelope.
+
+    Calling the prepared method skips the request marshalling, the values of
+    the variable parameters are encoded into the envelope template. Only
+    simple (string, number or boolean) values of parameters that appear
+    exactly once in the request are supported.
+
+    Plugins get the marshalled envelope only once, when the method is
+    prepared, while the sending hook is invoked for every call.
+
+    @ivar method: The prepared method.
+    @type method: L{Method}
+    @ivar variables: Names of the parameters given on each call.
+    @type variables: [str,...]
+
+    """
+
+    __encoder = Encoder()
+
+    def __init__(self, method, variables, args, kwargs):
+        """
+        @param method: The method to prepare.
+        @type method: L{Method}
+        @param variables: Names of the parameters given on each call.
+        @type variables: [str,...]
+        @param args: Positional arguments of the method.
+        @type args: list|tuple
+        @param kwargs: Named arguments of the method.
+        @type kwargs: dict
+
+        """
+        self.method = method
+        self.variables = list(variables)
+        kwargs = dict(kwargs)
+        markers = {}
+        for name in self.variables:
+            markers[name] = "suds-%s-%s" % (name, uuid.uuid4().hex)
+            kwargs[name] = markers[name]
+        client = _SoapClient(method.client, method.method)
+        soapenv = method.method.binding.input.get_message(
+            method.method, args, kwargs)
+        envelope = client.serialize(soapenv)
+        self.__parts = []
+        for name in self.variables:
+            marker = markers[name].encode("utf-8")
+            if envelope.count(marker) != 1:
+                raise Exception("parameter '%s' of method '%s' can not be "
+                    "prepared" % (name, method.method.name))
+            head, envelope = envelope.split(marker)
+            self.__parts.append(head)
+        self.__parts.append(envelope)
+
+    def __call__(self, **kwargs):
+        """Invoke the method with given values of the variable parameters."""
+        timeout = kwargs.pop(_SoapClient.TIMEOUT_ARGUMENT, None)
+        envelope = [self.__parts[0]]
+        for name, part in zip(self.variables, self.__parts[1:]):
+            envelope.append(self.__encode(kwargs[name]))
+            envelope.append(part)
+        client = _SoapClient(self.method.client, self.method.method)
+        try:
+            return client.send_envelope(b"".join(envelope), timeout=timeout)
+        except WebFault as e:
+            if self.method.faults():
+                raise
+            return http.client.INTERNAL_SERVER_ERROR, e
+
+    def __encode(self, value):
+        if isinstance(value, bool):
+            value = value and "true" or "false"
+        return self.__encoder.encode(str(value)).encode("utf-8")
+
 
 class RequestContext:
     """
@@ -729,15 +823,43 @@ class _SoapClient:
             I{None}
 
         """
-        location = self.__location()
-        log.debug("sending to (%s)\nmessage:\n%s", location, soapenv)
+        return self.send_envelope(self.serialize(soapenv), timeout=timeout)
+
+    def serialize(self, soapenv):
+        """
+        Serialize SOAP message, after it's processed by registered plugins.
+
+        @param soapenv: A SOAP envelope to serialize.
+        @type soapenv: L{Document}
+        @return: The serialized SOAP envelope.
+        @rtype: I{bytes}
+
+        """
         plugins = PluginContainer(self.options.plugins)
         plugins.message.marshalled(envelope=soapenv.root())
         if self.options.prettyxml:
             soapenv = soapenv.str()
         else:
             soapenv = soapenv.plain()
-        soapenv = soapenv.encode("utf-8")
+        return soapenv.encode("utf-8")
+
+    def send_envelope(self, soapenv, timeout=None):
+        """
+        Send serialized SOAP message.
+
+        Behaves the same as L{send}, except the envelope is not processed by
+        the I{marshalled} plugin hook.
+
+        @param soapenv: A serialized SOAP envelope to send.
+        @type soapenv: I{bytes}
+        @return: SOAP request, SOAP reply or a web service return value.
+        @rtype: L{RequestContext}|I{builtin}|I{subclass of} L{Object}|I{bytes}|
+            I{None}
+
+        """
+        location = self.__location()
+        log.debug("sending to (%s)\nmessage:\n%s", location, soapenv)
+        plugins = PluginContainer(self.options.plugins)
         ctx = plugins.message.sending(envelope=soapenv)
         soapenv = ctx.envelope
         if self.options.nosend:
@@ -753,7 +875,11 @@ class _SoapClient:
         except virtwho.virt.esx.suds.transport.TransportError as e:
             content = e.fp and e.fp.read() or ""
             return self.process_reply(content, e.httpcode, tostr(e))
-        return self.process_reply(reply.message, None, None)
+        try:
+            return self.process_reply(reply.message, None, None)
+        finally:
+            if hasattr(reply.message, "close"):
+                reply.message.close()
 
     def process_reply(self, reply, status, description):
         """
@@ -763,8 +889,11 @@ class _SoapClient:
         reply XML or process it and return the Python object representing the
         returned value.
 
+        The reply may also be given as a I{file-like} object, in which case
+        it gets parsed incrementally as it is read.
+
         @param reply: The SOAP reply envelope.
-        @type reply: I{bytes}
+        @type reply: I{bytes}|I{file-like}
         @param status: The HTTP status code (None indicates httplib.OK).
         @type status: int|I{None}
         @param description: Additional status description.
@@ -775,6 +904,8 @@ class _SoapClient:
         """
         if status is None:
             status = http.client.OK
+        if self.options.retxml and hasattr(reply, "read"):
+            reply = reply.read()
         debug_message = "Reply HTTP status - %d" % (status,)
         if status in (http.client.ACCEPTED, http.client.NO_CONTENT):
             log.debug(debug_message)
@@ -941,10 +1072,12 @@ def _parse(string):
     content is empty.
 
     @param string: XML document content to parse.
-    @type string: I{bytes}
+    @type string: I{bytes}|I{file-like}
     @return: Resulting root XML element node or None.
     @rtype: L{Element}|I{None}
 
     """
+    if hasattr(string, "read"):
+        return virtwho.virt.esx.suds.sax.parser.Parser().parse(file=string)
     if string:
         return virtwho.virt.esx.suds.sax.parser.Parser().parse(string=string)
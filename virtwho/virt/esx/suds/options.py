@@ -133,6 +133,18 @@ class Options(Skin):
             Enabled by default for historical purposes.
                 - type: I{bool}
                 - default: True
+        - B{lazyschema} - Dereference XSD schema types on their first use
+            instead of dereferencing all of them when the schema is loaded.
+            Useful for large schemas where only a few types are ever used.
+                - type: I{bool}
+                - default: False
+        - B{compactobjects} - Unmarshal replies into compact objects, with a
+            class per schema type that has a slot for each of the type's
+            elements and attributes and metadata shared by its instances.
+            Faster to build and smaller than the default objects, but their
+            metadata must not be modified.
+                - type: I{bool}
+                - default: False
     """
     def __init__(self, **kwargs):
         domain = __name__
@@ -158,5 +170,7 @@ class Options(Skin):
             Definition('plugins', (list, tuple), []),
             Definition('nosend', bool, False),
             Definition('unwrap', bool, True),
-            Definition('sortNamespaces', bool, True)]
+            Definition('sortNamespaces', bool, True),
+            Definition('lazyschema', bool, False),
+            Definition('compactobjects', bool, False)]
         Skin.__init__(self, domain, definitions, kwargs)
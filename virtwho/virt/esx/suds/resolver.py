@@ -225,6 +225,8 @@ class TreeResolver(Resolver):
     context.
     @ivar stack: The context stack.
     @type stack: list
+    @ivar children: The memo of child lookups: (parent, name) --> (child, ancestry).
+    @type children: dict
     """
 
     def __init__(self, schema):
@@ -234,6 +236,9 @@ class TreeResolver(Resolver):
         """
         Resolver.__init__(self, schema)
         self.stack = Stack()
+        # Child lookups are memoized on the schema, so they are shared by
+        # all the (per message) resolvers of a client.
+        self.children = schema.__dict__.setdefault('resolved_children', {})
 
     def reset(self):
         """
@@ -290,11 +295,19 @@ class TreeResolver(Resolver):
         return len(self.stack)
 
     def getchild(self, name, parent):
-        """Get a child by name."""
+        """Get a child by name, memoized per (parent, name)."""
+        key = (parent, name)
+        try:
+            return self.children[key]
+        except KeyError:
+            pass
         log.debug('searching parent (%s) for (%s)', Repr(parent), name)
         if name.startswith('@'):
-            return parent.get_attribute(name[1:])
-        return parent.get_child(name)
+            result = parent.get_attribute(name[1:])
+        else:
+            result = parent.get_child(name)
+        self.children[key] = result
+        return result
 
 
 class NodeResolver(TreeResolver):
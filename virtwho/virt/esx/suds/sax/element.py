@@ -57,6 +57,9 @@ class Element(UnicodeMixin):
 
     specialprefixes = {Namespace.xmlns[0]: Namespace.xmlns[1]}
 
+    __slots__ = ("parent", "prefix", "name", "expns", "nsprefixes",
+        "attributes", "text", "children")
+
     @classmethod
     def buildPath(self, parent, path):
         """
@@ -43,6 +43,8 @@ class Handler(ContentHandler):
 
     def __init__(self):
         self.nodes = [Document()]
+        # Character data of the open elements, parallel to the nodes stack.
+        self.buffers = [[]]
 
     def startElement(self, name, attrs):
         top = self.top()
@@ -54,7 +56,6 @@ class Handler(ContentHandler):
             if self.mapPrefix(node, attribute):
                 continue
             node.append(attribute)
-        node.charbuffer = []
         top.append(node)
         self.push(node)
 
@@ -71,25 +72,25 @@ class Handler(ContentHandler):
 
     def endElement(self, name):
         name = str(name)
+        charbuffer = self.buffers[-1]
         current = self.pop()
         if name != current.qname():
             raise Exception("malformed document")
-        if current.charbuffer:
-            current.text = Text("".join(current.charbuffer))
-        del current.charbuffer
+        if charbuffer:
+            current.text = Text("".join(charbuffer))
         if current:
             current.trim()
 
     def characters(self, content):
-        text = str(content)
-        node = self.top()
-        node.charbuffer.append(text)
+        self.buffers[-1].append(str(content))
 
     def push(self, node):
         self.nodes.append(node)
+        self.buffers.append([])
         return node
 
     def pop(self):
+        self.buffers.pop()
         return self.nodes.pop()
 
     def top(self):
@@ -105,6 +105,8 @@ class Raw(Text):
     Raw text which is not XML escaped.
     This may include I{string} XML.
     """
+    __slots__ = ()
+
     def escape(self):
         return self
 
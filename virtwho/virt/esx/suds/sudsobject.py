@@ -125,6 +125,32 @@ class Factory:
             setattr(inst, a[0], a[1])
         return inst
 
+    @classmethod
+    def compact(cls, name, keys, metadata=None):
+        """
+        Create a L{Compact} class with a slot for each of the I{keys}.
+
+        @param name: The class name.
+        @type name: str
+        @param keys: The attribute names known in advance.
+        @type keys: [str,...]
+        @param metadata: The metadata shared by all the class instances.
+        @type metadata: L{Metadata}
+        @return: The new class.
+        @rtype: L{Compact} subclass
+
+        """
+        slots = []
+        for key in keys:
+            # Other names are kept in the instance dict
+            if key.isidentifier() and not key.startswith("__") and \
+                    key not in slots:
+                slots.append(key)
+        if metadata is None:
+            metadata = Metadata()
+        return type(str(name), (Compact,), {"__slots__": tuple(slots),
+            "__keys__": tuple(slots), "__metadata__": metadata})
+
     @classmethod
     def metadata(cls):
         return Metadata()
@@ -250,6 +276,45 @@ class Property(Object):
         return self
 
 
+class Compact(Object):
+    """
+    A compact suds object.
+
+    Subclasses are created by L{Factory.compact}, usually one per schema type,
+    with a slot for each of the type's attributes and elements. Attributes are
+    set without the keylist bookkeeping of L{Object}, the keylist lists the
+    set slots followed by any other attributes. All instances of a class share
+    its metadata.
+
+    """
+
+    __slots__ = ()
+    __keys__ = ()
+
+    __setattr__ = object.__setattr__
+    __delattr__ = object.__delattr__
+
+    def __init__(self):
+        pass
+
+    @property
+    def __keylist__(self):
+        keylist = [k for k in self.__keys__ if hasattr(self, k)]
+        for k in self.__dict__:
+            if not (k.startswith("__") and k.endswith("__")):
+                keylist.append(k)
+        return keylist
+
+    def __contains__(self, name):
+        if name in self.__keys__:
+            return hasattr(self, name)
+        return name in self.__dict__ and \
+            not (name.startswith("__") and name.endswith("__"))
+
+    def __unicode__(self):
+        return Printer().tostr(self)
+
+
 class Printer:
     """Pretty printing of a Object object."""
 
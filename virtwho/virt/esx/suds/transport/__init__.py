@@ -103,8 +103,9 @@ class Reply(UnicodeMixin):
     @type code: int
     @ivar headers: The HTTP headers included in the received reply.
     @type headers: dict
-    @ivar message: The message received as a reply.
-    @type message: bytes
+    @ivar message: The message received as a reply. May be a I{file-like}
+        object for replies streamed as they are received.
+    @type message: bytes|I{file-like}
 
     """
 
@@ -115,7 +116,7 @@ class Reply(UnicodeMixin):
         @param headers: The HTTP headers included in the received reply.
         @type headers: dict
         @param message: The (optional) message received as a reply.
-        @type message: bytes
+        @type message: bytes|I{file-like}
 
         """
         self.code = code
@@ -19,11 +19,11 @@ Provides modules containing classes to support
 unmarshalling (XML).
 """
 
-from virtwho.virt.esx.suds.sudsobject import Object
+from virtwho.virt.esx.suds.sudsobject import Compact
 
 
 
-class Content(Object):
+class Content(Compact):
     """
     @ivar node: The content source node.
     @type node: L{sax.element.Element}
@@ -33,10 +33,12 @@ class Content(Object):
     @type text: basestring
     """
 
+    __slots__ = ('node', 'data', 'text')
+    __keys__ = __slots__
+
     extensions = []
 
     def __init__(self, node, **kwargs):
-        Object.__init__(self)
         self.node = node
         self.data = None
         self.text = None
@@ -44,12 +46,9 @@ class Content(Object):
             setattr(self, k, v)
 
     def __getattr__(self, name):
-        if name not in self.__dict__:
-            if name in self.extensions:
-                v = None
-                setattr(self, name, v)
-            else:
-                raise AttributeError('Content has no attribute %s' % name)
+        if name in self.extensions:
+            v = None
+            setattr(self, name, v)
         else:
-            v = self.__dict__[name]
+            raise AttributeError('Content has no attribute %s' % name)
         return v
@@ -49,6 +49,8 @@ class Core:
         """
         Process the specified node and convert the XML document into
         a I{suds} L{object}.
+        The child nodes are walked with an explicit stack of contents
+        rather than by recursion.
         @param content: The current content being unmarshalled.
         @type content: L{Content}
         @return: A I{append-result} tuple as: (L{Object}, I{value})
@@ -58,10 +60,23 @@ class Core:
         """
         self.start(content)
         self.append_attributes(content)
-        self.append_children(content)
-        self.append_text(content)
-        self.end(content)
-        return self.postprocess(content)
+        stack = [(content, iter(content.node.children))]
+        while True:
+            current, children = stack[-1]
+            for child in children:
+                cont = Content(child)
+                self.start(cont)
+                self.append_attributes(cont)
+                stack.append((cont, iter(child.children)))
+                break
+            else:
+                stack.pop()
+                self.append_text(current)
+                self.end(current)
+                cval = self.postprocess(current)
+                if not stack:
+                    return cval
+                self.append_child(stack[-1][0], current, cval)
 
     def postprocess(self, content):
         """
@@ -127,30 +142,32 @@ class Core:
         key = '_%s' % reserved.get(key, key)
         setattr(content.data, key, value)
 
-    def append_children(self, content):
+    def append_child(self, content, cont, cval):
         """
-        Append child nodes into L{Content.data}
+        Append an unmarshalled child node into L{Content.data}
         @param content: The current content being unmarshalled.
         @type content: L{Content}
-        """
-        for child in content.node:
-            cont = Content(child)
-            cval = self.append(cont)
-            key = reserved.get(child.name, child.name)
-            if key in content.data:
-                v = getattr(content.data, key)
-                if isinstance(v, list):
-                    v.append(cval)
-                else:
-                    setattr(content.data, key, [v, cval])
-                continue
-            if self.multi_occurrence(cont):
-                if cval is None:
-                    setattr(content.data, key, [])
-                else:
-                    setattr(content.data, key, [cval,])
+        @param cont: The unmarshalled child content.
+        @type cont: L{Content}
+        @param cval: The child's post-processed value.
+        @type cval: I{any}
+        """
+        name = cont.node.name
+        key = reserved.get(name, name)
+        if key in content.data:
+            v = getattr(content.data, key)
+            if isinstance(v, list):
+                v.append(cval)
             else:
-                setattr(content.data, key, cval)
+                setattr(content.data, key, [v, cval])
+            return
+        if self.multi_occurrence(cont):
+            if cval is None:
+                setattr(content.data, key, [])
+            else:
+                setattr(content.data, key, [cval,])
+        else:
+            setattr(content.data, key, cval)
 
     def append_text(self, content):
         """
@@ -20,7 +20,7 @@ Provides typed unmarshaller classes.
 
 from virtwho.virt.esx.suds import *
 from virtwho.virt.esx.suds.umx import *
-from virtwho.virt.esx.suds.umx.core import Core
+from virtwho.virt.esx.suds.umx.core import Core, reserved
 from virtwho.virt.esx.suds.resolver import NodeResolver, Frame
 from virtwho.virt.esx.suds.sudsobject import Factory
 
@@ -42,14 +42,22 @@ class Typed(Core):
     A I{typed} XML unmarshaller
     @ivar resolver: A schema type resolver.
     @type resolver: L{NodeResolver}
+    @ivar compact: Build L{Compact} objects, with a class per schema type.
+    @type compact: bool
     """
 
-    def __init__(self, schema):
+    def __init__(self, schema, compact=False):
         """
         @param schema: A schema object.
         @type schema: L{xsd.schema.Schema}
+        @param compact: Build L{Compact} objects.
+        @type compact: bool
         """
         self.resolver = NodeResolver(schema)
+        self.compact = compact
+        if compact:
+            # Shared by the (per message) unmarshallers of a client.
+            self.classes = schema.__dict__.setdefault('compact_classes', {})
 
     def process(self, node, type):
         """
@@ -88,6 +96,9 @@ class Typed(Core):
         cls_name = real.name
         if cls_name is None:
             cls_name = content.node.name
+        if self.compact:
+            content.data = self.compactclass(real, cls_name)()
+            return
         content.data = Factory.object(cls_name)
         md = content.data.__metadata__
         md.sxtype = real
@@ -95,6 +106,35 @@ class Typed(Core):
     def end(self, content):
         self.resolver.pop()
 
+    def compactclass(self, type, name):
+        """
+        Get the L{Compact} class of a (resolved) schema type.
+        @param type: The resolved schema type.
+        @type type: L{xsd.sxbase.SchemaObject}
+        @param name: The class name.
+        @type name: str
+        @return: The class with slots for the type's elements and
+            attributes, and the type set in the shared metadata.
+        @rtype: L{Compact} subclass
+        """
+        # Builtin types are looked up as new objects each time
+        key = type.qname if type.builtin() else type
+        cls = self.classes.get(key)
+        if cls is None:
+            # Attributes get unmarshalled first, so list them first
+            keys = []
+            for attr, ancestry in type.attributes():
+                if attr.name is not None:
+                    keys.append('_%s' % reserved.get(attr.name, attr.name))
+            for child, ancestry in type.children():
+                if child.name is not None:
+                    keys.append(reserved.get(child.name, child.name))
+            md = Factory.metadata()
+            md.sxtype = type
+            cls = Factory.compact(name, keys, md)
+            self.classes[key] = cls
+        return cls
+
     def multi_occurrence(self, content):
         return content.type.multi_occurrence()
 
@@ -80,6 +80,7 @@ class Query(Object):
         if result is None:
             log.debug('%s, not-found', self.ref)
             return
+        result.dereference()
         if self.resolved:
             result = result.resolve()
         log.debug('%s, found as: %s', self.ref, Repr(result))
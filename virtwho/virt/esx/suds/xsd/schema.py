@@ -100,8 +100,9 @@ class SchemaCollection(UnicodeMixin):
             child.build()
         for child in self.children:
             child.open_imports(options, loaded_schemata)
-        for child in self.children:
-            child.dereference()
+        if not options.lazyschema:
+            for child in self.children:
+                child.dereference()
         log.debug("loaded:\n%s", self)
         merged = self.merge()
         log.debug("MERGED:\n%s", merged)
@@ -196,10 +197,17 @@ class Schema(UnicodeMixin):
     @type agrps: [L{SchemaObject},...]
     @ivar form_qualified: The flag indicating: (@elementFormDefault).
     @type form_qualified: bool
+    @ivar lazy: The flag indicating that contained objects get dereferenced
+        on their first use instead of when the schema is loaded.
+    @type lazy: bool
+    @ivar compact_classes: The compact object classes of the schema types,
+        created by the typed unmarshallers. Not pickled.
+    @type compact_classes: dict
 
     """
 
     Tag = "schema"
+    lazy = False
 
     def __init__(self, root, baseurl, options, loaded_schemata=None,
             container=None):
@@ -234,6 +242,7 @@ class Schema(UnicodeMixin):
             options.doctor.examine(root)
         form = self.root.get("elementFormDefault")
         self.form_qualified = form == "qualified"
+        self.lazy = options.lazyschema
 
         # If we have a container, that container is going to take care of
         # finishing our build for us in parallel with building all the other
@@ -260,8 +269,9 @@ class Schema(UnicodeMixin):
             self.build()
             self.open_imports(options, loaded_schemata)
             log.debug("built:\n%s", self)
-            self.dereference()
-            log.debug("dereferenced:\n%s", self)
+            if not self.lazy:
+                self.dereference()
+                log.debug("dereferenced:\n%s", self)
 
     def mktns(self):
         """
@@ -460,5 +470,12 @@ class Schema(UnicodeMixin):
     def __repr__(self):
         return '<%s tns="%s"/>' % (self.id, self.tns[1])
 
+    def __getstate__(self):
+        # Compact object classes are created dynamically, so they can't be
+        # pickled. They get created again on the first use.
+        state = self.__dict__.copy()
+        state.pop("compact_classes", None)
+        return state
+
     def __unicode__(self):
         return self.str()
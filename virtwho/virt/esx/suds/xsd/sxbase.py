@@ -20,9 +20,15 @@ from virtwho.virt.esx.suds.xsd import *
 from virtwho.virt.esx.suds.sax.element import Element
 from virtwho.virt.esx.suds.sax import Namespace
 
+import threading
+
 from logging import getLogger
 log = getLogger(__name__)
 
+# Guards dereferencing of objects in lazily loaded schemas, which may be
+# shared by clients used from different threads.
+_dereference_lock = threading.RLock()
+
 
 class SchemaObject(UnicodeMixin):
     """
@@ -41,9 +47,19 @@ class SchemaObject(UnicodeMixin):
     @type default: object
     @ivar rawchildren: A list raw of all children.
     @type rawchildren: [L{SchemaObject},...]
+    @ivar dereferenced: A flag indicating that the content of this object has
+        been dereferenced by L{dereference}.
+    @type dereferenced: boolean
+    @ivar unbuilt: A flag indicating that I{rawchildren} of this top level
+        object of a lazy schema have not been built yet.
+    @type unbuilt: boolean
 
     """
 
+    dereferenced = False
+    dereferencing = False
+    unbuilt = False
+
     @classmethod
     def prepend(cls, d, s, filter=Filter()):
         """
@@ -106,6 +122,19 @@ class SchemaObject(UnicodeMixin):
         self.default = root.get("default")
         self.rawchildren = []
 
+    def __getattr__(self, name):
+        # Only called for attributes not found the usual way, i.e. for
+        # rawchildren of lazy schema top level objects not built yet.
+        if name != "rawchildren" or not self.__dict__.get("unbuilt"):
+            raise AttributeError(name)
+        from virtwho.virt.esx.suds.xsd.sxbasic import Factory
+        with _dereference_lock:
+            if "rawchildren" not in self.__dict__:
+                self.rawchildren = Factory.build(self.root, self.schema,
+                    self.childtags())
+                self.unbuilt = False
+        return self.__dict__["rawchildren"]
+
     def attributes(self, filter=Filter()):
         """
         Get only the attribute content.
@@ -422,6 +451,41 @@ class SchemaObject(UnicodeMixin):
         """
         return ["type", "ref"]
 
+    def dereference(self):
+        """
+        Dereference the content of this object on its first use.
+
+        Only objects of a lazy schema are dereferenced here, objects of other
+        schemas have all been dereferenced when their schema got loaded.
+        Dependencies are dereferenced before being merged, the same as when
+        dereferencing the whole schema.
+
+        @return: self
+        @rtype: L{SchemaObject}
+
+        """
+        if self.dereferenced or not self.schema.lazy:
+            return self
+        with _dereference_lock:
+            # Objects in a dependency cycle are merged in arbitrary order
+            if self.dereferenced or self.dereferencing:
+                return self
+            self.dereferencing = True
+            try:
+                for x in self.content():
+                    x.qualify()
+                    midx, deps = x.dependencies()
+                    if midx is None:
+                        continue
+                    d = deps[midx].dereference()
+                    log.debug("(%s) merging %s <== %s", self.schema.tns[1],
+                        Repr(x), Repr(d))
+                    x.merge(d)
+                self.dereferenced = True
+            finally:
+                self.dereferencing = False
+        return self
+
     def qualify(self):
         """
         Convert reference attribute values into a I{qref}.
@@ -58,6 +58,7 @@ class TypedContent(Content):
         cached = self.resolved_cache.get(nobuiltin)
         if cached is not None:
             return cached
+        self.dereference()
         resolved = self.__resolve_type(nobuiltin)
         self.resolved_cache[nobuiltin] = resolved
         return resolved
@@ -814,6 +815,12 @@ class Factory:
                 if child is None:
                     continue
                 children.append(child)
+                if schema.lazy and root is schema.root:
+                    # Content of top level objects of lazy schemas gets built
+                    # on its first use.
+                    del child.rawchildren
+                    child.unbuilt = True
+                    continue
                 c = cls.build(node, schema, child.childtags())
                 child.rawchildren = c
         return children
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+"""
+Streaming decoder of vCenter/ESX property collector updates, part of virt-who
+
+Copyright (C) 2024 Red Hat, Inc.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+from virtwho.virt.esx.suds.plugin import MessagePlugin
+
+
+VIM_NS = 'urn:vim25'
+SOAPENV_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+XSI_TYPE = 'http://www.w3.org/2001/XMLSchema-instance type'
+XSD_NS = 'http://www.w3.org/2001/XMLSchema'
+
+# Reply left for suds to unmarshal once the update set has been decoded
+EMPTY_UPDATE_SET = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<soapenv:Envelope xmlns:soapenv="%s"><soapenv:Body>'
+    '<WaitForUpdatesExResponse xmlns="%s"><returnval>'
+    '<version>%%s</version><truncated>%%s</truncated>'
+    '</returnval></WaitForUpdatesExResponse>'
+    '</soapenv:Body></soapenv:Envelope>' % (SOAPENV_NS, VIM_NS)
+)
+
+XSD_INTEGERS = ('byte', 'short', 'int', 'long')
+
+CHUNK_SIZE = 64 * 1024
+
+
+class NotUpdateSet(Exception):
+    '''
+    Raised when the reply doesn't contain an update set, e.g. it's a fault.
+    '''
+    pass
+
+
+class PrefixedStream(object):
+    '''
+    File-like object that returns the already read prefix before the rest
+    of the stream.
+    '''
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), b''
+        else:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+class ManagedObjectReference(object):
+    __slots__ = ('_type', 'value')
+
+    def __init__(self, type, value=None):
+        self._type = type
+        self.value = value
+
+    def __repr__(self):
+        return 'ManagedObjectReference(%r, %r)' % (self._type, self.value)
+
+
+class DataObject(object):
+    '''
+    Data object value of a property, attributes are named by its elements.
+    '''
+    def __init__(self, type):
+        self._type = type
+
+    def __repr__(self):
+        return '%s(%r)' % (self._type, self.__dict__)
+
+
+class ObjectUpdate(object):
+    __slots__ = ('kind', 'obj', 'changeSet')
+
+    def __init__(self):
+        self.kind = None
+        self.obj = None
+        self.changeSet = []
+
+
+class PropertyChange(object):
+    # 'val' is left unset when the property has no value, same as suds does
+    __slots__ = ('name', 'op', 'val')
+
+
+class _Value(object):
+    __slots__ = ('type', 'ref', 'children')
+
+    def __init__(self, type, ref):
+        self.type = type
+        self.ref = ref
+        self.children = []
+
+
+class UpdateSetDecoder(object):
+    '''
+    Incremental decoder of WaitForUpdatesEx replies.
+
+    Each ObjectUpdate is passed to the `apply` callable as soon as it's
+    parsed, without building the whole document tree. The objects passed
+    have the same attributes as the ones unmarshalled by suds.
+
+    The decoder keeps state of the reply being decoded, so each reply
+    needs its own decoder.
+    '''
+    def __init__(self, apply):
+        self.apply = apply
+
+    def decode(self, reply):
+        '''
+        Decode the WaitForUpdatesEx reply
+
+        The reply is either bytes or file-like object, which is read and
+        decoded chunk by chunk.
+
+        Returns tuple (version, truncated) or None if the reply has no
+        update set. Raises NotUpdateSet if the reply isn't WaitForUpdatesEx
+        response, before any update is applied. Data read from file-like
+        reply before that are kept in `consumed` attribute.
+        '''
+        self.consumed = []
+        self._path = []
+        self._text = []
+        self._prefixes = {}
+        self._object = None
+        self._change = None
+        self._values = None
+        self._version = None
+        self._truncated = False
+        self._returnval = False
+
+        parser = expat.ParserCreate(namespace_separator=' ')
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._text.append
+        parser.StartNamespaceDeclHandler = self._startNamespace
+        parser.EndNamespaceDeclHandler = self._endNamespace
+        if not hasattr(reply, 'read'):
+            parser.Parse(reply, True)
+        else:
+            while True:
+                chunk = reply.read(CHUNK_SIZE)
+                if self.consumed is not None:
+                    self.consumed.append(chunk)
+                parser.Parse(chunk, not chunk)
+                if not chunk:
+                    break
+
+        if not self._returnval:
+            return None
+        return self._version, self._truncated
+
+    def _startNamespace(self, prefix, uri):
+        self._prefixes.setdefault(prefix, []).append(uri)
+
+    def _endNamespace(self, prefix):
+        self._prefixes[prefix].pop()
+
+    def _start(self, name, attrs):
+        ns, _, tag = name.rpartition(' ')
+        depth = len(self._path)
+        self._path.append(tag)
+        del self._text[:]
+
+        if self._values is not None:
+            self._values.append(_Value(attrs.get(XSI_TYPE), attrs.get('type')))
+        elif depth < 2 or self._path[1] != 'Body':
+            pass
+        elif depth == 2:
+            if ns != VIM_NS or tag != 'WaitForUpdatesExResponse':
+                raise NotUpdateSet(tag)
+            # It's an update set, no need to keep the read data anymore
+            self.consumed = None
+        elif depth == 3:
+            self._returnval = True
+        elif tag == 'objectSet' and depth == 5:
+            self._object = ObjectUpdate()
+        elif self._object is None:
+            pass
+        elif tag == 'obj' and depth == 6:
+            self._object.obj = ManagedObjectReference(attrs.get('type'))
+        elif tag == 'changeSet' and depth == 6:
+            self._change = PropertyChange()
+        elif tag == 'val' and depth == 7 and self._change is not None:
+            self._values = [_Value(attrs.get(XSI_TYPE), attrs.get('type'))]
+
+    def _end(self, name):
+        tag = self._path.pop()
+        depth = len(self._path)
+        text = ''.join(self._text)
+        del self._text[:]
+
+        if self._values is not None:
+            value = self._values.pop()
+            decoded = self._decodeValue(value, text)
+            if self._values:
+                self._values[-1].children.append((tag, decoded))
+            else:
+                self._change.val = decoded
+                self._values = None
+        elif depth == 4 and tag == 'version':
+            self._version = text
+        elif depth == 4 and tag == 'truncated':
+            self._truncated = text in ('true', '1')
+        elif self._object is None:
+            pass
+        elif depth == 5 and tag == 'objectSet':
+            self.apply(self._object)
+            self._object = None
+        elif depth == 6:
+            if tag == 'kind':
+                self._object.kind = text
+            elif tag == 'obj':
+                self._object.obj.value = text
+            elif tag == 'changeSet':
+                self._object.changeSet.append(self._change)
+                self._change = None
+        elif depth == 7 and self._change is not None:
+            if tag == 'name':
+                self._change.name = text
+            elif tag == 'op':
+                self._change.op = text
+
+    def _decodeValue(self, value, text):
+        type = value.type
+        if type is not None and ':' in type:
+            prefix, type = type.split(':', 1)
+            uris = self._prefixes.get(prefix)
+            if uris and uris[-1] == XSD_NS:
+                if type in XSD_INTEGERS:
+                    return int(text)
+                if type == 'boolean':
+                    return text in ('true', '1')
+                return text
+        if value.ref is not None:
+            return ManagedObjectReference(value.ref, text)
+        if not value.children:
+            return text
+
+        obj = DataObject(type)
+        if type is not None and type.startswith('ArrayOf'):
+            for child, decoded in value.children:
+                obj.__dict__.setdefault(child, []).append(decoded)
+            return obj
+        for child, decoded in value.children:
+            if child in obj.__dict__:
+                previous = obj.__dict__[child]
+                if not isinstance(previous, list):
+                    obj.__dict__[child] = [previous]
+                obj.__dict__[child].append(decoded)
+            else:
+                obj.__dict__[child] = decoded
+        return obj
+
+
+class UpdateSetPlugin(MessagePlugin):
+    '''
+    Suds plugin that decodes WaitForUpdatesEx replies with UpdateSetDecoder.
+
+    The decoded reply is replaced by an update set with the version only,
+    so suds has no object updates left to unmarshal. Faults and replies to
+    other methods are left for suds to process, streamed replies are
+    replaced by stream that replays the data read by the decoder.
+    Invalid XML within the update set is raised as ExpatError, as some of
+    its updates may be applied already.
+    '''
+    def __init__(self, apply):
+        self.apply = apply
+
+    def received(self, context):
+        # Replies to other requests, e.g. CancelWaitForUpdates, may be
+        # received while an update set is being decoded by another thread
+        decoder = UpdateSetDecoder(self.apply)
+        try:
+            result = decoder.decode(context.reply)
+        except (NotUpdateSet, expat.ExpatError):
+            if decoder.consumed is None:
+                # Updates of the reply were partially applied already,
+                # leave it to the caller to start over
+                raise
+            if hasattr(context.reply, 'read'):
+                context.reply = PrefixedStream(b''.join(decoder.consumed), context.reply)
+            return
+        if result is not None:
+            version, truncated = result
+            context.reply = (EMPTY_UPDATE_SET % (
+                escape(version or ''), 'true' if truncated else 'false')).encode('utf-8')
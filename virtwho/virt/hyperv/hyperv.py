@@ -22,6 +22,9 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import urllib
 import base64
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 from xml.etree import ElementTree
 from requests.auth import AuthBase
 import requests
@@ -39,6 +42,27 @@ except ImportError:
         return subprocess.Popen(["uuidgen"], stdout=subprocess.PIPE).communicate()[0].strip()
 
 
+# Maximum number of instances in one enumeration response
+PAGE_SIZE = 100
+# Maximum number of connections kept open to the server
+POOL_SIZE = 4
+# Number of seconds the host facts are cached
+HOST_FACTS_TTL = 3600
+# Maximum number of servers polled at once
+WORKERS = 10
+# Number of seconds before a failing server is polled again, doubled
+# with each consecutive failure up to HOST_RETRY_MAX
+HOST_RETRY_DELAY = 60
+HOST_RETRY_MAX = 3600
+# Lifecycle events of virtual machines
+EVENT_QUERY = ("select * from __InstanceOperationEvent within 5 "
+               "where TargetInstance isa 'Msvm_ComputerSystem'")
+# Number of seconds the event subscription lasts before it's renewed
+EVENT_SUBSCRIPTION_TTL = 3600
+# Maximum number of seconds one request waits for events
+EVENT_WAIT = 30
+
+
 class HypervConfigSection(VirtConfigSection):
     """
     This class is used for validation of Hyper-V virtualization backend
@@ -54,33 +78,26 @@ class HypervConfigSection(VirtConfigSection):
         self.add_key('server', validation_method=self._validate_server, required=True)
         self.add_key('username', validation_method=self._validate_username, required=True)
         self.add_key('password', validation_method=self._validate_unencrypted_password, required=True)
+        self.add_key('page_size', validation_method=self._validate_positive_integer, default=PAGE_SIZE)
+        self.add_key('pool_size', validation_method=self._validate_positive_integer, default=POOL_SIZE)
+        self.add_key('host_facts_ttl', validation_method=self._validate_positive_integer, default=HOST_FACTS_TTL)
+        self.add_key('hosts', validation_method=self._validate_hosts)
+        self.add_key('hosts_file', validation_method=self._validate_hosts_file)
+        self.add_key('workers', validation_method=self._validate_positive_integer, default=WORKERS)
+        self.add_key('use_events', validation_method=self._validate_str_to_bool, default=False)
+
+    def _pre_validate(self):
+        # List of hosts can be used instead of the server
+        if 'hosts' in self._values or 'hosts_file' in self._values:
+            self._required_keys.discard('server')
+        super(HypervConfigSection, self)._pre_validate()
 
     def _validate_server(self, key):
         error = super(HypervConfigSection, self)._validate_server(key)
         if error is None:
-
-            url_altered = False
             result = []
-
-            url = self._values[key]
-            if "//" not in url:
-                url_altered = True
-                url = "//" + url
-            parsed = urllib.parse.urlsplit(url, "http")
-            if ":" not in parsed[1]:
-                url_altered = True
-                if parsed[0] == "https":
-                    self.host = parsed[1] + ":5986"
-                else:
-                    self.host = parsed[1] + ":5985"
-            else:
-                self.host = parsed[1]
-            if parsed[2] == "":
-                url_altered = True
-                path = "wsman"
-            else:
-                path = parsed[2]
-            self.url = urllib.parse.urlunsplit((parsed[0], self.host, path, "", ""))
+            self.url, url_altered = hyperv_url(self._values[key])
+            self.host = urllib.parse.urlsplit(self.url)[1]
             self._values['url'] = self.url
             if url_altered:
                 result.append((
@@ -91,6 +108,52 @@ class HypervConfigSection(VirtConfigSection):
 
         return error
 
+    def _validate_hosts(self, key):
+        result = self._validate_list(key)
+        if result is None:
+            self._values[key] = [hyperv_url(host)[0] for host in self._values[key] if host]
+        return result
+
+    def _validate_hosts_file(self, key):
+        """
+        Read the hosts from the file, one host per line. Empty lines and
+        lines starting with '#' are ignored.
+        """
+        try:
+            with open(self._values[key]) as f:
+                lines = [line.strip() for line in f]
+        except (IOError, TypeError) as e:
+            return 'error', 'Unable to read hosts from "%s": %s' % (self._values[key], e)
+        self._values['hosts_file_urls'] = [hyperv_url(line)[0] for line in lines if line and not line.startswith('#')]
+        return None
+
+
+def hyperv_url(server):
+    """
+    Get WS-Management URL of the Hyper-V server given as hostname or
+    incomplete URL. Returns the URL and whether it was altered.
+    """
+    url_altered = False
+    url = server
+    if "//" not in url:
+        url_altered = True
+        url = "//" + url
+    parsed = urllib.parse.urlsplit(url, "http")
+    if ":" not in parsed[1]:
+        url_altered = True
+        if parsed[0] == "https":
+            host = parsed[1] + ":5986"
+        else:
+            host = parsed[1] + ":5985"
+    else:
+        host = parsed[1]
+    if parsed[2] == "":
+        url_altered = True
+        path = "wsman"
+    else:
+        path = parsed[2]
+    return urllib.parse.urlunsplit((parsed[0], host, path, "", "")), url_altered
+
 
 class HyperVAuth(AuthBase):
     def __init__(self, username, password, logger):
@@ -154,6 +217,82 @@ class HyperVAuth(AuthBase):
         return request
 
 
+NAMESPACES = {
+    's': 'http://www.w3.org/2003/05/soap-envelope',
+    'wsa': 'http://schemas.xmlsoap.org/ws/2004/08/addressing',
+    'wsman': 'http://schemas.dmtf.org/wbem/wsman/1/wsman.xsd',
+    'wsen': 'http://schemas.xmlsoap.org/ws/2004/09/enumeration',
+    'wse': 'http://schemas.xmlsoap.org/ws/2004/08/eventing',
+}
+VSMS_NAMESPACE = 'http://schemas.microsoft.com/wbem/wsman/1/wmi/%(ns)s/Msvm_VirtualSystemManagementService'
+SI_NAMESPACE = 'http://schemas.microsoft.com/wbem/wsman/1/wmi/%(ns)s/Msvm_SummaryInformation'
+
+# Qualified tags of the response elements
+ENVELOPE_TAG = '{%(s)s}Envelope' % NAMESPACES
+BODY_TAG = '{%(s)s}Body' % NAMESPACES
+ENUMERATE_RESPONSE_TAG = '{%(wsen)s}EnumerateResponse' % NAMESPACES
+PULL_RESPONSE_TAG = '{%(wsen)s}PullResponse' % NAMESPACES
+SUBSCRIBE_RESPONSE_TAG = '{%(wse)s}SubscribeResponse' % NAMESPACES
+CONTEXT_TAG = '{%(wsen)s}EnumerationContext' % NAMESPACES
+# Optimized Enumerate response has the items in wsman namespace
+ITEMS_TAGS = frozenset(('{%(wsen)s}Items' % NAMESPACES, '{%(wsman)s}Items' % NAMESPACES))
+END_OF_SEQUENCE_TAGS = frozenset(('{%(wsen)s}EndOfSequence' % NAMESPACES, '{%(wsman)s}EndOfSequence' % NAMESPACES))
+
+# Number of characters of the response fed to the parser at once
+PARSE_CHUNK_SIZE = 64 * 1024
+
+
+@functools.lru_cache(maxsize=256)
+def _localName(tag):
+    return tag[tag.find("}") + 1:]
+
+
+@functools.lru_cache(maxsize=4)
+def _summaryTags(namespace):
+    """
+    Qualified tags of GetSummaryInformation response in the namespace.
+    """
+    vsms = VSMS_NAMESPACE % {'ns': namespace}
+    si = SI_NAMESPACE % {'ns': namespace}
+    return '{%s}GetSummaryInformation_OUTPUT' % vsms, '{%s}Name' % si, '{%s}EnabledState' % si
+
+
+def _iterResponse(body, name, containers=()):
+    """
+    Parse the SOAP response incrementally.
+
+    Yields tuples (depth, element) for the children of the response element
+    with qualified tag `name` as soon as they're parsed (depth 1). Children
+    of the elements with tag in `containers` are yielded one by one instead
+    (depth 2). Yielded elements are dropped from the tree, so the whole
+    document is never kept in memory.
+    """
+    parser = ElementTree.XMLPullParser(('start', 'end'))
+    stack = []
+    found = False
+    for offset in list(range(0, len(body), PARSE_CHUNK_SIZE)) + [None]:
+        if offset is None:
+            parser.close()
+        else:
+            parser.feed(body[offset:offset + PARSE_CHUNK_SIZE])
+        for event, element in parser.read_events():
+            if event == 'start':
+                stack.append(element)
+                if len(stack) == 1 and element.tag != ENVELOPE_TAG:
+                    raise HyperVException("Wrong reply format")
+                if len(stack) == 3 and element.tag == name and stack[1].tag == BODY_TAG:
+                    found = True
+                continue
+            stack.pop()
+            if len(stack) < 3 or stack[2].tag != name or stack[1].tag != BODY_TAG:
+                continue
+            if len(stack) == 3 or (len(stack) == 4 and stack[3].tag in containers):
+                yield len(stack) - 2, element
+                stack[-1].remove(element)
+    if not found:
+        raise HyperVException("Wrong reply format")
+
+
 class HyperVSoapGenerator(object):
     def __init__(self, url):
         self.url = url
@@ -161,15 +300,10 @@ class HyperVSoapGenerator(object):
 
     @property
     def namespaces(self):
-        return {
-            's': 'http://www.w3.org/2003/05/soap-envelope',
-            'wsa': 'http://schemas.xmlsoap.org/ws/2004/08/addressing',
-            'wsman': 'http://schemas.dmtf.org/wbem/wsman/1/wsman.xsd',
-            'wsen': 'http://schemas.xmlsoap.org/ws/2004/09/enumeration',
-        }
+        return NAMESPACES
 
-    vsms_namespace = 'http://schemas.microsoft.com/wbem/wsman/1/wmi/%(ns)s/Msvm_VirtualSystemManagementService'
-    si_namespace = 'http://schemas.microsoft.com/wbem/wsman/1/wmi/%(ns)s/Msvm_SummaryInformation'
+    vsms_namespace = VSMS_NAMESPACE
+    si_namespace = SI_NAMESPACE
 
     def envelope(self, header, body):
         return """<?xml version="1.0" encoding="UTF-8"?>
@@ -207,25 +341,57 @@ class HyperVSoapGenerator(object):
             'resource_namespace': resource_namespace
         }
 
-    def enumerateXML(self, query, namespace):
+    def enumerateXML(self, query, namespace, max_elements=PAGE_SIZE):
+        # Optimized enumeration returns the first instances in the response
         body = """<s:Body>
         <wsen:Enumerate>
+            <wsman:OptimizeEnumeration/>
+            <wsman:MaxElements>%(max_elements)d</wsman:MaxElements>
             <wsman:Filter Dialect="http://schemas.microsoft.com/wbem/wsman/1/WQL">%(query)s</wsman:Filter>
         </wsen:Enumerate>
-    </s:Body>""" % {'query': query}
+    </s:Body>""" % {'query': query, 'max_elements': max_elements}
 
         return self.envelope(
             self.getHeader('Enumerate', resource_namespace=namespace),
             body)
 
-    def pullXML(self, enumerationContext, namespace):
+    def pullXML(self, enumerationContext, namespace, max_elements=PAGE_SIZE, timeout=None):
         body = """<s:Body>
         <wsen:Pull>
             <wsen:EnumerationContext>%(EnumerationContext)s</wsen:EnumerationContext>
+            <wsen:MaxElements>%(max_elements)d</wsen:MaxElements>
         </wsen:Pull>
-    </s:Body>""" % {'EnumerationContext': enumerationContext}
+    </s:Body>""" % {'EnumerationContext': enumerationContext, 'max_elements': max_elements}
+        additional_headers = None
+        if timeout is not None:
+            # Server waits up to the timeout for the events of a subscription
+            additional_headers = """
+            <wsman:OperationTimeout>PT%dS</wsman:OperationTimeout>""" % timeout
         return self.envelope(
-            self.getHeader("Pull", resource_namespace=namespace),
+            self.getHeader("Pull", resource_namespace=namespace, additional_headers=additional_headers),
+            body)
+
+    def subscribeXML(self, query, namespace, expires):
+        # Events are delivered in responses to Pull requests
+        body = """<s:Body>
+        <wse:Subscribe>
+            <wse:Delivery Mode="http://schemas.dmtf.org/wbem/wsman/1/wsman/Pull"/>
+            <wse:Expires>PT%(expires)dS</wse:Expires>
+            <wsman:Filter Dialect="http://schemas.microsoft.com/wbem/wsman/1/WQL">%(query)s</wsman:Filter>
+        </wse:Subscribe>
+    </s:Body>""" % {'query': query, 'expires': expires}
+        return self.envelope(
+            self.getHeader("Subscribe", action_namespace=self.namespaces['wse'], resource_namespace=namespace),
+            body)
+
+    def unsubscribeXML(self, identifier, namespace):
+        body = """<s:Body>
+        <wse:Unsubscribe/>
+    </s:Body>"""
+        return self.envelope(
+            self.getHeader("Unsubscribe", action_namespace=self.namespaces['wse'], resource_namespace=namespace,
+                           additional_headers="""
+            <wse:Identifier>%s</wse:Identifier>""" % identifier),
             body)
 
     def getSummaryInformationXML(self, namespace):
@@ -261,11 +427,12 @@ ENABLED_STATE_TO_GUEST_STATE = {
 
 
 class HyperVSoap(object):
-    def __init__(self, url, connection, logger):
+    def __init__(self, url, connection, logger, page_size=PAGE_SIZE):
         self.url = url
         self.connection = connection
         self.generator = HyperVSoapGenerator(self.url)
         self.logger = logger
+        self.page_size = page_size
 
     def post(self, body):
         headers = {
@@ -283,8 +450,11 @@ class HyperVSoap(object):
             raise HyperVAuthFailed("Authentication failed")
         else:
             data = response.content
+            timed_out = False
             try:
                 xml_doc = ElementTree.fromstring(data)
+                subcode = xml_doc.find('.//{%(s)s}Subcode/{%(s)s}Value' % self.generator.namespaces)
+                timed_out = subcode is not None and subcode.text.strip().endswith(':TimedOut')
                 errorcode = xml_doc.find('.//{http://schemas.dmtf.org/wbem/wscim/1/cim-schema/2/MSFT_WmiError}error_Code')
                 # Suppress reporting of invalid namespace, because we're testing
                 # both old and new namespaces that HyperV uses
@@ -303,88 +473,125 @@ class HyperVSoap(object):
                     f"Invalid response ({response.status_code}) from Hyper-V (error: {err})"
                 )
 
+            if timed_out:
+                raise HyperVTimedOut("Operation timed out")
             raise HyperVCallFailed("Communication with Hyper-V failed, HTTP error: %d" % response.status_code)
 
-    @classmethod
-    def _Instance(cls, xml_doc):
-        def stripNamespace(tag):
-            return tag[tag.find("}") + 1:]
-        if len(xml_doc) < 1:
-            return None
-        child = xml_doc[0]
-        properties = {}
-        for ch in child:
-            properties[stripNamespace(ch.tag)] = ch.text
-        return properties
-
-    def Enumerate(self, query, namespace="root/virtualization"):
-        data = self.generator.enumerateXML(query=query, namespace=namespace)
-        body = self.post(data)
-        xml_doc = ElementTree.fromstring(body)
-        if xml_doc.tag != "{%(s)s}Envelope" % self.generator.namespaces:
-            raise HyperVException("Wrong reply format")
-        responses = xml_doc.findall("{%(s)s}Body/{%(wsen)s}EnumerateResponse" % self.generator.namespaces)
-        if len(responses) < 1:
-            raise HyperVException("Wrong reply format")
-        contexts = responses[0]
-        if len(contexts) < 1:
-            raise HyperVException("Wrong reply format")
-
-        if contexts[0].tag != "{%(wsen)s}EnumerationContext" % self.generator.namespaces:
-            raise HyperVException("Wrong reply format")
-        return contexts[0].text
-
-    def _PullOne(self, uuid, namespace):
-        data = self.generator.pullXML(enumerationContext=uuid, namespace=namespace)
-        body = self.post(data)
-        xml_doc = ElementTree.fromstring(body)
-        if xml_doc.tag != "{%(s)s}Envelope" % self.generator.namespaces:
-            raise HyperVException("Wrong reply format")
-        responses = xml_doc.findall("{%(s)s}Body/{%(wsen)s}PullResponse" % self.generator.namespaces)
-        if len(responses) < 0:
+    @staticmethod
+    def _Batch(body, name, context_first=False):
+        '''
+        Get enumeration context and instances from Enumerate or Pull
+        response. The context is None when there are no instances left.
+        '''
+        uuid = None
+        instances = []
+        for depth, element in _iterResponse(body, name, ITEMS_TAGS):
+            if depth == 2:
+                instances.append(dict((_localName(child.tag), child.text) for child in element))
+                continue
+            if context_first and uuid is None and element.tag != CONTEXT_TAG:
+                raise HyperVException("Wrong reply format")
+            context_first = False
+            if element.tag == CONTEXT_TAG:
+                uuid = element.text
+            elif element.tag in END_OF_SEQUENCE_TAGS:
+                return None, instances
+        if context_first:
             raise HyperVException("Wrong reply format")
+        return uuid, instances
 
-        uuid = None
-        instance = None
+    def Enumerate(self, query, namespace="root/virtualization"):
+        '''
+        Start enumeration of instances selected by the WQL `query`.
 
-        for node in responses[0]:
-            if node.tag == "{%(wsen)s}EnumerationContext" % self.generator.namespaces:
-                uuid = node.text
-            elif node.tag == "{%(wsen)s}Items" % self.generator.namespaces:
-                instance = HyperVSoap._Instance(node)
+        Returns tuple of the enumeration context, None if there are no
+        more instances to pull, and list of instances already returned.
+        '''
+        data = self.generator.enumerateXML(query=query, namespace=namespace, max_elements=self.page_size)
+        return HyperVSoap._Batch(self.post(data), ENUMERATE_RESPONSE_TAG, context_first=True)
 
-        return uuid, instance
+    def _PullBatch(self, uuid, namespace):
+        data = self.generator.pullXML(enumerationContext=uuid, namespace=namespace, max_elements=self.page_size)
+        return HyperVSoap._Batch(self.post(data), PULL_RESPONSE_TAG)
 
     def Pull(self, uuid, namespace="root/virtualization"):
         instances = []
         while uuid is not None:
-            uuid, instance = self._PullOne(uuid, namespace)
-            if instance is not None:
-                instances.append(instance)
+            uuid, batch = self._PullBatch(uuid, namespace)
+            instances.extend(batch)
         return instances
 
+    def Instances(self, query, namespace="root/virtualization"):
+        '''
+        Iterate over instances selected by the WQL `query`, the next
+        batch is pulled once the previous one is consumed.
+        '''
+        uuid, instances = self.Enumerate(query, namespace)
+        for instance in instances:
+            yield instance
+        while uuid is not None:
+            uuid, instances = self._PullBatch(uuid, namespace)
+            for instance in instances:
+                yield instance
+
+    def Query(self, query, namespace="root/virtualization"):
+        '''
+        Get all instances selected by the WQL `query`.
+        '''
+        return list(self.Instances(query, namespace))
+
+    def Subscribe(self, query, namespace, expires):
+        '''
+        Subscribe to events selected by the WQL `query` for `expires` seconds.
+
+        Returns tuple of the subscription identifier and enumeration
+        context to pull the events with.
+        '''
+        data = self.generator.subscribeXML(query=query, namespace=namespace, expires=expires)
+        identifier = None
+        uuid = None
+        for depth, element in _iterResponse(self.post(data), SUBSCRIBE_RESPONSE_TAG):
+            for node in element.iter():
+                tag = _localName(node.tag)
+                if tag == "Identifier":
+                    identifier = node.text.strip()
+                elif tag == "EnumerationContext":
+                    uuid = node.text.strip()
+        if identifier is None or uuid is None:
+            raise HyperVException("Wrong reply format")
+        return identifier, uuid
+
+    def PullEvents(self, uuid, namespace, timeout):
+        '''
+        Wait up to `timeout` seconds for events of the subscription.
+
+        Returns tuple of the enumeration context for the next pull, None
+        if the subscription has ended, and list of events, empty when no
+        event arrived in time.
+        '''
+        data = self.generator.pullXML(enumerationContext=uuid, namespace=namespace,
+                                      max_elements=self.page_size, timeout=timeout)
+        try:
+            body = self.post(data)
+        except HyperVTimedOut:
+            return uuid, []
+        return HyperVSoap._Batch(body, PULL_RESPONSE_TAG)
+
+    def Unsubscribe(self, identifier, namespace):
+        self.post(self.generator.unsubscribeXML(identifier=identifier, namespace=namespace))
+
     def Invoke_GetSummaryInformation(self, namespace):
         '''
         Get states of all virtual machines present on the system and
         return dict where `ElementName` is key and `virt.GUEST.STATE_*` is value.
         '''
         data = self.generator.getSummaryInformationXML(namespace)
-        body = self.post(data)
-        xml_doc = ElementTree.fromstring(body)
-        if xml_doc.tag != "{%(s)s}Envelope" % self.generator.namespaces:
-            raise HyperVException("Wrong reply format")
-        responses = xml_doc.findall("{%(s)s}Body/{%(vsms)s}GetSummaryInformation_OUTPUT" % {
-            's': self.generator.namespaces['s'],
-            'vsms': self.generator.vsms_namespace % {'ns': namespace}
-        })
-        if len(responses) < 0:
-            raise HyperVException("Wrong reply format")
+        output_tag, name_tag, state_tag = _summaryTags(namespace)
         info = {}
-        si_namespace = self.generator.si_namespace % {'ns': namespace}
-        for node in responses[0]:
+        for depth, node in _iterResponse(self.post(data), output_tag):
             if 'SummaryInformation' in node.tag:
-                name = node.find("{%(si)s}Name" % {'si': si_namespace}).text
-                enabledState = node.find("{%(si)s}EnabledState" % {'si': si_namespace}).text
+                name = node.find(name_tag).text
+                enabledState = node.find(state_tag).text
                 info[name] = ENABLED_STATE_TO_GUEST_STATE.get(enabledState, virt.Guest.STATE_UNKNOWN)
         return info
 
@@ -401,43 +608,90 @@ class HyperVCallFailed(HyperVException):
     pass
 
 
-class HyperV(virt.Virt):
-    CONFIG_TYPE = "hyperv"
+class HyperVTimedOut(HyperVCallFailed):
+    pass
 
-    def __init__(self, logger, config, dest, terminate_event=None,
-                 interval=None, oneshot=False, status=False):
-        super(HyperV, self).__init__(logger, config, dest,
-                                     terminate_event=terminate_event,
-                                     interval=interval,
-                                     oneshot=oneshot,
-                                     status=status)
-        self.url = self.config['url']
-        self.username = self.config['username']
-        self.password = self.config['password']
+
+class HyperVSubscribeRefused(HyperVException):
+    pass
+
+
+class HyperVHost(object):
+    """
+    Connection to one Hyper-V server and the state kept for it between
+    the collection cycles.
+    """
+
+    def __init__(self, url, config, logger):
+        self.url = url
+        self.config = config
+        self.logger = logger
+        self.username = config['username']
+        self.password = config['password']
 
         # First try to use old API (root/virtualization namespace) if doesn't
         # work, go with root/virtualization/v2
         self.useNewApi = False
+        # Namespace of the virtualization API, once it's known
+        self.namespace = None
+        self.session = None
+        # Version of vmms, (hostname, sockets) and system UUID of the host
+        self.hostFacts = None
+        self.hostFactsTime = 0
+        # Last hypervisor reported by the server, number of failures since
+        # then and time when the server is polled again
+        self.hypervisor = None
+        self.failures = 0
+        self.retryTime = 0
+        # Identifier and enumeration context of the event subscription,
+        # time when it's renewed, number of consecutive failures of getting
+        # the events and time when subscribing is retried
+        self.subscription = None
+        self.eventContext = None
+        self.subscriptionExpires = 0
+        self.eventFailures = 0
+        self.eventsRetryTime = 0
 
     def connect(self):
-        self.logger.debug('Trying to connect to Hyper-V')
+        '''
+        Get the session to the Hyper-V server.
+
+        The session, together with its connections and authentication, is
+        kept for the next collection cycles.
+        '''
+        if self.session is not None:
+            return self.session
+        self.logger.debug('Trying to connect to Hyper-V server %s', self.url)
         s = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.config['pool_size'])
         s.mount('http://', adapter)
+        s.mount('https://', adapter)
         s.auth = HyperVAuth(self.username, self.password, self.logger)
+        self.session = s
         return s
 
-    @classmethod
-    def decodeWinUUID(cls, uuid):
-        """ Windows UUID needs to be decoded using following key
-        From: {78563412-AB90-EFCD-1234-567890ABCDEF}
-        To:    12345678-90AB-CDEF-1234-567890ABCDEF
-        """
-        if uuid[0] == "{":
-            s = uuid[1:-1]
-        else:
-            s = uuid
-        return s[6:8] + s[4:6] + s[2:4] + s[0:2] + "-" + s[11:13] + s[9:11] + "-" + s[16:18] + s[14:16] + s[18:]
+    def disconnect(self):
+        if self.session is not None:
+            self.dropSubscription()
+            self.session.close()
+            self.session = None
+
+    def _withSession(self, method):
+        '''
+        Call `method` with HyperVSoap using the kept session.
+
+        When the server refuses the kept session, it's dropped and the
+        method is called again in a new one.
+        '''
+        reused = self.session is not None
+        try:
+            return method(HyperVSoap(self.url, self.connect(), self.logger, self.config['page_size']))
+        except HyperVAuthFailed:
+            self.disconnect()
+            if not reused:
+                raise
+            self.logger.debug("Hyper-V session is no longer authenticated, connecting again")
+        return method(HyperVSoap(self.url, self.connect(), self.logger, self.config['page_size']))
 
     def getVmmsVersion(self, hypervsoap):
         """
@@ -447,26 +701,48 @@ class HyperV(virt.Virt):
         https://social.technet.microsoft.com/Forums/windowsserver/en-US/dce2a4ec-10de-4eba-a19d-ae5213a2382d/how-to-tell-version-of-hyperv-installed?forum=winserverhyperv
         """
         vmmsVersion = ""
-        data = hypervsoap.Enumerate("select * from CIM_Datafile where Path = '\\\\windows\\\\system32\\\\' and FileName='vmms'", "root/cimv2")
-        for instance in hypervsoap.Pull(data, "root/cimv2"):
+        for instance in hypervsoap.Instances(
+                "select * from CIM_Datafile where Path = '\\\\windows\\\\system32\\\\' and FileName='vmms'",
+                "root/cimv2"):
             if instance['Path'] == '\\windows\\system32\\':
                 vmmsVersion = instance['Version']
         return vmmsVersion
 
-    def getHostGuestMapping(self):
-        guests = []
-        connection = self.connect()
-        hypervsoap = HyperVSoap(self.url, connection, self.logger)
-        uuid = None
+    def getHostInfo(self, hypervsoap):
+        """
+        Get hostname and number of processor sockets of the host.
+        """
+        hostname = None
+        socket_count = None
+        for instance in hypervsoap.Instances("select DNSHostName, NumberOfProcessors from Win32_ComputerSystem",
+                                             "root/cimv2"):
+            hostname = instance["DNSHostName"]
+            socket_count = instance["NumberOfProcessors"]
+        return hostname, socket_count
+
+    def getSystemUuid(self, hypervsoap):
+        system_uuid = None
+        for instance in hypervsoap.Instances("select UUID from Win32_ComputerSystemProduct", "root/cimv2"):
+            system_uuid = HyperV.decodeWinUUID(instance["UUID"])
+        return system_uuid
+
+    def getVirtualSystems(self, hypervsoap):
+        """
+        Get settings of all virtual machines, detecting which namespace
+        the server uses on the first call.
+        """
+        instances = None
         if not self.useNewApi:
             try:
                 # SettingType == 3 means current setting, 5 is snapshot - we don't want snapshots
-                uuid = hypervsoap.Enumerate(
+                instances = hypervsoap.Query(
                     "select BIOSGUID, VirtualSystemIdentifier "
                     "from Msvm_VirtualSystemSettingData "
                     "where SettingType = 3",
                     "root/virtualization")
             except HyperVCallFailed:
+                if self.namespace is not None:
+                    raise
                 self.logger.debug("Unable to enumerate using root/virtualization namespace, "
                                   "trying root/virtualization/v2 namespace")
                 self.useNewApi = True
@@ -474,17 +750,51 @@ class HyperV(virt.Virt):
         if self.useNewApi:
             # Filter out Planned VMs and snapshots, see
             # http://msdn.microsoft.com/en-us/library/hh850257%28v=vs.85%29.aspx
-            uuid = hypervsoap.Enumerate(
+            instances = hypervsoap.Query(
                 "select BIOSGUID, VirtualSystemIdentifier "
                 "from Msvm_VirtualSystemSettingData "
                 "where VirtualSystemType = 'Microsoft:Hyper-V:System:Realized'",
                 "root/virtualization/v2")
+        self.namespace = "root/virtualization/v2" if self.useNewApi else "root/virtualization"
+        return instances
+
+    def getHostGuestMapping(self):
+        return self._withSession(self._getHostGuestMapping)
+
+    def _getHostGuestMapping(self, hypervsoap):
+        # Independent queries are issued concurrently, but only in an
+        # authenticated session, the authentication handshake can't be
+        # done by several requests at once
+        authenticated = getattr(hypervsoap.connection.auth, 'authenticated', False)
+        workers = self.config['pool_size'] if authenticated else 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            virtual_systems = None
+            if self.namespace is None:
+                instances = self.getVirtualSystems(hypervsoap)
+            else:
+                virtual_systems = executor.submit(self.getVirtualSystems, hypervsoap)
+            # Get guest states
+            guest_states = executor.submit(hypervsoap.Invoke_GetSummaryInformation, self.namespace)
+
+            # Facts of the host rarely change, they're refreshed only
+            # after host_facts_ttl seconds
+            host_facts = None
+            if self.hostFacts is None or time() - self.hostFactsTime >= self.config['host_facts_ttl']:
+                host_facts = (
+                    executor.submit(self.getVmmsVersion, hypervsoap),
+                    executor.submit(self.getHostInfo, hypervsoap),
+                    executor.submit(self.getSystemUuid, hypervsoap),
+                )
+
+            if virtual_systems is not None:
+                instances = virtual_systems.result()
+            guest_states = guest_states.result()
+            if host_facts is not None:
+                self.hostFacts = tuple(future.result() for future in host_facts)
+                self.hostFactsTime = time()
 
-        # Get guest states
-        guest_states = hypervsoap.Invoke_GetSummaryInformation(
-            "root/virtualization/v2" if self.useNewApi else "root/virtualization")
-        vmmsVersion = self.getVmmsVersion(hypervsoap)
-        for instance in hypervsoap.Pull(uuid):
+        guests = []
+        for instance in instances:
             try:
                 uuid = instance["BIOSGUID"]
                 assert uuid is not None
@@ -504,20 +814,9 @@ class HyperV(virt.Virt):
                 self.logger.warning("Unknown state for guest %s", uuid)
                 state = virt.Guest.STATE_UNKNOWN
 
-            guests.append(virt.Guest(HyperV.decodeWinUUID(uuid), self.CONFIG_TYPE, state))
-        # Get the hostname
-        hostname = None
-        socket_count = None
-        data = hypervsoap.Enumerate("select DNSHostName, NumberOfProcessors from Win32_ComputerSystem", "root/cimv2")
-        for instance in hypervsoap.Pull(data, "root/cimv2"):
-            hostname = instance["DNSHostName"]
-            socket_count = instance["NumberOfProcessors"]
-
-        uuid = hypervsoap.Enumerate("select UUID from Win32_ComputerSystemProduct", "root/cimv2")
-        system_uuid = None
-        for instance in hypervsoap.Pull(uuid, "root/cimv2"):
-            system_uuid = HyperV.decodeWinUUID(instance["UUID"])
+            guests.append(virt.Guest(HyperV.decodeWinUUID(uuid), HyperV.CONFIG_TYPE, state))
 
+        vmmsVersion, (hostname, socket_count), system_uuid = self.hostFacts
         if self.config['hypervisor_id'] == 'uuid':
             host = system_uuid
         elif self.config['hypervisor_id'] == 'hostname':
@@ -528,17 +827,72 @@ class HyperV(virt.Virt):
             virt.Hypervisor.HYPERVISOR_VERSION_FACT: vmmsVersion,
             virt.Hypervisor.SYSTEM_UUID_FACT: system_uuid
         }
-        hypervisor = virt.Hypervisor(hypervisorId=host, name=hostname, guestIds=guests, facts=facts)
-        return {'hypervisors': [hypervisor]}
+        return virt.Hypervisor(hypervisorId=host, name=hostname, guestIds=guests, facts=facts)
+
+    def waitForEvents(self, timeout):
+        """
+        Wait up to `timeout` seconds for lifecycle events of the virtual
+        machines. Returns True when the virtual machines might have changed.
+        """
+        return self._withSession(lambda hypervsoap: self._waitForEvents(hypervsoap, timeout))
+
+    def _waitForEvents(self, hypervsoap, timeout):
+        changed = False
+        if self.subscription is not None and time() >= self.subscriptionExpires:
+            # Events between the subscriptions could be missed
+            self._unsubscribe(hypervsoap)
+            changed = True
+        if self.subscription is None:
+            try:
+                self.subscription, self.eventContext = hypervsoap.Subscribe(
+                    EVENT_QUERY, self.namespace, EVENT_SUBSCRIPTION_TTL)
+            except HyperVCallFailed as e:
+                raise HyperVSubscribeRefused(str(e))
+            self.subscriptionExpires = time() + EVENT_SUBSCRIPTION_TTL / 2
+            self.logger.debug("Subscribed to events of Hyper-V server %s", self.url)
+            # Events could be missed since getting them failed
+            changed = changed or self.eventFailures > 0
+
+        try:
+            uuid, events = hypervsoap.PullEvents(self.eventContext, self.namespace, timeout)
+        except HyperVCallFailed as e:
+            # Server doesn't know the subscription anymore, e.g. after restart
+            self.logger.debug("Unable to get events from Hyper-V server %s: %s", self.url, e)
+            uuid, events = None, []
+        if uuid is None:
+            self.subscription = None
+            return True
+        self.eventContext = uuid
+        if events:
+            self.logger.debug("Received %d events from Hyper-V server %s", len(events), self.url)
+        return changed or len(events) > 0
+
+    def _unsubscribe(self, hypervsoap):
+        subscription = self.subscription
+        self.subscription = None
+        self.eventContext = None
+        hypervsoap.Unsubscribe(subscription, self.namespace)
+
+    def dropSubscription(self):
+        '''
+        Drop the event subscription, the server is asked to remove it when
+        it can be reached.
+        '''
+        if self.subscription is None:
+            return
+        try:
+            self._unsubscribe(HyperVSoap(self.url, self.connect(), self.logger))
+        except Exception as e:
+            self.logger.debug("Unable to unsubscribe from Hyper-V events: %s", e)
 
     def statusConfirmConnection(self):
         """
         This call will confirm the credentials. The result outside
         of that is not important in the status scenario.
         """
-        connection = self.connect()
-        hypervsoap = HyperVSoap(self.url, connection, self.logger)
+        self._withSession(self._confirmConnection)
 
+    def _confirmConnection(self, hypervsoap):
         if self.useNewApi is False:
             try:
                 hypervsoap.Invoke_GetSummaryInformation("root/virtualization")
@@ -550,5 +904,170 @@ class HyperV(virt.Virt):
         if self.useNewApi is True:
             hypervsoap.Invoke_GetSummaryInformation("root/virtualization/v2")
 
+
+class HyperV(virt.Virt):
+    CONFIG_TYPE = "hyperv"
+
+    def __init__(self, logger, config, dest, terminate_event=None,
+                 interval=None, oneshot=False, status=False):
+        super(HyperV, self).__init__(logger, config, dest,
+                                     terminate_event=terminate_event,
+                                     interval=interval,
+                                     oneshot=oneshot,
+                                     status=status)
+        self.url = self.config.get('url', None)
+        self.username = self.config['username']
+        self.password = self.config['password']
+
+        urls = []
+        if self.url is not None:
+            urls.append(self.url)
+        urls.extend(self.config.get('hosts', []))
+        urls.extend(self.config.get('hosts_file_urls', []))
+        self.hosts = [HyperVHost(url, self.config, self.logger) for url in dict.fromkeys(urls)]
+
+    def cleanup(self):
+        for host in self.hosts:
+            host.disconnect()
+
+    def _run(self):
+        if not self.config['use_events'] or self._oneshot or self.status:
+            super(HyperV, self)._run()
+            return
+
+        # The virtual machines are collected when the servers report their
+        # change and at least once per interval
+        try:
+            changed = True
+            next_update = 0
+            while not self.is_terminated():
+                if changed or time() >= next_update:
+                    assoc = self.getHostGuestMapping()
+                    self._send_data(data_to_send=virt.HostGuestAssociationReport(self.config, assoc))
+                    next_update = time() + self.interval
+                changed = self.waitForEvents(next_update - time())
+        finally:
+            self.cleanup()
+
+    def waitForEvents(self, timeout):
+        """
+        Wait up to `timeout` seconds for events from the servers. Returns
+        True when virtual machines on any of them might have changed.
+        """
+        end = time() + timeout
+        while not self.is_terminated():
+            remaining = end - time()
+            if remaining <= 0:
+                return False
+            now = time()
+            hosts = [host for host in self.hosts
+                     if host.namespace is not None and now >= host.retryTime and now >= host.eventsRetryTime]
+            wait = min(remaining, EVENT_WAIT)
+            if not hosts:
+                self.wait(wait)
+                continue
+            workers = min(self.config['workers'], len(hosts))
+            # Idle servers block the workers for the whole timeout, it's
+            # shortened so all the servers are asked within the wait
+            pull_timeout = max(1, int(wait * workers / len(hosts)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda host: self._hostEvents(host, pull_timeout), hosts))
+            if any(results):
+                return True
+        return False
+
+    def _hostEvents(self, host, timeout):
+        """
+        Wait for events of one of the servers. Servers refusing to subscribe
+        are asked again after HOST_RETRY_MAX. When getting the events fails,
+        the server is subscribed to again after a delay that doubles with
+        each consecutive failure. The servers are polled every interval in
+        the meantime.
+        """
+        try:
+            changed = host.waitForEvents(timeout)
+        except HyperVSubscribeRefused as e:
+            host.eventsRetryTime = time() + HOST_RETRY_MAX
+            self.logger.warning("Unable to subscribe to events of Hyper-V server %s, trying again in %d seconds: %s",
+                                host.url, HOST_RETRY_MAX, e)
+            return False
+        except Exception as e:
+            host.dropSubscription()
+            host.eventFailures += 1
+            delay = min(HOST_RETRY_DELAY * 2 ** (host.eventFailures - 1), HOST_RETRY_MAX)
+            host.eventsRetryTime = time() + delay
+            self.logger.warning("Unable to get events from Hyper-V server %s, subscribing again in %d seconds: %s",
+                                host.url, delay, e)
+            return False
+        host.eventFailures = 0
+        return changed
+
+    @classmethod
+    def decodeWinUUID(cls, uuid):
+        """ Windows UUID needs to be decoded using following key
+        From: {78563412-AB90-EFCD-1234-567890ABCDEF}
+        To:    12345678-90AB-CDEF-1234-567890ABCDEF
+        """
+        if uuid[0] == "{":
+            s = uuid[1:-1]
+        else:
+            s = uuid
+        return s[6:8] + s[4:6] + s[2:4] + s[0:2] + "-" + s[11:13] + s[9:11] + "-" + s[16:18] + s[14:16] + s[18:]
+
+    def getHostGuestMapping(self):
+        if len(self.hosts) == 1:
+            return {'hypervisors': [self.hosts[0].getHostGuestMapping()]}
+
+        with ThreadPoolExecutor(max_workers=min(self.config['workers'], len(self.hosts))) as executor:
+            hypervisors = [hypervisor for hypervisor in executor.map(self._pollHost, self.hosts)
+                           if hypervisor is not None]
+        if not hypervisors:
+            raise HyperVException("Unable to get data from any of the Hyper-V servers")
+        return {'hypervisors': hypervisors}
+
+    def _pollHost(self, host):
+        """
+        Get the hypervisor of one of the servers.
+
+        A failing server is polled again after a delay that doubles with
+        each consecutive failure, the last hypervisor it reported is used
+        in the meantime.
+        """
+        if time() < host.retryTime:
+            return host.hypervisor
+        try:
+            host.hypervisor = host.getHostGuestMapping()
+        except Exception as e:
+            # One failing server must not prevent reporting the others
+            host.failures += 1
+            delay = min(HOST_RETRY_DELAY * 2 ** (host.failures - 1), HOST_RETRY_MAX)
+            host.retryTime = time() + delay
+            self.logger.warning("Unable to get data from Hyper-V server %s, trying again in %d seconds: %s",
+                                host.url, delay, e)
+        else:
+            host.failures = 0
+            host.retryTime = 0
+        return host.hypervisor
+
+    def statusConfirmConnection(self):
+        """
+        This call will confirm the credentials. The result outside
+        of that is not important in the status scenario.
+        """
+        if len(self.hosts) == 1:
+            self.hosts[0].statusConfirmConnection()
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.config['workers'], len(self.hosts))) as executor:
+            futures = [executor.submit(host.statusConfirmConnection) for host in self.hosts]
+        errors = []
+        for host, future in zip(self.hosts, futures):
+            try:
+                future.result()
+            except Exception as e:
+                errors.append("%s: %s" % (host.url, e))
+        if errors:
+            raise HyperVException("Unable to connect to Hyper-V servers: %s" % "; ".join(errors))
+
     def ping(self):
         return True